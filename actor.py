@@ -0,0 +1,56 @@
+import threading
+import traceback
+from collections import deque
+from concurrent.futures import ThreadPoolExecutor
+
+class Actor:
+    """Runs posted calls one at a time, in order, on a shared worker pool.
+
+    Any thread may post(); at most one worker drains a given actor's inbox
+    at a time, so state owned by the actor needs no further locking while
+    different actors still run in parallel across the pool.
+    """
+    BATCH = 64
+
+    def __init__(self, executor=None):
+        self.executor = executor or get_default_executor()
+        self.inbox = deque()
+        self.inbox_lock = threading.Lock()
+        self.scheduled = False
+
+    def post(self, fn, *args):
+        with self.inbox_lock:
+            self.inbox.append((fn, args))
+            if self.scheduled:
+                return
+            self.scheduled = True
+        self.executor.submit(self.drain)
+
+    def drain(self):
+        # Process a bounded batch, then yield the worker so one busy room
+        # can't starve the others sharing the pool.
+        for _ in range(self.BATCH):
+            with self.inbox_lock:
+                if not self.inbox:
+                    self.scheduled = False
+                    return
+                fn, args = self.inbox.popleft()
+            try:
+                fn(*args)
+            except Exception:
+                print(f"Error in {type(self).__name__} actor:")
+                traceback.print_exc()
+        self.executor.submit(self.drain)
+
+    def inbox_depth(self):
+        return len(self.inbox)
+
+_default_executor = None
+_default_lock = threading.Lock()
+
+def get_default_executor():
+    global _default_executor
+    with _default_lock:
+        if _default_executor is None:
+            _default_executor = ThreadPoolExecutor(max_workers=4, thread_name_prefix="room-worker")
+        return _default_executor
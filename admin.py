@@ -4,6 +4,8 @@ import threading
 import json
 import time
 from typing import Dict, List, Any, Optional
+from protocol import FrameReader, encode_message
+
 from PyQt5.QtWidgets import (QApplication, QMainWindow, QWidget, QVBoxLayout, 
                             QHBoxLayout, QLabel, QLineEdit, QPushButton, 
                             QTextEdit, QTabWidget, QTableWidget,
@@ -24,21 +26,18 @@ class NetworkThread(QThread):
         self.running = True
         
     def run(self):
-        buffer = ""
+        reader = FrameReader()
         try:
             while self.running:
-                data = self.socket.recv(1024).decode('utf-8')
-                if not data:
+                frames = reader.recv(self.socket)
+                if frames is None:
                     break
-                buffer += data
-                while '\n' in buffer:
-                    line, buffer = buffer.split('\n', 1)
-                    if line.strip():
-                        try:
-                            message = json.loads(line.strip())
-                            self.receiver.message_received.emit(message)
-                        except json.JSONDecodeError:
-                            pass
+                for frame in frames:
+                    try:
+                        message = json.loads(frame)
+                        self.receiver.message_received.emit(message)
+                    except json.JSONDecodeError:
+                        pass
         except:
             pass
         finally:
@@ -56,8 +55,12 @@ class ServerGUI(QMainWindow):
         self.update_timer = QTimer()
         self.clients_data = []
         self.rooms_data = []
+        self.clients_by_address = {}
+        self.rooms_by_code = {}
         self.client_count = 0
         self.room_count = 0
+        self.timer_stats = {}
+        self.profiling = False
         
         self.setup_ui()
         self.setup_connections()
@@ -207,8 +210,8 @@ class ServerGUI(QMainWindow):
         layout = QVBoxLayout()
         
         self.clients_table = QTableWidget()
-        self.clients_table.setColumnCount(4)
-        self.clients_table.setHorizontalHeaderLabels(["Nickname", "Address", "Room", "Status"])
+        self.clients_table.setColumnCount(5)
+        self.clients_table.setHorizontalHeaderLabels(["Nickname", "Address", "Room", "Status", "Send Queue"])
         self.clients_table.horizontalHeader().setStretchLastSection(True)
         self.clients_table.setSelectionBehavior(QAbstractItemView.SelectRows)
         
@@ -295,9 +298,14 @@ class ServerGUI(QMainWindow):
         self.save_log_btn = QPushButton("Save Log")
         self.save_log_btn.clicked.connect(self.save_log)
         
+        self.profile_btn = QPushButton("Profile Server")
+        self.profile_btn.clicked.connect(self.toggle_profile)
+        self.profile_btn.setEnabled(False)
+        
         log_actions_layout.addWidget(self.clear_log_btn)
         log_actions_layout.addWidget(self.save_log_btn)
         log_actions_layout.addStretch()
+        log_actions_layout.addWidget(self.profile_btn)
         
         layout.addLayout(log_actions_layout)
         
@@ -351,6 +359,8 @@ class ServerGUI(QMainWindow):
         self.network_thread = None
         self.clients_data = []
         self.rooms_data = []
+        self.clients_by_address = {}
+        self.rooms_by_code = {}
         self.client_count = 0
         self.room_count = 0
         self.update_display()
@@ -358,13 +368,14 @@ class ServerGUI(QMainWindow):
         self.connect_btn.setEnabled(True)
         self.disconnect_btn.setEnabled(False)
         self.server_input.setEnabled(True)
+        self.set_profiling(False)
+        self.profile_btn.setEnabled(False)
         self.log_message("Disconnected from server")
         
     def send_message(self, message):
         if self.socket:
             try:
-                json_msg = json.dumps(message) + '\n'
-                self.socket.send(json_msg.encode('utf-8'))
+                self.socket.sendall(encode_message(message))
             except:
                 self.handle_disconnect()
                 
@@ -375,6 +386,7 @@ class ServerGUI(QMainWindow):
         if msg_type == "ADMIN_LOGIN_SUCCESS":
             self.status_label.setText(f"Status: Connected as Admin")
             self.log_message("Admin login successful")
+            self.profile_btn.setEnabled(True)
             
         elif msg_type == "ADMIN_LOGIN_ERROR":
             self.log_message(f"Admin login failed: {data.get('message')}")
@@ -382,27 +394,57 @@ class ServerGUI(QMainWindow):
             QMessageBox.critical(self, "Error", data.get("message"))
             
         elif msg_type == "ADMIN_UPDATE":
-            self.clients_data = data.get("clients", [])
-            self.rooms_data = data.get("rooms", [])
+            self.apply_admin_update(data)
             self.client_count = data.get("client_count", 0)
             self.room_count = data.get("room_count", 0)
+            self.timer_stats = data.get("timers", {})
             self.update_display()
             
         elif msg_type == "ADMIN_ERROR":
             self.log_message(f"Admin command error: {data.get('message')}")
             QMessageBox.warning(self, "Error", data.get("message"))
             
+        elif msg_type == "ADMIN_PROFILE_STATUS":
+            self.set_profiling(data.get("running", False))
+            if self.profiling:
+                self.log_message(f"Profiling server threads for {data.get('seconds', 0):.0f}s")
+                
+        elif msg_type == "ADMIN_PROFILE_RESULT":
+            self.set_profiling(False)
+            self.show_profile(data)
+            
         elif msg_type == "SERVER_SHUTDOWN":
             self.log_message("Server is shutting down")
             QMessageBox.critical(self, "Server Shutdown", data.get("message"))
             self.disconnect_from_server()
             
+    def apply_admin_update(self, data):
+        """Merge a full or delta ADMIN_UPDATE into the client and room tables"""
+        if data.get("full", True):
+            self.clients_by_address = {}
+            self.rooms_by_code = {}
+        for address in data.get("removed_clients", []):
+            self.clients_by_address.pop(address, None)
+        for code in data.get("removed_rooms", []):
+            self.rooms_by_code.pop(code, None)
+        for client in data.get("clients", []):
+            self.clients_by_address[client["address"]] = client
+        for room in data.get("rooms", []):
+            self.rooms_by_code[room["code"]] = room
+        self.clients_data = list(self.clients_by_address.values())
+        self.rooms_data = list(self.rooms_by_code.values())
+        
     def handle_disconnect(self):
         self.disconnect_from_server()
         QMessageBox.critical(self, "Disconnected", "Connection to server lost")
         
     def update_display(self):
-        self.info_label.setText(f"Clients: {self.client_count} | Rooms: {self.room_count}")
+        info_text = f"Clients: {self.client_count} | Rooms: {self.room_count}"
+        if self.timer_stats:
+            info_text += (f" | Timers: {self.timer_stats.get('pending', 0)} pending, "
+                          f"lag avg {self.timer_stats.get('lag_avg_ms', 0):.1f} ms / "
+                          f"max {self.timer_stats.get('lag_max_ms', 0):.1f} ms")
+        self.info_label.setText(info_text)
         self.update_clients_table()
         self.update_rooms_table()
         
@@ -413,6 +455,8 @@ class ServerGUI(QMainWindow):
             self.clients_table.setItem(i, 1, QTableWidgetItem(client["address"]))
             self.clients_table.setItem(i, 2, QTableWidgetItem(client["room"]))
             self.clients_table.setItem(i, 3, QTableWidgetItem(client["status"]))
+            queue_text = f"{client.get('queue', 0)} msgs ({client.get('queue_bytes', 0) / 1024:.1f} KB)"
+            self.clients_table.setItem(i, 4, QTableWidgetItem(queue_text))
             
     def update_rooms_table(self):
         self.rooms_table.setRowCount(len(self.rooms_data))
@@ -512,6 +556,45 @@ class ServerGUI(QMainWindow):
             })
             self.log_message(f"Broadcasted to room {room_code}: {message}")
             
+    def toggle_profile(self):
+        if self.profiling:
+            self.send_message({
+                "type": "ADMIN_PROFILE",
+                "user": "ADMIN",
+                "data": {"action": "stop"}
+            })
+            self.log_message("Stop profiling command sent")
+            return
+        from PyQt5.QtWidgets import QInputDialog
+        seconds, ok = QInputDialog.getInt(self, 'Profile Server',
+                                          'Seconds to sample all server threads:', 30, 1, 600)
+        if ok:
+            self.send_message({
+                "type": "ADMIN_PROFILE",
+                "user": "ADMIN",
+                "data": {"action": "start", "seconds": seconds}
+            })
+            
+    def set_profiling(self, running):
+        self.profiling = running
+        self.profile_btn.setText("Stop Profiling" if running else "Profile Server")
+        
+    def show_profile(self, result):
+        """Log a finished profile's summary and show its top functions"""
+        if "error" in result:
+            self.log_message(f"Profile failed: {result['error']}")
+            QMessageBox.warning(self, "Profile", result["error"])
+            return
+        self.log_message(f"Profile: {result['samples']} thread samples over {result['seconds']:.1f}s, "
+                         f"{result['busy']} busy; saved to {result['folded']} and {result['pstats']}")
+        lines = [f"{row['self_pct']:5.1f}% self {row['total_pct']:5.1f}% total  {row['function']}"
+                 for row in result.get("top", [])]
+        for line in lines:
+            self.log_message("  " + line)
+        summary = "\n".join(lines[:10]) or "No busy samples: every server thread was waiting"
+        QMessageBox.information(self, "Profile", f"Top functions (busy samples only):\n\n{summary}\n\n"
+                                                 f"Saved on the server to:\n{result['folded']}\n{result['pstats']}")
+        
     def log_message(self, message):
         timestamp = time.strftime("[%H:%M:%S] ")
         self.log_text.append(timestamp + message)
@@ -0,0 +1,96 @@
+import threading
+import time
+
+DEFAULT_ADMIN_RATE = 4.0
+DEFAULT_ADMIN_RESYNC = 30.0
+
+class AdminFeed:
+    """Coalesced, delta-based ADMIN_UPDATE stream for the admin panel.
+
+    request() is what the request paths call: it only marks the feed dirty
+    and, if no flush is pending, schedules one on the server's timer
+    scheduler no sooner than 1/max_rate after the previous send. flush()
+    runs on a timer worker, diffs client and room rows against what the
+    admin was last sent and ships only the changes. Every resync_interval
+    seconds (and after reset(), e.g. on admin login) it sends the full
+    tables instead.
+    """
+    def __init__(self, server, max_rate=DEFAULT_ADMIN_RATE, resync_interval=DEFAULT_ADMIN_RESYNC,
+                 clock=time.monotonic):
+        self.server = server
+        self.min_interval = 1.0 / max_rate if max_rate > 0 else 0.0
+        self.resync_interval = resync_interval
+        self.clock = clock
+        self.lock = threading.Lock()
+        self.flush_lock = threading.Lock()
+        self.scheduled = False
+        self.last_sent = float("-inf")
+        self.last_full = float("-inf")
+        self.sent_clients = {}
+        self.sent_rooms = {}
+        self.requests = 0
+        self.updates = 0
+        self.full_updates = 0
+
+    def request(self):
+        with self.lock:
+            self.requests += 1
+            if self.scheduled:
+                return
+            self.scheduled = True
+            delay = max(0.0, self.last_sent + self.min_interval - self.clock())
+        self.server.scheduler.call_later(delay, self.flush)
+
+    def reset(self):
+        """Force the next update to carry the full tables (new admin connection)."""
+        with self.flush_lock:
+            self.last_full = float("-inf")
+
+    def client_rows(self):
+        rows = {}
+        for client in list(self.server.clients):
+            if not client.is_admin:
+                row = self.server.admin_client_row(client)
+                rows[row["address"]] = row
+        return rows
+
+    def room_rows(self):
+        return {code: self.server.admin_room_row(room) for code, room in list(self.server.rooms.items())}
+
+    def flush(self):
+        with self.lock:
+            self.scheduled = False
+            self.last_sent = self.clock()
+        with self.flush_lock:
+            admin = self.server.admin_client
+            if admin is None or admin not in self.server.clients:
+                self.sent_clients = {}
+                self.sent_rooms = {}
+                return
+            clients = self.client_rows()
+            rooms = self.room_rows()
+            now = self.clock()
+            data = {
+                "timers": self.server.scheduler.stats(),
+                "client_count": len(clients),
+                "room_count": len(rooms)
+            }
+            if now - self.last_full >= self.resync_interval:
+                self.last_full = now
+                self.full_updates += 1
+                data["full"] = True
+                data["clients"] = list(clients.values())
+                data["rooms"] = list(rooms.values())
+            else:
+                data["full"] = False
+                data["clients"] = [row for key, row in clients.items() if self.sent_clients.get(key) != row]
+                data["rooms"] = [row for key, row in rooms.items() if self.sent_rooms.get(key) != row]
+                data["removed_clients"] = [key for key in self.sent_clients if key not in clients]
+                data["removed_rooms"] = [key for key in self.sent_rooms if key not in rooms]
+            self.sent_clients = clients
+            self.sent_rooms = rooms
+            self.updates += 1
+            admin.send_message({"type": "ADMIN_UPDATE", "user": "SERVER", "data": data})
+
+    def stats(self):
+        return {"requests": self.requests, "updates": self.updates, "full_updates": self.full_updates}
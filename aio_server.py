@@ -0,0 +1,240 @@
+import asyncio
+import concurrent.futures
+import json
+import threading
+from collections import deque
+from typing import Optional
+
+from protocol import FrameReader, ProtocolError, encode_message
+from server import DEFAULT_OUTBOUND_HIGH_WATER, QuizServer
+
+class AsyncClient:
+    """Client connection served by the asyncio engine.
+
+    Exposes the same interface as server.Client so QuizRoom and
+    QuizServer.process_message work unchanged. send_message may be called
+    from room timer threads, so writes are marshalled onto the event loop
+    and queued for a per-connection writer task.
+    """
+    def __init__(self, reader, writer, loop, high_water=DEFAULT_OUTBOUND_HIGH_WATER):
+        self.reader = reader
+        self.writer = writer
+        self.loop = loop
+        self.loop_thread = threading.get_ident()
+        self.address = writer.get_extra_info('peername') or ("unknown", 0)
+        self.nickname = None
+        self.current_room = None
+        self.is_admin = False
+        self.closed = False
+        self.evicted = False
+        self.sent_messages = 0
+        self.sent_bytes = 0
+        self.framer = FrameReader()
+        self.high_water = high_water
+        self.outbound = deque()
+        self.outbound_bytes = 0
+        self.wakeup = asyncio.Event()
+        self.flush_waiters = []
+        self.writer_task = loop.create_task(self.write_loop())
+
+    def send_message(self, message):
+        try:
+            data = encode_message(message)
+        except (TypeError, ValueError):
+            return
+        self.send_bytes(data)
+
+    def send_bytes(self, data):
+        self.call_on_loop(self._write, data)
+
+    def call_on_loop(self, callback, *args):
+        if threading.get_ident() == self.loop_thread:
+            callback(*args)
+        else:
+            try:
+                self.loop.call_soon_threadsafe(callback, *args)
+            except RuntimeError:
+                pass
+
+    def _write(self, data):
+        if self.closed:
+            return
+        self.outbound.append(data)
+        self.outbound_bytes += len(data)
+        self.sent_messages += 1
+        self.sent_bytes += len(data)
+        if self.outbound_bytes + self.transport_buffered() > self.high_water:
+            self.evict()
+        else:
+            self.wakeup.set()
+
+    def transport_buffered(self):
+        transport = self.writer.transport
+        return transport.get_write_buffer_size() if transport is not None else 0
+
+    def queue_depth(self):
+        return len(self.outbound), self.outbound_bytes + self.transport_buffered()
+
+    async def write_loop(self):
+        try:
+            while True:
+                await self.wakeup.wait()
+                self.wakeup.clear()
+                if self.outbound:
+                    batch = list(self.outbound)
+                    self.outbound.clear()
+                    self.outbound_bytes = 0
+                    self.writer.writelines(batch)
+                    await self.writer.drain()
+                if self.flush_waiters and not self.outbound:
+                    # drain() only waits for the high-water mark; a flush waits for empty
+                    self.writer.transport.set_write_buffer_limits(0)
+                    await self.writer.drain()
+                    self.release_flush_waiters()
+                if self.closed and not self.outbound:
+                    break
+        except (ConnectionError, OSError):
+            pass
+        finally:
+            self.release_flush_waiters()
+            try:
+                self.writer.close()
+            except Exception:
+                pass
+
+    def release_flush_waiters(self):
+        waiters, self.flush_waiters = self.flush_waiters, []
+        for waiter in waiters:
+            if not waiter.done():
+                waiter.set_result(None)
+
+    def evict(self):
+        print(f"Evicting slow client {self.nickname or self.address}: "
+              f"outbound queue over {self.high_water} bytes")
+        self.evicted = True
+        self.closed = True
+        self.outbound.clear()
+        self.outbound_bytes = 0
+        self.writer.transport.abort()
+        self.wakeup.set()
+
+    def flush(self, timeout):
+        """Wait up to timeout seconds until everything queued so far has left
+        the transport. Called from other threads (shutdown); on the loop thread
+        itself, or with the loop stopped, there is nothing to wait for."""
+        if threading.get_ident() == self.loop_thread or not self.loop.is_running():
+            return
+        try:
+            future = asyncio.run_coroutine_threadsafe(self.drained(), self.loop)
+        except RuntimeError:
+            return
+        try:
+            future.result(timeout)
+        except (concurrent.futures.TimeoutError, concurrent.futures.CancelledError):
+            future.cancel()
+
+    async def drained(self):
+        if self.writer_task.done():
+            return
+        waiter = self.loop.create_future()
+        self.flush_waiters.append(waiter)
+        self.wakeup.set()
+        await waiter
+
+    def close(self):
+        self.call_on_loop(self._close)
+
+    def _close(self):
+        if self.closed:
+            return
+        self.closed = True
+        self.wakeup.set()
+
+    async def receive_messages(self) -> Optional[list]:
+        while True:
+            data = await self.reader.read(self.framer.recv_size)
+            if not data:
+                return None
+            frames = self.framer.feed(data)
+            if frames:
+                return [json.loads(frame) for frame in frames]
+
+class AsyncQuizServer(QuizServer):
+    """QuizServer that multiplexes every connection on one asyncio event loop.
+
+    Game flow (QuizRoom), process_message and the admin protocol are shared
+    with the threaded engine; only accept/recv/send are replaced.
+    """
+    engine = "asyncio"
+
+    def __init__(self, host='127.0.0.1', port=8888, backlog=1024, **options):
+        # Every other option, and its default, belongs to QuizServer
+        super().__init__(host, port, backlog=backlog, **options)
+        self.loop = None
+        self.aio_server = None
+        self.shutdown_thread = None
+
+    def start_server(self):
+        self.running = True
+        raise_fd_limit()
+        try:
+            asyncio.run(self.serve())
+        except KeyboardInterrupt:
+            print("\nKeyboard interrupt received...")
+        except Exception as e:
+            print(f"Server error: {e}")
+        finally:
+            self.shutdown_server()
+
+    def signal_handler(self, signum, frame):
+        # Signals run on the main thread, which here is the event loop's. Shutdown
+        # waits for each client's writer task to send SERVER_SHUTDOWN, so it
+        # has to run on its own thread while the loop keeps going.
+        if self.shutdown_thread is not None:
+            return
+        print(f"\nReceived signal {signum}. Shutting down server...")
+        self.shutdown_thread = threading.Thread(target=self.shutdown_server, name="shutdown")
+        self.shutdown_thread.start()
+
+    async def serve(self):
+        self.loop = asyncio.get_running_loop()
+        self.aio_server = await asyncio.start_server(
+            self.handle_connection, self.host, self.port,
+            backlog=self.backlog, reuse_address=True
+        )
+        self.print_banner()
+        self.start_background_threads()
+        async with self.aio_server:
+            await self.aio_server.serve_forever()
+
+    async def handle_connection(self, reader, writer):
+        client = AsyncClient(reader, writer, self.loop, self.outbound_high_water)
+        self.clients.add(client)
+        try:
+            while self.running:
+                messages = await client.receive_messages()
+                if not messages:
+                    break
+                for message in messages:
+                    self.dispatch_message(client, message)
+        except (ConnectionError, ProtocolError, json.JSONDecodeError):
+            pass
+        except Exception as e:
+            print(f"Error handling client {client.address}: {e}")
+        finally:
+            self.disconnect_client(client)
+
+def raise_fd_limit():
+    # Each idle connection costs one file descriptor; lift the soft limit
+    # to the hard limit so 10k+ sockets fit without a manual `ulimit -n`.
+    try:
+        import resource
+    except ImportError:
+        return
+    try:
+        soft, hard = resource.getrlimit(resource.RLIMIT_NOFILE)
+        if hard == resource.RLIM_INFINITY or hard > soft:
+            target = hard if hard != resource.RLIM_INFINITY else max(soft, 65536)
+            resource.setrlimit(resource.RLIMIT_NOFILE, (target, hard))
+    except (ValueError, OSError):
+        pass
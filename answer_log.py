@@ -0,0 +1,390 @@
+"""Answer history: one row per answered (or timed out) question, stored by column.
+
+Rooms call AnswerLog.record() as answers are scored. Rows are buffered in one
+array per column and a background thread appends them to the current day's
+answers-YYYYMMDD.qlog file as a chunk:
+
+    header      4s magic "QLOG", u32 format version, u32 row count,
+                u32 distinct question count, u32 dictionary length
+    ids         the chunk's distinct question ids, u64 each
+    columns     row count values of each column in COLUMNS order, little-endian;
+                "question" is an index into ids, "player" a nickname hash
+    dictionary  UTF-8 JSON {question id: {"topic", "question", "options"}}
+                for questions not yet described in this file
+
+Chunks are self-contained, so a file can be appended to by several server
+runs. A column is read with one numpy.frombuffer call and the question column
+is remapped with one gather, so the analytics command below aggregates
+millions of rows without a Python loop. NumPy is only
+needed for analysis, not by the server.
+
+Usage:
+    python answer_log.py analyze [DIRECTORY] [--topic T] [--limit N]
+    python answer_log.py stats [DIRECTORY] [--out question_stats.json]
+"""
+import argparse
+import glob
+import hashlib
+import json
+import os
+import struct
+import sys
+import threading
+import time
+import traceback
+from array import array
+
+DEFAULT_ANSWER_LOG_DIR = "answers"
+MAGIC = b"QLOG"
+FORMAT_VERSION = 1
+HEADER = struct.Struct("<4sIIII")
+# name, array typecode, NumPy dtype
+COLUMNS = (
+    ("time", "d", "<f8"),
+    ("question", "I", "<u4"),
+    ("room", "I", "<u4"),
+    ("time_taken", "f", "<f4"),
+    ("points", "I", "<u4"),
+    ("correct", "B", "u1"),
+    ("option", "b", "i1"),
+    ("player", "I", "<u4"),
+)
+DEFAULT_STATS_PATH = "question_stats.json"
+MAX_OPTIONS = 8
+NOT_AN_OPTION = -1  # short answer, or text that matches no option
+NO_ANSWER = -2      # the question timed out
+EMPTY_ANSWER = -3   # an answer was submitted, but missing, null or blank
+
+def question_id(topic, text):
+    """Stable 64-bit id for a question, the same across restarts and files."""
+    digest = hashlib.blake2b(f"{topic}\0{text}".encode("utf-8"), digest_size=8).digest()
+    return int.from_bytes(digest, "little")
+
+def player_id(nickname):
+    """31-bit hash of a nickname; the log stores no names."""
+    digest = hashlib.blake2b(nickname.encode("utf-8"), digest_size=4).digest()
+    return int.from_bytes(digest, "little") & 0x7FFFFFFF
+
+class AnswerLog:
+    """Buffered, batched writer for answer rows. record() is an append to a
+    few arrays under a lock; encoding and file I/O happen on the flush thread
+    every flush_interval seconds or once flush_rows rows are buffered.
+
+    Question and player ids are cached by text and nickname so record()
+    hashes each only once; the caches are dropped whenever the log moves
+    to a new day's file, so they only hold what one day has seen."""
+    def __init__(self, directory=DEFAULT_ANSWER_LOG_DIR, flush_rows=8192, flush_interval=5.0):
+        self.directory = directory
+        self.flush_rows = flush_rows
+        self.flush_interval = flush_interval
+        self.lock = threading.Lock()
+        self.wakeup = threading.Condition(self.lock)
+        self.columns = self.empty_columns()
+        self.question_ids = {}
+        self.player_ids = {}
+        self.known = {}
+        self.described = set()
+        self.path = None
+        self.writer = None
+        self.closed = False
+        self.rows = 0
+        self.chunks = 0
+        self.bytes = 0
+        os.makedirs(directory, exist_ok=True)
+
+    def empty_columns(self):
+        columns = [array(typecode) for _, typecode, _ in COLUMNS]
+        columns[1] = array("Q")
+        return columns
+
+    def start(self):
+        if self.writer is None:
+            self.writer = threading.Thread(target=self.write_loop, name="answer-log", daemon=True)
+            self.writer.start()
+
+    def record(self, room_code, topic, question, nickname, answer, correct, time_taken, points, timed_out=False):
+        """Buffer one row. timed_out means the player did not answer in time;
+        a submitted answer that is None or blank is logged as EMPTY_ANSWER."""
+        text = question["question"]
+        key = (topic, text)
+        qid = self.question_ids.get(key)
+        if qid is None:
+            qid = self.question_ids[key] = question_id(topic, text)
+        player = self.player_ids.get(nickname)
+        if player is None:
+            player = self.player_ids[nickname] = player_id(nickname)
+        if timed_out:
+            option = NO_ANSWER
+        elif answer is None or isinstance(answer, str) and not answer.strip():
+            option = EMPTY_ANSWER
+        else:
+            options = question.get("options") or ()
+            option = options.index(answer) if answer in options else NOT_AN_OPTION
+            if option >= MAX_OPTIONS:
+                option = NOT_AN_OPTION
+        with self.lock:
+            if self.closed:
+                return
+            if qid not in self.known:
+                self.known[qid] = {"topic": topic, "question": text, "options": question.get("options")}
+            columns = self.columns
+            columns[0].append(time.time())
+            columns[1].append(qid)  # replaced by a chunk-local index when written
+            columns[2].append(int(room_code))
+            columns[3].append(time_taken)
+            columns[4].append(points)
+            columns[5].append(1 if correct else 0)
+            columns[6].append(option)
+            columns[7].append(player)
+            if len(columns[0]) == self.flush_rows:
+                self.wakeup.notify()
+
+    def write_loop(self):
+        while True:
+            with self.lock:
+                if not self.closed and len(self.columns[0]) < self.flush_rows:
+                    self.wakeup.wait(self.flush_interval)
+                closed = self.closed
+                columns, self.columns = self.columns, self.empty_columns()
+            try:
+                self.write_chunk(columns)
+            except Exception:
+                print("Answer log write failed:")
+                traceback.print_exc()
+            if closed:
+                return
+
+    def write_chunk(self, columns):
+        count = len(columns[0])
+        if not count:
+            return
+        path = os.path.join(self.directory, time.strftime("answers-%Y%m%d.qlog", time.gmtime(columns[0][0])))
+        if path != self.path:
+            # Each file describes every question it mentions, so files stand alone
+            self.path = path
+            self.described = set()
+            self.forget(columns[1])
+        # Buffered rows hold full 64-bit ids; the file stores them once per chunk
+        local = {qid: i for i, qid in enumerate(dict.fromkeys(columns[1]))}
+        ids = array("Q", local)
+        columns[1] = array("I", map(local.__getitem__, columns[1]))
+        new = local.keys() - self.described
+        dictionary = json.dumps({str(qid): self.known[qid] for qid in new}).encode("utf-8") if new else b""
+        if sys.byteorder != "little":
+            ids.byteswap()
+            for column in columns:
+                column.byteswap()
+        with open(path, "ab") as f:
+            f.write(HEADER.pack(MAGIC, FORMAT_VERSION, count, len(ids), len(dictionary)))
+            ids.tofile(f)
+            for column in columns:
+                column.tofile(f)
+            f.write(dictionary)
+        self.described.update(new)
+        self.rows += count
+        self.chunks += 1
+        self.bytes += HEADER.size + ids.itemsize * len(ids) + sum(c.itemsize * count for c in columns) + len(dictionary)
+
+    def forget(self, chunk_ids):
+        """Drop the id caches, keeping only the descriptions that rows still
+        waiting to be written (this chunk and the live buffer) need."""
+        with self.lock:
+            self.question_ids = {}
+            self.player_ids = {}
+            keep = set(chunk_ids)
+            keep.update(self.columns[1])
+            self.known = {qid: self.known[qid] for qid in keep}
+
+    def close(self, timeout=2.0):
+        with self.lock:
+            if self.closed:
+                return
+            self.closed = True
+            self.wakeup.notify()
+        if self.writer is not None:
+            self.writer.join(timeout)
+
+    def stats(self):
+        return {"rows": self.rows, "chunks": self.chunks, "bytes": self.bytes,
+                "buffered": len(self.columns[0])}
+
+def read_columns(paths):
+    """Every row in paths as {column name: NumPy array}, the sorted array of
+    question ids that the "question" column indexes, and {id: description}."""
+    import numpy as np
+    parts = {name: [] for name, _, _ in COLUMNS}
+    chunk_ids = []
+    questions = {}
+    for path in paths:
+        with open(path, "rb") as f:
+            data = f.read()
+        pos = 0
+        while pos + HEADER.size <= len(data):
+            magic, version, count, distinct, dictionary_size = HEADER.unpack_from(data, pos)
+            if magic != MAGIC or version != FORMAT_VERSION:
+                print(f"  ✗ {path}: unrecognized chunk at byte {pos}; skipping the rest of the file")
+                break
+            size = (HEADER.size + 8 * distinct + dictionary_size
+                    + sum(np.dtype(dtype).itemsize for _, _, dtype in COLUMNS) * count)
+            if pos + size > len(data):
+                print(f"  ✗ {path}: incomplete final chunk ({count} rows) ignored")
+                break
+            offset = pos + HEADER.size
+            chunk_ids.append(np.frombuffer(data, dtype="<u8", count=distinct, offset=offset))
+            offset += 8 * distinct
+            for name, _, dtype in COLUMNS:
+                parts[name].append(np.frombuffer(data, dtype=dtype, count=count, offset=offset))
+                offset += np.dtype(dtype).itemsize * count
+            if dictionary_size:
+                for qid, description in json.loads(data[offset:offset + dictionary_size]).items():
+                    questions.setdefault(int(qid), description)
+            pos += size
+    # Remap each chunk's local question indices onto one sorted id array
+    ids = np.unique(np.concatenate(chunk_ids)) if chunk_ids else np.zeros(0, "<u8")
+    parts["question"] = [np.searchsorted(ids, local_ids).astype("<u4")[local]
+                         for local_ids, local in zip(chunk_ids, parts["question"])]
+    columns = {name: np.concatenate(chunks) if chunks else np.zeros(0, dtype)
+               for (name, _, dtype), chunks in zip(COLUMNS, parts.values())}
+    return columns, ids, questions
+
+def analyze(columns, ids):
+    """Per-question aggregates, all computed with bincount over the question index.
+
+    Returns {"ids", "answers", "correct_rate", "difficulty", "mean_time",
+    "timeouts", "options"} where options is an (n, MAX_OPTIONS) count matrix.
+    """
+    import numpy as np
+    index = columns["question"]
+    n = len(ids)
+    option = columns["option"]
+    answered = option != NO_ANSWER
+    total = np.bincount(index, minlength=n)
+    correct = np.bincount(index, weights=columns["correct"], minlength=n)
+    answered_count = np.bincount(index[answered], minlength=n)
+    time_sum = np.bincount(index[answered], weights=columns["time_taken"][answered], minlength=n)
+    chosen = option >= 0
+    options = np.bincount(index[chosen] * MAX_OPTIONS + option[chosen],
+                          minlength=n * MAX_OPTIONS).reshape(n, MAX_OPTIONS)
+    with np.errstate(invalid="ignore", divide="ignore"):
+        correct_rate = correct / total
+        mean_time = time_sum / answered_count
+    return {"ids": ids, "answers": total, "correct_rate": correct_rate, "difficulty": 1.0 - correct_rate,
+            "mean_time": mean_time, "timeouts": total - answered_count, "options": options}
+
+def discrimination(columns, ids):
+    """Per-question point-biserial correlation between answering it correctly
+    and the same player's correct rate on the rest of that game.
+
+    A game is (day, room, player); single-question games are left out.
+    Questions with too little data or no variance get NaN.
+    """
+    import numpy as np
+    n = len(ids)
+    index = columns["question"]
+    correct = columns["correct"].astype(np.float64)
+    day = (columns["time"] // 86400).astype(np.uint64)
+    # Room codes are five digits (< 2**17) and player ids 31 bits
+    game = (day << np.uint64(48)) | (columns["room"].astype(np.uint64) << np.uint64(31)) \
+        | columns["player"].astype(np.uint64)
+    _, game = np.unique(game, return_inverse=True)
+    game_answers = np.bincount(game)
+    game_correct = np.bincount(game, weights=correct)
+    others = game_answers[game] - 1
+    keep = others > 0
+    index, x = index[keep], correct[keep]
+    y = (game_correct[game][keep] - x) / others[keep]
+    count = np.bincount(index, minlength=n)
+    sx = np.bincount(index, weights=x, minlength=n)
+    sy = np.bincount(index, weights=y, minlength=n)
+    sxy = np.bincount(index, weights=x * y, minlength=n)
+    syy = np.bincount(index, weights=y * y, minlength=n)
+    with np.errstate(invalid="ignore", divide="ignore"):
+        # x is 0/1, so its sum of squares is its sum
+        cov = sxy - sx * sy / count
+        var_x = sx - sx * sx / count
+        var_y = syy - sy * sy / count
+        result = cov / np.sqrt(var_x * var_y)
+    result[count < 2] = np.nan
+    return result
+
+def question_stats(columns, ids):
+    """{hex id: {"difficulty", "discrimination", "answers"}} for selection.py."""
+    import numpy as np
+    stats = analyze(columns, ids)
+    rdis = discrimination(columns, ids)
+    result = {}
+    for i, qid in enumerate(ids.tolist()):
+        if not stats["answers"][i]:
+            continue
+        entry = {"difficulty": round(float(stats["difficulty"][i]), 4), "answers": int(stats["answers"][i])}
+        if not np.isnan(rdis[i]):
+            entry["discrimination"] = round(float(rdis[i]), 4)
+        result[f"{qid:016x}"] = entry
+    return result
+
+def write_stats(path, stats):
+    """Write the stats file atomically; a running server reloads it on "reload"."""
+    tmp_path = path + ".tmp"
+    with open(tmp_path, "w", encoding="utf-8") as f:
+        json.dump({"generated_at": time.time(), "questions": stats}, f)
+    os.replace(tmp_path, path)
+
+def print_report(stats, questions, topic=None, limit=20):
+    rows = []
+    for i, qid in enumerate(stats["ids"].tolist()):
+        description = questions.get(qid, {})
+        if topic and description.get("topic", "").lower() != topic.lower():
+            continue
+        rows.append((stats["difficulty"][i], i, description))
+    rows.sort(key=lambda row: -row[0])
+    print(f"{'Difficulty':>10} {'Answers':>9} {'Correct':>8} {'Mean s':>7} {'Timeouts':>9}  Question / option share")
+    for difficulty, i, description in rows[:limit]:
+        text = description.get("question", f"question {int(stats['ids'][i]):016x}")
+        print(f"{difficulty:>10.2f} {int(stats['answers'][i]):>9,} {stats['correct_rate'][i]:>7.0%} "
+              f"{stats['mean_time'][i]:>7.1f} {int(stats['timeouts'][i]):>9,}  "
+              f"[{description.get('topic', '?')}] {text[:60]}")
+        options = description.get("options") or []
+        counts = stats["options"][i]
+        chosen = counts.sum()
+        if options and chosen:
+            print(" " * 48 + "  ".join(f"{option[:20]}: {counts[j] / chosen:.0%}"
+                                       for j, option in enumerate(options[:MAX_OPTIONS])))
+    print(f"\n{len(rows)} questions, {int(sum(stats['answers'][i] for _, i, _ in rows)):,} answers")
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Answer history analytics (requires NumPy)")
+    sub = parser.add_subparsers(dest="command", required=True)
+    p = sub.add_parser("analyze", help="Per-question difficulty, response time and option distribution")
+    p.add_argument("directory", nargs="?", default=DEFAULT_ANSWER_LOG_DIR)
+    p.add_argument("--topic", help="Only report questions from this topic")
+    p.add_argument("--limit", type=int, default=20, help="Show the N hardest questions")
+    p = sub.add_parser("stats", help="Write per-question difficulty and discrimination for adaptive selection")
+    p.add_argument("directory", nargs="?", default=DEFAULT_ANSWER_LOG_DIR)
+    p.add_argument("--out", default=DEFAULT_STATS_PATH, help=f"Output file (default {DEFAULT_STATS_PATH})")
+    args = parser.parse_args(argv)
+    try:
+        import numpy  # noqa: F401
+    except ImportError:
+        print("Answer analytics need NumPy: pip install numpy")
+        return 1
+    paths = sorted(glob.glob(os.path.join(args.directory, "answers-*.qlog")))
+    if not paths:
+        print(f"No answer logs in {args.directory}")
+        return 1
+    start = time.perf_counter()
+    columns, ids, questions = read_columns(paths)
+    loaded = time.perf_counter() - start
+    if args.command == "stats":
+        stats = question_stats(columns, ids)
+        write_stats(args.out, stats)
+        print(f"  ✓ {args.out}: {len(stats)} questions from {len(columns['time']):,} rows "
+              f"(read {loaded:.2f}s, computed {time.perf_counter() - start - loaded:.2f}s)")
+        return 0
+    stats = analyze(columns, ids)
+    analyzed = time.perf_counter() - start - loaded
+    print_report(stats, questions, args.topic, args.limit)
+    print(f"{len(columns['time']):,} rows from {len(paths)} files: read {loaded:.2f}s, aggregated {analyzed:.2f}s")
+    return 0
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,1446 @@
+import argparse
+import json
+import os
+import socket
+import statistics
+import subprocess
+import sys
+import time
+
+HERE = os.path.dirname(os.path.abspath(__file__))
+
+def proc_status(pid):
+    """Return (rss_kb, threads) for a Linux process, or (None, None)."""
+    rss, threads = None, None
+    try:
+        with open(f"/proc/{pid}/status") as f:
+            for line in f:
+                if line.startswith("VmRSS:"):
+                    rss = int(line.split()[1])
+                elif line.startswith("Threads:"):
+                    threads = int(line.split()[1])
+    except OSError:
+        pass
+    return rss, threads
+
+def proc_cpu_seconds(pid):
+    try:
+        with open(f"/proc/{pid}/stat") as f:
+            fields = f.read().rsplit(")", 1)[1].split()
+        return (int(fields[11]) + int(fields[12])) / os.sysconf("SC_CLK_TCK")
+    except (OSError, IndexError, ValueError):
+        return None
+
+def round_trip(port, nickname):
+    sock = socket.create_connection(("127.0.0.1", port))
+    try:
+        start = time.perf_counter()
+        sock.sendall((json.dumps({"type": "JOIN_LOBBY", "user": nickname, "data": {}}) + "\n").encode("utf-8"))
+        buffer = b""
+        while b"\n" not in buffer:
+            chunk = sock.recv(65536)
+            if not chunk:
+                break
+            buffer += chunk
+        return time.perf_counter() - start
+    finally:
+        sock.close()
+
+def bench_engines(args):
+    import tempfile
+    from aio_server import raise_fd_limit
+    from loadgen import start_server
+    raise_fd_limit()
+    results = []
+    for offset, engine in enumerate(args.engines):
+        port = args.port + offset
+        # Journal, answer log and leaderboard off or in a scratch directory, as for
+        # loadgen: nothing is written to the tree and no fsync skews the comparison
+        directory = tempfile.TemporaryDirectory(prefix="bench_engines_")
+        proc = start_server(engine, port, directory.name)
+        sockets = []
+        try:
+            rss_before, _ = proc_status(proc.pid)
+            cpu_before = proc_cpu_seconds(proc.pid)
+            start = time.perf_counter()
+            failed = 0
+            for _ in range(args.connections):
+                try:
+                    sockets.append(socket.create_connection(("127.0.0.1", port), timeout=10))
+                except OSError:
+                    failed += 1
+            connect_time = time.perf_counter() - start
+            time.sleep(args.settle)
+            rss_after, threads = proc_status(proc.pid)
+            cpu_after = proc_cpu_seconds(proc.pid)
+            latencies = sorted(round_trip(port, f"bench{i}") for i in range(args.samples))
+            results.append({
+                "engine": engine,
+                "connections": len(sockets),
+                "failed": failed,
+                "connect_s": connect_time,
+                "rss_mb": (rss_after - rss_before) / 1024 if rss_after and rss_before else None,
+                "threads": threads,
+                "cpu_s": cpu_after - cpu_before if cpu_after is not None and cpu_before is not None else None,
+                "rtt_p50_ms": latencies[len(latencies) // 2] * 1000,
+                "rtt_max_ms": latencies[-1] * 1000,
+            })
+        finally:
+            for s in sockets:
+                s.close()
+            proc.kill()
+            proc.wait()
+            directory.cleanup()
+
+    print(f"{'Engine':<10} {'Conns':>7} {'Failed':>7} {'Connect s':>10} {'+RSS MB':>8} "
+          f"{'Threads':>8} {'CPU s':>7} {'RTT p50':>9} {'RTT max':>9}")
+    print("-" * 84)
+    for r in results:
+        fmt = lambda v, spec: format(v, spec) if v is not None else "n/a"
+        print(f"{r['engine']:<10} {r['connections']:>7} {r['failed']:>7} {r['connect_s']:>10.2f} "
+              f"{fmt(r['rss_mb'], '>8.1f')} {fmt(r['threads'], '>8')} {fmt(r['cpu_s'], '>7.2f')} "
+              f"{r['rtt_p50_ms']:>7.2f}ms {r['rtt_max_ms']:>7.2f}ms")
+    return results
+
+def legacy_split_frames(chunks):
+    # The pre-FrameReader loop: str buffer, decode per recv, split per line.
+    # JSON parsing is identical on both paths and left out of the timing.
+    messages = 0
+    buffer = ""
+    for chunk in chunks:
+        buffer += chunk.decode('utf-8')
+        while '\n' in buffer:
+            line, buffer = buffer.split('\n', 1)
+            if line.strip():
+                line.strip()
+                messages += 1
+    return messages
+
+def framereader_frames(chunks, recv_size):
+    from protocol import FrameReader
+    reader = FrameReader(recv_size=recv_size)
+    messages = 0
+    for chunk in chunks:
+        messages += len(reader.feed(chunk))
+    return messages
+
+def sample_stream(count):
+    from protocol import encode_message
+    parts = []
+    for i in range(count):
+        if i % 3 == 0:
+            parts.append(encode_message({"type": "ANSWER", "room_code": "12345", "user": f"player{i % 500}",
+                                         "data": {"answer": "Secure Socket Layer"}}))
+        elif i % 3 == 1:
+            parts.append(encode_message({"type": "ROOM_CHAT", "room_code": "12345", "user": f"player{i % 500}",
+                                         "data": {"message": "gg " * 10}}))
+        else:
+            parts.append(encode_message({"type": "QUESTION", "room_code": "12345", "user": "SERVER",
+                                         "data": {"question_num": 1, "total_questions": 10,
+                                                  "question": "Which encryption is symmetric?" * 4,
+                                                  "type": "mcq", "options": ["RSA", "AES", "DSA", "ECC"],
+                                                  "time_limit": 30}}))
+    return b"".join(parts)
+
+def bench_framing(args):
+    stream = sample_stream(args.messages)
+    print(f"Stream: {args.messages} messages, {len(stream) / 1e6:.1f} MB")
+    print(f"{'Recv size':>10} {'Legacy MB/s':>12} {'FrameReader MB/s':>17} {'Speedup':>8}")
+    print("-" * 51)
+    results = []
+    for recv_size in args.recv_sizes:
+        chunks = [stream[i:i + recv_size] for i in range(0, len(stream), recv_size)]
+        timings = {}
+        for name, func in (("legacy", lambda: legacy_split_frames(chunks)),
+                           ("framereader", lambda: framereader_frames(chunks, recv_size))):
+            best = None
+            for _ in range(args.repeat):
+                start = time.perf_counter()
+                count = func()
+                elapsed = time.perf_counter() - start
+                best = elapsed if best is None else min(best, elapsed)
+            assert count == args.messages, (name, count)
+            timings[name] = best
+        mb = len(stream) / 1e6
+        results.append({"recv_size": recv_size, "legacy_s": timings["legacy"], "framereader_s": timings["framereader"]})
+        print(f"{recv_size:>10} {mb / timings['legacy']:>12.1f} {mb / timings['framereader']:>17.1f} "
+              f"{timings['legacy'] / timings['framereader']:>7.2f}x")
+    return results
+
+class NullSocket:
+    def send(self, data):
+        return len(data)
+
+    def sendall(self, data):
+        pass
+
+    def close(self):
+        pass
+
+def question_message(players):
+    return {
+        "type": "LEADERBOARD",
+        "room_code": "12345",
+        "user": "SERVER",
+        "data": {"scores": [[f"player{i}", i * 37] for i in range(min(players, 50))], "is_final": False}
+    }
+
+def bench_broadcast(args):
+    from server import Client, broadcast
+    print(f"{'Players':>8} {'Per-client ms':>14} {'Encode-once ms':>15} {'Speedup':>8}")
+    print("-" * 48)
+    results = []
+    for players in args.players:
+        clients = [Client(NullSocket(), ("127.0.0.1", 40000 + i)) for i in range(players)]
+        message = question_message(players)
+
+        def per_client():
+            for client in clients:
+                client.send_message(message)
+
+        timings = {}
+        for name, func in (("per_client", per_client), ("broadcast", lambda: broadcast(clients, message))):
+            best = None
+            for _ in range(args.repeat):
+                start = time.perf_counter()
+                func()
+                elapsed = time.perf_counter() - start
+                best = elapsed if best is None else min(best, elapsed)
+            timings[name] = best
+        results.append({"players": players, **timings})
+        print(f"{players:>8} {timings['per_client'] * 1000:>14.3f} {timings['broadcast'] * 1000:>15.3f} "
+              f"{timings['per_client'] / timings['broadcast']:>7.1f}x")
+    return results
+
+class RecordingClient:
+    """Stand-in for server.Client that records every frame it is sent."""
+    def __init__(self, nickname):
+        self.nickname = nickname
+        self.current_room = None
+        self.is_admin = False
+        self.frames = []
+
+    def send_bytes(self, data):
+        self.frames.append(data)
+
+    def send_message(self, message):
+        self.frames.append(message)
+
+    def messages(self, skip_type=None):
+        prefix = b'{"type": "%s"' % skip_type.encode() if skip_type else None
+        return [json.loads(f) if isinstance(f, (bytes, bytearray)) else f
+                for f in self.frames if not (prefix and isinstance(f, bytes) and f.startswith(prefix))]
+
+def stress_questions(count):
+    return [{"type": "short", "question": f"Question {i}?", "answer": f"answer{i}"} for i in range(count)]
+
+def run_stress_room(players, questions, threads=16, workers=4, timeout=1.0, answer_rate=0.9, seed=1):
+    """One room, players clients, questions rounds of concurrent traffic through
+    QuizRoom.post: every answer posted twice from different threads, stale
+    force_next_question ticks, and 1% of players leaving halfway. Waits for
+    the quiz to end and returns what happened; checking it is up to the caller.
+
+    The result's "plan" has, per question, {player index: answer posted};
+    odd players post the right answer and even players a wrong one.
+    """
+    import random
+    import threading
+    from concurrent.futures import ThreadPoolExecutor
+    from scheduler import TimerScheduler
+    from server import QuizRoom
+
+    scheduler = TimerScheduler(workers=4)
+    executor = ThreadPoolExecutor(max_workers=workers)
+    room = QuizRoom("99999", "Stress", stress_questions(questions), scheduler, executor)
+    room.QUESTION_TIMEOUT = timeout
+    room.REVEAL_DELAY = 0.01
+    room.NEXT_DELAY = 0.01
+    clients = [RecordingClient(f"player{i}") for i in range(players)]
+    for client in clients:
+        room.post(room.add_client, client)
+    room.post(room.start_quiz)
+
+    rng = random.Random(seed)
+    leavers = set(rng.sample(range(players), players // 100))
+    plan = []
+    posted = 0
+    start = time.perf_counter()
+    for q in range(questions):
+        deadline = time.time() + timeout * 4 + 5
+        while room.current_question_index < q or room.question_closed:
+            if room.status == "Finished" or time.time() > deadline:
+                break
+            time.sleep(0.001)
+
+        answers = {i: (f"answer{q}" if i % 2 else "wrong") for i in range(players) if rng.random() < answer_rate}
+        plan.append(answers)
+
+        def fire(own, other):
+            # Each player's answer is posted by two different threads at once,
+            # along with stale timer ticks left over from the previous question.
+            count = 0
+            for chunk in (own, other):
+                for i in chunk:
+                    client = clients[i]
+                    if q == questions // 2 and i in leavers:
+                        room.post(room.remove_client, client)
+                    elif i in answers:
+                        room.post(room.process_answer, client, answers[i])
+                        count += 1
+                    if i % 97 == 0 and q > 0:
+                        room.post(room.force_next_question, q - 1)
+                        count += 1
+            return count
+
+        chunks = [range(t, players, threads) for t in range(threads)]
+        results = []
+        pool = [threading.Thread(target=lambda t=t: results.append(fire(chunks[t], chunks[(t + 1) % threads])))
+                    for t in range(threads)]
+        for t in pool:
+            t.start()
+        for t in pool:
+            t.join()
+        posted += sum(results)
+
+    deadline = time.time() + timeout * 4 + 10
+    while room.status != "Finished" and time.time() < deadline:
+        time.sleep(0.01)
+    elapsed = time.perf_counter() - start
+    time.sleep(0.2)
+    scheduler.shutdown()
+    executor.shutdown(wait=False)
+    return {"room": room, "clients": clients, "leavers": leavers, "plan": plan, "posted": posted,
+            "elapsed": elapsed}
+
+def stress_room_errors(run, questions):
+    """Consistency problems in a run_stress_room() result, as readable lines."""
+    room = run["room"]
+    errors = []
+    if room.status != "Finished":
+        errors.append(f"room did not finish (status {room.status}, question {room.current_question_index})")
+    if room.current_question_index != questions:
+        errors.append(f"question index {room.current_question_index}, expected {questions}")
+    for client in (c for c in run["clients"] if c in room.clients):
+        messages = client.messages(skip_type="LEADERBOARD")
+        question_nums = [m["data"]["question_num"] for m in messages if m["type"] == "QUESTION"]
+        if question_nums != list(range(1, questions + 1)):
+            errors.append(f"{client.nickname}: question sequence {question_nums}")
+        updates = [m["data"]["points"] for m in messages if m["type"] == "SCORE_UPDATE"]
+        if len(updates) != questions:
+            errors.append(f"{client.nickname}: {len(updates)} score updates for {questions} questions")
+        if sum(updates) != room.scores.get(client.nickname):
+            errors.append(f"{client.nickname}: points {sum(updates)} != score {room.scores.get(client.nickname)}")
+        ends = [m for m in messages if m["type"] == "QUIZ_END"]
+        if len(ends) != 1:
+            errors.append(f"{client.nickname}: {len(ends)} QUIZ_END messages")
+        if len(errors) > 20:
+            break
+    return errors
+
+def bench_stress_room(args):
+    sys.setswitchinterval(args.switch_interval)
+    run = run_stress_room(args.players, args.questions, args.threads, args.workers, args.timeout, seed=args.seed)
+    errors = stress_room_errors(run, args.questions)
+    remaining = sum(1 for c in run["clients"] if c in run["room"].clients)
+    print(f"Players: {args.players}  questions: {args.questions}  posted room messages: {run['posted']}")
+    print(f"Completed in {run['elapsed']:.2f}s; {remaining} players finished, {args.players - remaining} left mid-quiz")
+    if errors:
+        print(f"FAILED: {len(errors)} consistency errors")
+        for e in errors[:20]:
+            print("  " + e)
+        sys.exit(1)
+    print("OK: scores, question index and message sequences are consistent")
+
+def quiet_server(**kwargs):
+    import contextlib
+    import io
+    from server import QuizServer
+    with contextlib.redirect_stdout(io.StringIO()):
+        return QuizServer(**kwargs)
+
+def bench_indexes(args):
+    import contextlib
+    from server import Client
+    print(f"{'Clients':>8} {'Lookup us':>10} {'Legacy scan us':>15} {'Disconnect us':>14} {'Legacy remove us':>17}")
+    print("-" * 68)
+    results = []
+    for n in args.clients:
+        server = quiet_server()
+        clients = [Client(NullSocket(), ("127.0.0.1", i)) for i in range(n)]
+        for i, client in enumerate(clients):
+            server.clients.add(client)
+            server.enter_lobby(client, f"player{i}")
+        admin = Client(NullSocket(), ("127.0.0.1", 1))
+        admin.is_admin = True
+        legacy_list = list(clients)
+        targets = [f"player{i}" for i in range(n - 1, n - 1 - args.ops * 7, -7)]
+
+        with open(os.devnull, "w") as devnull, contextlib.redirect_stdout(devnull):
+            start = time.perf_counter()
+            for nickname in targets:
+                server.process_message(admin, {"type": "ADMIN_MESSAGE", "user": "ADMIN",
+                                               "data": {"nickname": nickname, "message": "hi"}})
+            lookup = (time.perf_counter() - start) / len(targets)
+
+            start = time.perf_counter()
+            for nickname in targets:
+                next((c for c in legacy_list if c.nickname == nickname and not c.is_admin), None)
+            legacy_lookup = (time.perf_counter() - start) / len(targets)
+
+            victims = clients[-args.ops:]
+            start = time.perf_counter()
+            for client in victims:
+                server.disconnect_client(client)
+            disconnect = (time.perf_counter() - start) / len(victims)
+
+            start = time.perf_counter()
+            for client in victims:
+                legacy_list.remove(client)
+            legacy_remove = (time.perf_counter() - start) / len(victims)
+
+        results.append({"clients": n, "lookup_us": lookup * 1e6, "legacy_lookup_us": legacy_lookup * 1e6,
+                        "disconnect_us": disconnect * 1e6, "legacy_remove_us": legacy_remove * 1e6})
+        print(f"{n:>8} {lookup * 1e6:>10.1f} {legacy_lookup * 1e6:>15.1f} {disconnect * 1e6:>14.1f} "
+              f"{legacy_remove * 1e6:>17.1f}")
+    return results
+
+def bench_lobby(args):
+    from protocol import encode_message
+    from server import QuizRoom
+    print(f"{'Rooms':>6} {'Rebuild us':>11} {'Snapshot us':>12} {'After change us':>16}")
+    print("-" * 48)
+    results = []
+    for n in args.rooms:
+        server = quiet_server()
+        for i in range(n):
+            room = QuizRoom(f"{i:05d}", "Python", [], server.scheduler, server.room_executor)
+            room.on_change = server.lobby.invalidate
+            server.rooms[room.code] = room
+        server.lobby.invalidate()
+
+        start = time.perf_counter()
+        for _ in range(args.requests):
+            encode_message(server.lobby.build_message())
+        rebuild = (time.perf_counter() - start) / args.requests
+
+        server.lobby.info_bytes()
+        start = time.perf_counter()
+        for _ in range(args.requests):
+            server.lobby.info_bytes()
+        snapshot = (time.perf_counter() - start) / args.requests
+
+        # One room change per --change-every requests: the first request
+        # after each change pays for the rebuild, the rest hit the cache.
+        rooms = list(server.rooms.values())
+        start = time.perf_counter()
+        for i in range(args.requests):
+            if i % args.change_every == 0:
+                rooms[i % n].changed()
+            server.lobby.info_bytes()
+        churn = (time.perf_counter() - start) / args.requests
+
+        results.append({"rooms": n, "rebuild_us": rebuild * 1e6, "snapshot_us": snapshot * 1e6,
+                        "churn_us": churn * 1e6})
+        print(f"{n:>6} {rebuild * 1e6:>11.1f} {snapshot * 1e6:>12.2f} {churn * 1e6:>16.1f}")
+        server.scheduler.shutdown()
+        server.room_executor.shutdown(wait=False)
+    return results
+
+def legacy_admin_update(server):
+    from protocol import encode_message
+    clients_data = [server.admin_client_row(client) for client in list(server.clients) if not client.is_admin]
+    rooms_data = [server.admin_room_row(room) for room in server.rooms.values()]
+    return encode_message({"type": "ADMIN_UPDATE", "user": "SERVER",
+                           "data": {"clients": clients_data, "rooms": rooms_data,
+                                    "timers": server.scheduler.stats(),
+                                    "client_count": len(server.clients) - 1, "room_count": len(server.rooms)}})
+
+def bench_admin(args):
+    from protocol import encode_message
+    from server import Client
+    print(f"{'Clients':>8} {'Legacy us/req':>14} {'Feed us/req':>12} {'Legacy KB/s':>12} {'Feed updates':>13} {'Feed KB/s':>10}")
+    print("-" * 76)
+    results = []
+    for n in args.clients:
+        server = quiet_server(admin_rate=args.rate)
+        clients = [Client(NullSocket(), ("127.0.0.1", i)) for i in range(n)]
+        for i, client in enumerate(clients):
+            server.clients.add(client)
+            server.enter_lobby(client, f"player{i}")
+        admin = RecordingClient("ADMIN")
+        admin.is_admin = True
+        admin.address = ("127.0.0.1", 1)
+        server.clients.add(admin)
+        server.admin_client = admin
+
+        # A busy server: every request moves one player and asks for an admin update.
+        def storm(update):
+            calls = 0
+            start = time.perf_counter()
+            spent = 0.0
+            while time.perf_counter() - start < args.duration:
+                client = clients[calls % n]
+                client.current_room = None if client.current_room else "12345"
+                t = time.perf_counter()
+                update()
+                spent += time.perf_counter() - t
+                calls += 1
+            return calls, spent
+
+        legacy_bytes = 0
+        def legacy():
+            nonlocal legacy_bytes
+            legacy_bytes += len(legacy_admin_update(server))
+        calls, spent = storm(legacy)
+        legacy_us = spent / calls * 1e6
+
+        admin.frames.clear()
+        calls, spent = storm(server.send_admin_update)
+        time.sleep(2 / args.rate)
+        feed_us = spent / calls * 1e6
+        feed_bytes = sum(len(encode_message(m)) for m in admin.frames)
+        results.append({"clients": n, "legacy_us": legacy_us, "feed_us": feed_us,
+                        "legacy_kbps": legacy_bytes / args.duration / 1024, "feed_updates": len(admin.frames),
+                        "feed_kbps": feed_bytes / args.duration / 1024})
+        print(f"{n:>8} {legacy_us:>14.1f} {feed_us:>12.2f} {legacy_bytes / args.duration / 1024:>12.0f} "
+              f"{len(admin.frames):>13} {feed_bytes / args.duration / 1024:>10.1f}")
+        server.scheduler.shutdown()
+        server.room_executor.shutdown(wait=False)
+    return results
+
+def bench_bank(args):
+    import contextlib
+    import io
+    from question_bank import QuestionBank
+    with contextlib.redirect_stdout(io.StringIO()):
+        start = time.perf_counter()
+        for _ in range(args.loads):
+            QuestionBank(args.directory).refresh()
+        cold = (time.perf_counter() - start) / args.loads
+
+        bank = QuestionBank(args.directory)
+        bank.refresh()
+        start = time.perf_counter()
+        for _ in range(args.loads):
+            bank.refresh()
+        warm = (time.perf_counter() - start) / args.loads
+    stats = bank.stats()
+    print(f"Question files: {stats['files']}  topics: {len(bank.snapshot.topics)}")
+    print(f"Full parse (old per-JOIN_LOBBY reload): {cold * 1e6:9.1f} us")
+    print(f"Cached refresh, nothing changed:        {warm * 1e6:9.1f} us  ({cold / warm:.0f}x)")
+    return {"cold_us": cold * 1e6, "warm_us": warm * 1e6}
+
+def synthetic_questions(count):
+    questions = []
+    for i in range(count):
+        if i % 2:
+            questions.append({"type": "mcq", "question": f"Synthetic multiple choice question number {i}?",
+                              "options": [f"Option {i}-{j}" for j in range(4)], "answer": f"Option {i}-2"})
+        else:
+            questions.append({"type": "short", "question": f"Synthetic short answer question number {i}?",
+                              "answer": f"answer {i}"})
+    return questions
+
+def bank_load_child(directory, rooms):
+    import contextlib
+    import io
+    import random
+    from question_bank import QuestionBank
+    start = time.perf_counter()
+    with contextlib.redirect_stdout(io.StringIO()):
+        bank = QuestionBank(directory)
+        bank.refresh()
+    load = time.perf_counter() - start
+    topic = bank.snapshot.topics["Synthetic"]
+    rng = random.Random(1)
+    start = time.perf_counter()
+    for _ in range(rooms):
+        view = bank.sample("Synthetic", 10, rng=rng)
+        for i in range(10):
+            view[i]["question"]
+    room = (time.perf_counter() - start) / rooms
+    print(json.dumps({"load_s": load, "room_ms": room * 1000, "rss_kb": proc_status(os.getpid())[0],
+                      "kind": type(topic).__name__}))
+
+def bench_compiled(args):
+    import tempfile
+    import compiled_bank
+    if args.child:
+        return bank_load_child(args.child, args.rooms)
+    print(f"{'Questions':>10} {'Format':>7} {'File MB':>8} {'Load s':>8} {'RSS MB':>8} {'Room setup ms':>14}")
+    print("-" * 62)
+    results = []
+    for count in args.questions:
+        with tempfile.TemporaryDirectory() as tmp:
+            json_path = os.path.join(tmp, "questions_synthetic.json")
+            with open(json_path, "w", encoding="utf-8") as f:
+                json.dump(synthetic_questions(count), f)
+            for fmt in ("json", "qbank"):
+                if fmt == "qbank":
+                    compiled_bank.compile_questions(synthetic_questions(count), compiled_bank.compiled_path(json_path))
+                    os.remove(json_path)
+                    path = compiled_bank.compiled_path(json_path)
+                else:
+                    path = json_path
+                out = subprocess.run([sys.executable, os.path.join(HERE, "bench.py"), "compiled", "--child", tmp,
+                                      "--rooms", str(args.rooms)], capture_output=True, text=True, check=True)
+                r = json.loads(out.stdout.strip().splitlines()[-1])
+                r.update(questions=count, format=fmt, file_mb=os.path.getsize(path) / 1e6)
+                results.append(r)
+                print(f"{count:>10} {fmt:>7} {r['file_mb']:>8.1f} {r['load_s']:>8.3f} {r['rss_kb'] / 1024:>8.1f} "
+                      f"{r['room_ms']:>14.2f}")
+    return results
+
+def bench_store(args):
+    import contextlib
+    import io
+    import random
+    import tempfile
+    from question_bank import QuestionBank
+    from question_store import QuestionStore
+    print(f"{'Questions':>10} {'Filter':>8} {'JSON ms/room':>13} {'SQLite ms/room':>15}")
+    print("-" * 50)
+    results = []
+    rng = random.Random(args.seed)
+    for count in args.questions:
+        questions = synthetic_questions(count)
+        for i, q in enumerate(questions):
+            q["difficulty"] = ("easy", "medium", "hard")[i % 3]
+            q["tags"] = ["synthetic"] + (["rare"] if i % 50 == 0 else [])
+        with tempfile.TemporaryDirectory() as tmp, contextlib.redirect_stdout(io.StringIO()):
+            with open(os.path.join(tmp, "questions_synthetic.json"), "w", encoding="utf-8") as f:
+                json.dump(questions, f)
+            bank = QuestionBank(tmp)
+            bank.refresh()
+            store = QuestionStore(os.path.join(tmp, "questions.db"))
+            store.import_questions("Synthetic", questions)
+            store.refresh()
+            rows = []
+            for label, difficulty, tags in (("none", None, ()), ("medium", "medium", ()), ("rare", "hard", ("rare",))):
+                timings = []
+                for source in (bank, store):
+                    start = time.perf_counter()
+                    for _ in range(args.rooms):
+                        picked = source.sample("Synthetic", args.count, difficulty, tags, rng)
+                        [q["question"] for q in picked]
+                    timings.append((time.perf_counter() - start) / args.rooms * 1000)
+                rows.append((label, *timings))
+        for label, json_ms, store_ms in rows:
+            results.append({"questions": count, "filter": label, "json_ms": json_ms, "sqlite_ms": store_ms})
+            print(f"{count:>10} {label:>8} {json_ms:>13.2f} {store_ms:>15.2f}")
+    return results
+
+def bench_selection(args):
+    import gc
+    import random
+    import tracemalloc
+    from question_bank import QuestionView, sample_indices
+    rng = random.Random(args.seed)
+    print(f"{'Topic size':>10} {'Copy+shuffle us':>16} {'Partial F-Y us':>15} {'Copy KB/room':>13} {'Index KB/room':>14}")
+    print("-" * 74)
+    results = []
+    for size in args.sizes:
+        topic = tuple({"type": "short", "question": f"q{i}", "answer": "a"} for i in range(size))
+        rooms = max(10, args.budget // size)
+
+        def legacy():
+            questions = list(topic)
+            rng.shuffle(questions)
+            return questions
+
+        def indexed():
+            return QuestionView(topic, sample_indices(len(topic), args.count, rng))
+
+        row = {"size": size}
+        for name, make in (("legacy", legacy), ("indexed", indexed)):
+            # Keep collector passes over the big topic out of the timings
+            gc.collect()
+            gc.disable()
+            start = time.perf_counter()
+            for _ in range(rooms):
+                room = make()
+                room[0]["question"]
+            row[name + "_us"] = (time.perf_counter() - start) / rooms * 1e6
+            gc.enable()
+            room = None
+            tracemalloc.start()
+            kept = [make() for _ in range(10)]
+            row[name + "_kb"] = tracemalloc.get_traced_memory()[0] / 10 / 1024
+            tracemalloc.stop()
+            del kept
+        results.append(row)
+        print(f"{size:>10} {row['legacy_us']:>16.1f} {row['indexed_us']:>15.1f} {row['legacy_kb']:>13.1f} "
+              f"{row['indexed_kb']:>14.2f}")
+    return results
+
+def grading_answers(answer, count, rng):
+    """A realistic mix: exact, case/punctuation variants, one-typo, and wrong answers."""
+    answers = []
+    for i in range(count):
+        kind = i % 4
+        if kind == 0:
+            answers.append(answer)
+        elif kind == 1:
+            answers.append(f"  {answer.upper()}!! ")
+        elif kind == 2:
+            pos = rng.randrange(len(answer))
+            answers.append(answer[:pos] + "x" + answer[pos + 1:])
+        else:
+            answers.append("".join(rng.choice("abcdefghij ") for _ in range(len(answer))))
+    return answers
+
+def bench_grading(args):
+    import random
+    from scheduler import TimerScheduler
+    from concurrent.futures import ThreadPoolExecutor
+    from grading import AnswerKey
+    from server import QuizRoom
+    rng = random.Random(args.seed)
+    key_text = "Secure Sockets Layer"
+    answers = grading_answers(key_text, args.answers, rng)
+    key = AnswerKey(key_text, aliases=["SSL"])
+
+    start = time.perf_counter()
+    correct = sum(key.grade(answer) for answer in answers)
+    graded = len(answers) / (time.perf_counter() - start)
+
+    legacy_key = key_text
+    start = time.perf_counter()
+    legacy_correct = sum(answer.lower().strip() == legacy_key.lower().strip() for answer in answers)
+    legacy = len(answers) / (time.perf_counter() - start)
+
+    # Full path: one room with a player per answer, every player answering one question
+    scheduler = TimerScheduler()
+    executor = ThreadPoolExecutor(max_workers=1)
+    room = QuizRoom("12345", "Bench", [{"type": "short", "question": "SSL?", "answer": key_text,
+                                         "aliases": ["SSL"]}], scheduler, executor)
+    players = [RecordingClient(f"player{i}") for i in range(len(answers))]
+    for player in players:
+        room.add_client(player)
+    room.start_quiz()
+    start = time.perf_counter()
+    for player, answer in zip(players, answers):
+        room.process_answer(player, answer)
+    in_room = len(answers) / (time.perf_counter() - start)
+    scheduler.shutdown()
+    executor.shutdown(wait=False)
+
+    print(f"Answers: {len(answers)} (exact, case/punctuation, one typo, wrong in equal parts)")
+    print(f"Exact lower/strip match: {legacy:12,.0f} answers/s, {legacy_correct} accepted")
+    print(f"Normalized + fuzzy:      {graded:12,.0f} answers/s, {correct} accepted")
+    print(f"QuizRoom.process_answer: {in_room:12,.0f} answers/s per room (target {args.target:,})")
+    return {"legacy_per_s": legacy, "graded_per_s": graded, "room_per_s": in_room,
+            "accepted": correct, "legacy_accepted": legacy_correct}
+
+class CountingClient(RecordingClient):
+    """RecordingClient that counts the bytes it is sent and copies each frame
+    once into a scratch buffer, a lower bound on what a socket write costs."""
+    scratch = bytearray(1 << 20)
+
+    def __init__(self, nickname):
+        super().__init__(nickname)
+        self.received = 0
+
+    def send_bytes(self, data):
+        if len(data) > len(self.scratch):
+            CountingClient.scratch = bytearray(len(data))
+        self.scratch[:len(data)] = data
+        self.received += len(data)
+
+    def send_message(self, message):
+        from protocol import encode_message
+        self.send_bytes(encode_message(message))
+
+def bench_leaderboard(args):
+    import random
+    from concurrent.futures import ThreadPoolExecutor
+    from scheduler import TimerScheduler
+    from server import QuizRoom, broadcast
+    rng = random.Random(args.seed)
+    scheduler = TimerScheduler()
+    executor = ThreadPoolExecutor(max_workers=1)
+    results = {}
+    print(f"{'players':>8} {'sort+full list':>16} {'incremental':>14} {'bytes/question':>30}")
+    for players in args.players:
+        room = QuizRoom("12345", "Bench", stress_questions(1), scheduler, executor)
+        clients = [CountingClient(f"player{i}") for i in range(players)]
+        for client in clients:
+            room.add_client(client)
+        points = [[rng.choice((0, 0, 1000, 1100, 1300, 1500)) for _ in clients] for _ in range(args.questions)]
+
+        # Legacy: scores dict, full sort and the whole list to everyone after each question
+        scores = dict.fromkeys((c.nickname for c in clients), 0)
+        start = time.perf_counter()
+        for row in points:
+            for client, p in zip(clients, row):
+                scores[client.nickname] += p
+            ranked = sorted(scores.items(), key=lambda x: x[1], reverse=True)
+            broadcast(clients, {"type": "LEADERBOARD", "room_code": room.code, "user": "SERVER",
+                                "data": {"scores": ranked, "is_final": False}})
+        legacy = (time.perf_counter() - start) / args.questions
+        legacy_bytes = sum(c.received for c in clients) / args.questions
+        for client in clients:
+            client.received = 0
+
+        start = time.perf_counter()
+        for row in points:
+            for client, p in zip(clients, row):
+                room.leaderboard.add_points(client.nickname, p)
+            room.send_standings("LEADERBOARD", is_final=False)
+        incremental = (time.perf_counter() - start) / args.questions
+        new_bytes = sum(c.received for c in clients) / args.questions
+        if [list(e) for e in sorted(scores.items(), key=lambda x: (-x[1], x[0]))] != room.leaderboard.standings():
+            raise SystemExit("leaderboard disagrees with the sorted scores")
+        print(f"{players:>8} {legacy * 1000:>13.1f} ms {incremental * 1000:>11.1f} ms "
+              f"{legacy_bytes / 1e6:>12.1f} MB -> {new_bytes / 1e6:>8.2f} MB")
+        results[players] = {"legacy_ms": legacy * 1000, "incremental_ms": incremental * 1000,
+                            "legacy_bytes": legacy_bytes, "incremental_bytes": new_bytes}
+    scheduler.shutdown()
+    executor.shutdown(wait=False)
+    return results
+
+def bench_global(args):
+    import random
+    import sqlite3
+    import tempfile
+    from global_leaderboard import GlobalLeaderboard
+    rng = random.Random(args.seed)
+    path = os.path.join(tempfile.mkdtemp(prefix="bench_global_"), "leaderboard.db")
+    board = GlobalLeaderboard(path)
+    board.start()
+    games = [(f"{g:05d}", rng.choice(args.topics),
+              [[f"player{rng.randrange(args.players)}", rng.randrange(0, 15000, 100)] for _ in range(args.room_size)])
+             for g in range(args.games)]
+    start = time.perf_counter()
+    worst = 0.0
+    for code, topic, standings in games:
+        t = time.perf_counter()
+        board.record(code, topic, standings)
+        worst = max(worst, time.perf_counter() - t)
+    queued = time.perf_counter() - start
+    board.stop(timeout=600)
+    ingested = time.perf_counter() - start
+
+    names = [f"player{rng.randrange(args.players)}" for _ in range(args.lookups)]
+    start = time.perf_counter()
+    for name in names:
+        board.view(name, args.topics[0])
+    view_us = (time.perf_counter() - start) / len(names) * 1e6
+
+    # The same question answered by SQL alone: a top-K query plus a COUNT for the rank
+    db = sqlite3.connect(path)
+    start = time.perf_counter()
+    for name in names[:200]:
+        db.execute("SELECT nickname, score FROM totals WHERE scope = '' ORDER BY score DESC LIMIT 10").fetchall()
+        row = db.execute("SELECT score FROM totals WHERE scope = '' AND nickname = ?", (name,)).fetchone()
+        if row:
+            db.execute("SELECT COUNT(*) FROM totals WHERE scope = '' AND score > ?", row).fetchone()
+    sql_us = (time.perf_counter() - start) / min(200, len(names)) * 1e6
+    db.close()
+    stats = board.stats()
+    print(f"Games: {args.games} x {args.room_size} players -> {stats['players']} players, {stats['topics']} topics")
+    print(f"record() on the game thread: {queued / args.games * 1e6:.1f} us avg, {worst * 1e6:.1f} us max")
+    print(f"Writer: {args.games / ingested:,.0f} games/s in {stats['writes']} transactions")
+    print(f"GLOBAL_LEADERBOARD view (top-10 + rank, all-time and topic): {view_us:.1f} us")
+    print(f"SQL ORDER BY/COUNT for all-time only:                      {sql_us:.1f} us")
+    return {"record_us": queued / args.games * 1e6, "games_per_s": args.games / ingested,
+            "view_us": view_us, "sql_us": sql_us}
+
+def bench_journal(args):
+    import shutil
+    import tempfile
+    from concurrent.futures import ThreadPoolExecutor
+    from scheduler import TimerScheduler
+    from journal import Journal
+    from server import QuizRoom
+    questions = stress_questions(1)
+    scheduler = TimerScheduler()
+    executor = ThreadPoolExecutor(max_workers=1)
+    results = {}
+    print(f"{'journal':>16} {'answers/s':>12} {'us/answer':>10} {'drain ms':>9} {'fsyncs':>7} {'replay ms':>10}")
+    for policy in ["off"] + args.fsync:
+        directory = tempfile.mkdtemp(prefix="bench_journal_")
+        journal = None
+        if policy != "off":
+            journal = Journal(directory, policy, snapshot_every=args.snapshot_every)
+            journal.recover()
+            journal.start()
+        rooms = []
+        for r in range(args.rooms):
+            room = QuizRoom(f"{r:05d}", "Bench", questions, scheduler, executor)
+            room.journal = journal
+            room.log("room", topic="Bench", questions=questions)
+            players = [RecordingClient(f"player{i}") for i in range(args.players)]
+            for player in players:
+                room.add_client(player)
+            room.start_quiz()
+            rooms.append((room, players))
+        start = time.perf_counter()
+        for room, players in rooms:
+            for player in players:
+                room.process_answer(player, "answer0")
+        elapsed = time.perf_counter() - start
+        answers = args.rooms * args.players
+        drain = replay = 0.0
+        fsyncs = 0
+        if journal is not None:
+            t = time.perf_counter()
+            journal.close(timeout=600)
+            drain = time.perf_counter() - t
+            fsyncs = journal.fsyncs
+            t = time.perf_counter()
+            Journal(directory).recover()
+            replay = time.perf_counter() - t
+        shutil.rmtree(directory, ignore_errors=True)
+        label = "off" if policy == "off" else f"fsync={policy}"
+        print(f"{label:>16} {answers / elapsed:>12,.0f} {elapsed / answers * 1e6:>10.2f} {drain * 1000:>9.1f} "
+              f"{fsyncs:>7} {replay * 1000:>10.1f}")
+        results[policy] = {"answers_per_s": answers / elapsed, "drain_ms": drain * 1000, "replay_ms": replay * 1000}
+    scheduler.shutdown()
+    executor.shutdown(wait=False)
+    return results
+
+def bench_answers(args):
+    import random
+    import shutil
+    import tempfile
+    from answer_log import AnswerLog, read_columns, analyze
+    rng = random.Random(args.seed)
+    questions = [{"type": "mcq", "question": f"Question {i}?", "options": [f"option {j}" for j in range(4)],
+                  "answer": "option 0"} if i % 2 else {"type": "short", "question": f"Question {i}?", "answer": "x"}
+                 for i in range(args.questions)]
+    directory = tempfile.mkdtemp(prefix="bench_answers_")
+    log = AnswerLog(directory, flush_rows=args.batch)
+    log.start()
+    rows = []
+    for _ in range(min(args.rows, 100000)):
+        q = rng.choice(questions)
+        answer = rng.choice(q["options"]) if q["type"] == "mcq" else rng.choice(["x", "y", None])
+        correct = answer == q["answer"]
+        rows.append((f"{rng.randrange(10000, 99999)}", q, f"player{rng.randrange(1000)}", answer, correct,
+                     rng.uniform(1, 30), 1200 if correct else 0))
+    start = time.perf_counter()
+    for i in range(args.rows):
+        room, q, nickname, answer, correct, taken, points = rows[i % len(rows)]
+        log.record(room, "Bench", q, nickname, answer, correct, taken, points)
+    recorded = time.perf_counter() - start
+    log.close(timeout=600)
+    stats = log.stats()
+    json_bytes = sum(len(json.dumps({"room": r[0], "question": r[1]["question"], "player": r[2], "answer": r[3],
+                                     "correct": r[4], "time_taken": round(r[5], 3), "points": r[6]})) + 1 for r in rows) / len(rows)
+    print(f"Rows: {args.rows:,} over {args.questions} questions")
+    print(f"record() on the room thread: {recorded / args.rows * 1e6:.2f} us/row")
+    print(f"File: {stats['bytes'] / args.rows:.1f} bytes/row in {stats['chunks']} chunks "
+          f"(JSON lines would be ~{json_bytes:.0f} bytes/row)")
+    try:
+        import numpy  # noqa: F401
+    except ImportError:
+        print("NumPy not installed; skipping the analytics timing")
+        shutil.rmtree(directory, ignore_errors=True)
+        return {"record_us": recorded / args.rows * 1e6}
+    paths = [os.path.join(directory, name) for name in os.listdir(directory)]
+    start = time.perf_counter()
+    columns, ids, _ = read_columns(paths)
+    loaded = time.perf_counter() - start
+    start = time.perf_counter()
+    result = analyze(columns, ids)
+    vectorized = time.perf_counter() - start
+
+    # Baseline: the same aggregates from a JSON-lines log, parsed and looped over in Python
+    lines = [json.dumps({"room": r[0], "question": r[1]["question"], "player": r[2], "answer": r[3],
+                         "correct": r[4], "time_taken": round(r[5], 3), "points": r[6]}) for r in rows]
+    start = time.perf_counter()
+    totals = {}
+    for line in lines:
+        row = json.loads(line)
+        entry = totals.get(row["question"])
+        if entry is None:
+            entry = totals[row["question"]] = [0, 0, 0.0, 0, {}]
+        entry[0] += 1
+        entry[1] += row["correct"]
+        if row["answer"] is not None:
+            entry[2] += row["time_taken"]
+            entry[3] += 1
+            entry[4][row["answer"]] = entry[4].get(row["answer"], 0) + 1
+    looped = (time.perf_counter() - start) * args.rows / len(lines)
+    shutil.rmtree(directory, ignore_errors=True)
+    print(f"Columnar: read {loaded:.2f}s + NumPy aggregation {vectorized:.2f}s = {loaded + vectorized:.2f}s "
+          f"({len(result['ids'])} questions)")
+    print(f"JSON lines + Python loop (extrapolated from {len(lines):,} rows): {looped:.2f}s "
+          f"({looped / (loaded + vectorized):.0f}x slower)")
+    return {"record_us": recorded / args.rows * 1e6, "read_s": loaded, "numpy_s": vectorized, "json_s": looped}
+
+def bench_adaptive(args):
+    import random
+    from answer_log import question_id
+    from question_bank import sample_indices
+    from selection import QuestionSelector, TopicIndex
+
+    rng = random.Random(args.seed)
+    labels = ["easy", "medium", "hard"]
+    print(f"{'Questions':>10} {'Index build':>12} {'select()':>10} {'Score bank':>11}   "
+          f"(k={args.count}; 'score bank' sorts the whole topic per room)")
+    results = {}
+    for size in args.sizes:
+        source = tuple({"type": "short", "question": f"Question {i}?", "answer": "x",
+                        "difficulty": labels[i % 3]} for i in range(size))
+        # Measured stats for half the topic, the rest falls back to the label prior
+        stats = {question_id("Bench", q["question"]): {"difficulty": rng.random(), "answers": rng.randrange(1, 500),
+                                                       "discrimination": rng.uniform(-0.1, 0.6)}
+                 for q in source[::2]}
+        selector = QuestionSelector(path="")
+        selector.question_stats = stats
+        start = time.perf_counter()
+        selector.index("Bench", source)
+        built = time.perf_counter() - start
+        start = time.perf_counter()
+        for _ in range(args.games):
+            selector.select("Bench", source, args.count, rng=rng)
+        picked = (time.perf_counter() - start) / args.games
+        # Baseline: score every question and sort on each CREATE_ROOM
+        games = max(1, min(args.games, 2000000 // size))
+        start = time.perf_counter()
+        for _ in range(games):
+            scored = sorted(range(size), key=lambda i: (stats.get(question_id("Bench", source[i]["question"]), {})
+                                                        .get("difficulty", 0.5), rng.random()))
+            scored[::max(1, size // args.count)][:args.count]
+        scored_cost = (time.perf_counter() - start) / games
+        print(f"{size:>10,} {built:>11.2f}s {picked * 1e6:>8.1f}us {scored_cost * 1e3:>9.1f}ms")
+        results[size] = {"build_s": built, "select_us": picked * 1e6, "score_ms": scored_cost * 1e3}
+
+    # Ramp: the estimated difficulty of each slot, averaged over many games
+    size = args.sizes[0]
+    source = tuple({"type": "short", "question": f"Question {i}?", "answer": "x"} for i in range(size))
+    stats = {question_id("Bench", q["question"]): {"difficulty": rng.random(), "answers": 200} for q in source}
+    index = TopicIndex("Bench", source, stats)
+    selector = QuestionSelector(path="")
+    selector.question_stats = stats
+    slots = [0.0] * args.count
+    for _ in range(args.games):
+        view = selector.select("Bench", source, args.count, rng=rng)
+        for slot, i in enumerate(view.order):
+            slots[slot] += stats[index.ids[i]]["difficulty"]
+    print("Mean difficulty by slot: " + " ".join(f"{total / args.games:.2f}" for total in slots))
+
+    # Returning player: share of each game's questions already seen in their recent games
+    source = tuple({"type": "short", "question": f"Question {i}?", "answer": "x"} for i in range(args.returning_topic))
+    selector = QuestionSelector(path="", history=args.history)
+    selector.question_stats = {}
+    recent = []
+    repeats = {"adaptive": 0, "random": 0}
+    for _ in range(args.returning_games):
+        view = selector.select("Bench", source, args.count, ["player"], rng=rng)
+        played = [source[i] for i in view.order]
+        repeats["adaptive"] += sum(1 for q in played if q["question"] in recent)
+        selector.remember(["player"], "Bench", played)
+        shown = [source[i]["question"] for i in sample_indices(len(source), args.count, rng)]
+        repeats["random"] += sum(1 for text in shown if text in recent[-args.history:])
+        recent = (recent + [q["question"] for q in played])[-args.history:]
+    total = args.returning_games * args.count
+    print(f"Returning player, {args.returning_games} games on a {args.returning_topic}-question topic: "
+          f"{repeats['adaptive'] / total:.1%} repeats within the last {args.history} questions "
+          f"(uniform random: {repeats['random'] / total:.1%})")
+    results["repeat_rate"] = repeats["adaptive"] / total
+    results["random_repeat_rate"] = repeats["random"] / total
+    return results
+
+SUITE_BASELINE = os.path.join(HERE, "bench_baseline.json")
+
+class SuiteClient(CountingClient):
+    """CountingClient with what the admin feed reads from a connection."""
+    def __init__(self, nickname, port):
+        super().__init__(nickname)
+        self.address = ("127.0.0.1", port)
+
+    def queue_depth(self):
+        return 0, 0
+
+def time_per_op(func, min_time, repeat):
+    """Best seconds per call over repeat rounds of at least min_time each,
+    with the cyclic GC paused so a collection doesn't land in one round."""
+    return min(round_times(func, min_time, repeat))
+
+def round_times(func, min_time, repeat, reference=None):
+    """Seconds per call in each of repeat rounds of at least min_time, GC paused.
+    With reference, also the seconds one reference() call took right after
+    each round: (times, reference times)."""
+    import gc
+    gc.collect()
+    gc.disable()
+    try:
+        return timed_rounds(func, min_time, repeat, reference)
+    finally:
+        gc.enable()
+
+def timed_rounds(func, min_time, repeat, reference=None):
+    calls = 1
+    while True:
+        start = time.perf_counter()
+        for _ in range(calls):
+            func()
+        elapsed = time.perf_counter() - start
+        if elapsed >= min_time or calls >= 1000000:
+            break
+        calls = min(1000000, max(calls * 2, int(calls * min_time / max(elapsed, 1e-9) * 1.1)))
+    times = [elapsed / calls]
+    references = []
+    while True:
+        if reference is not None:
+            start = time.perf_counter()
+            reference()
+            references.append(time.perf_counter() - start)
+        if len(times) == repeat:
+            break
+        start = time.perf_counter()
+        for _ in range(calls):
+            func()
+        times.append((time.perf_counter() - start) / calls)
+    return (times, references) if reference is not None else times
+
+def reference_work(players=20000):
+    """Fixed dict, string and JSON work timed after every suite round: the
+    machine's speed at that moment, to divide the round's time by."""
+    table = {}
+    for i in range(players):
+        key = f"player{i & 255}"
+        table[key] = table.get(key, 0) + i
+    return len(json.dumps(table))
+
+def median_spread(times):
+    """(median, spread): spread is the interquartile range relative to the median."""
+    quartiles = statistics.quantiles(times, n=4) if len(times) > 1 else [times[0]] * 3
+    return quartiles[1], (quartiles[2] - quartiles[0]) / quartiles[1]
+
+def suite_cases(size, directory):
+    """(name, func) for every hot path, on a synthetic room of size players."""
+    import contextlib
+    import io
+    from question_bank import QuestionBank
+    from server import QuizRoom
+    server = quiet_server(journal_dir="", answer_log_dir="", question_stats="", bank_poll=0,
+                          leaderboard_db=os.path.join(directory, "leaderboard.db"))
+    clients = [SuiteClient(f"player{i}", 40000 + i) for i in range(size)]
+    room = QuizRoom("12345", "Bench", stress_questions(10), server.scheduler, server.room_executor)
+    room.REVEAL_DELAY = 3600  # keep the reveal timer out of the measurement
+    server.rooms[room.code] = room
+    for client in clients:
+        server.clients.add(client)
+        server.enter_lobby(client, client.nickname)
+        server.lobby_members.discard(client)
+        room.add_client(client)
+        client.current_room = room.code
+    admin = SuiteClient("ADMIN", 1)
+    admin.is_admin = True
+    server.clients.add(admin)
+    server.admin_client = admin
+    room.status = "In Progress"
+    room.send_next_question()
+    answer = room.current_question["answer"]
+
+    def answer_round():
+        for i, client in enumerate(clients):
+            room.process_answer(client, answer if i % 3 else "wrong")
+        room.answers_received.clear()
+        room.question_closed = False
+
+    def admin_snapshot():
+        server.admin_feed.reset()
+        server.admin_feed.flush()
+
+    with open(os.path.join(directory, "questions_bench.json"), "w", encoding="utf-8") as f:
+        json.dump(synthetic_questions(size), f)
+
+    def load_quiz_data():
+        with contextlib.redirect_stdout(io.StringIO()):
+            QuestionBank(directory, poll_interval=0).refresh()
+
+    chat = {"type": "ROOM_CHAT", "room_code": room.code, "user": clients[0].nickname, "data": {"message": "hi"}}
+    try:
+        yield f"process_message.room_chat[{size}]", lambda: server.process_message(clients[0], chat)
+        yield f"process_answer.round[{size}]", answer_round
+        yield f"send_standings[{size}]", lambda: room.send_standings("LEADERBOARD", is_final=False)
+        yield f"admin_snapshot[{size}]", admin_snapshot
+        yield f"load_quiz_data[{size}]", load_quiz_data
+    finally:
+        server.scheduler.shutdown()
+        server.room_executor.shutdown(wait=False)
+
+def bench_suite(args):
+    import contextlib
+    import platform
+    import tempfile
+    from server import Client
+    results = {}
+    relative = {}
+    spreads = {}
+    print(f"{'Benchmark':<34} {'us/op':>12} {'spread':>7} {'baseline':>12} {'change':>8} {'allowed':>8}")
+    print("-" * 86)
+    baseline = {}
+    baseline_relative = {}
+    baseline_spreads = {}
+    if os.path.exists(args.baseline) and not args.save_baseline:
+        with open(args.baseline, "r", encoding="utf-8") as f:
+            saved = json.load(f)
+        baseline = saved["results"]
+        baseline_relative = saved.get("relative", {})
+        baseline_spreads = saved.get("spreads", {})
+        if saved.get("machine") != platform.machine() or saved.get("python") != platform.python_version():
+            print(f"(baseline is from Python {saved.get('python')} on {saved.get('machine')}; "
+                  f"compare with care)")
+    regressions = []
+
+    def report(name, timings):
+        # Each round is divided by the reference work timed right after it, so a
+        # machine that runs slower for a while (other tenants, clock changes) slows
+        # both sides of the ratio. Medians, not bests: one lucky round on either side
+        # shouldn't decide the comparison. A case whose ratios scatter widely gets a
+        # wider allowance.
+        times, references = timings
+        seconds = statistics.median(times)
+        ratio, spread = median_spread([t / ref for t, ref in zip(times, references)])
+        results[name] = seconds * 1e6
+        relative[name] = ratio
+        spreads[name] = spread
+        before = baseline.get(name)
+        if before is None or name not in baseline_relative:
+            print(f"{name:<34} {seconds * 1e6:>12.2f} {spread:>7.1%} {'-':>12} {'new':>8}")
+            return
+        allowed = max(args.threshold, args.noise * max(spread, baseline_spreads.get(name, 0.0)))
+        change = ratio / baseline_relative[name] - 1
+        flag = ""
+        if change > allowed:
+            regressions.append(name)
+            flag = "  REGRESSION"
+        print(f"{name:<34} {seconds * 1e6:>12.2f} {spread:>7.1%} {before:>12.2f} {change:>+7.0%} "
+              f"{allowed:>+7.0%}{flag}")
+
+    client = Client(NullSocket(), ("127.0.0.1", 40000))
+    message = question_message(10)
+    report("Client.send_message", round_times(lambda: client.send_message(message), args.min_time, args.repeat,
+                                              reference_work))
+    client.close()
+    with tempfile.TemporaryDirectory(prefix="bench_suite_") as directory:
+        for size in args.sizes:
+            for name, func in suite_cases(size, directory):
+                # The server logs every message it processes; time that, but don't show it
+                with open(os.devnull, "w") as devnull, contextlib.redirect_stdout(devnull):
+                    timings = round_times(func, args.min_time, args.repeat, reference_work)
+                report(name, timings)
+    output = {"python": platform.python_version(), "machine": platform.machine(), "created_at": time.time(),
+              "results": results, "relative": relative, "spreads": spreads}
+    path = args.baseline if args.save_baseline else args.out
+    with open(path, "w", encoding="utf-8") as f:
+        json.dump(output, f, indent=2, sort_keys=True)
+    print(f"\nWrote {len(results)} results to {path}")
+    if regressions:
+        print(f"{len(regressions)} regressions over their allowance: {', '.join(regressions)}")
+        raise SystemExit(1)
+    return output
+
+def bench_metrics(args):
+    import threading
+    from metrics import Registry
+
+    registry = Registry()
+    histogram = registry.histogram("bench_seconds", "Bench histogram")
+    family = registry.histogram("bench_typed_seconds", "Bench histogram per type", label="type")
+    counter = registry.counter("bench_total", "Bench counter")
+    types = [f"TYPE_{i}" for i in range(12)]
+    family.labels(types[0])
+    now = time.perf_counter
+    cases = [
+        ("Histogram.observe", lambda: histogram.observe(0.0003)),
+        ("labels(type).observe", lambda: family.labels("TYPE_0").observe(0.0003)),
+        ("timed labels(type).observe", lambda: family.labels("TYPE_0").observe(now() - now())),
+        ("Counter.inc", lambda: counter.inc()),
+    ]
+    print(f"{'Recording':<28} {'ns/event':>9}   (budget {args.budget * 1e9:.0f} ns)")
+    worst = 0.0
+    for name, func in cases:
+        seconds = time_per_op(func, args.min_time, args.repeat)
+        worst = max(worst, seconds)
+        print(f"{name:<28} {seconds * 1e9:>9.0f}")
+
+    # Same, with args.threads threads recording into one histogram at once
+    def hammer():
+        for _ in range(args.events):
+            family.labels("TYPE_1").observe(0.0003)
+    threads = [threading.Thread(target=hammer) for _ in range(args.threads)]
+    start = time.perf_counter()
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+    contended = (time.perf_counter() - start) / (args.events * args.threads)
+    lost = args.events * args.threads - family.labels("TYPE_1").snapshot()[0][-1]
+    print(f"{f'{args.threads} threads, one histogram':<28} {contended * 1e9:>9.0f}   ({lost} events lost)")
+
+    # What dispatch_message adds around a handler, measured against a no-op
+    # process_message so the handler's own cost and noise drop out
+    server = quiet_server(journal_dir="", answer_log_dir="", question_stats="")
+    server.process_message = lambda client, message: None
+    message = {"type": "PING", "user": "bench", "data": {}}
+    bare = time_per_op(lambda: server.process_message(None, message), args.min_time, args.repeat)
+    timed = time_per_op(lambda: server.dispatch_message(None, message), args.min_time, args.repeat)
+    overhead = max(0.0, timed - bare)
+    print(f"{'dispatch_message overhead':<28} {overhead * 1e9:>9.0f}")
+
+    for t in types:
+        family.labels(t).observe(0.001)
+    start = time.perf_counter()
+    text = registry.render()
+    print(f"Scrape: {len(text.splitlines())} lines rendered in {(time.perf_counter() - start) * 1e3:.2f} ms")
+    if max(worst, overhead) > args.budget:
+        print(f"FAIL: recording costs {max(worst, overhead) * 1e9:.0f} ns per event, over the budget")
+        raise SystemExit(1)
+    print("OK: every recording path is within the budget")
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Quiz server benchmarks")
+    sub = parser.add_subparsers(dest="command", required=True)
+
+    p = sub.add_parser("engines", help="Idle-connection capacity: threaded vs asyncio engine")
+    p.add_argument("--connections", type=int, default=10000)
+    p.add_argument("--engines", nargs="+", default=["threaded", "asyncio"])
+    p.add_argument("--port", type=int, default=9100)
+    p.add_argument("--samples", type=int, default=20)
+    p.add_argument("--settle", type=float, default=1.0)
+    p.set_defaults(func=bench_engines)
+
+    p = sub.add_parser("framing", help="Newline-JSON frame decoding throughput")
+    p.add_argument("--messages", type=int, default=200000)
+    p.add_argument("--recv-sizes", type=int, nargs="+", default=[1024, 4096, 65536])
+    p.add_argument("--repeat", type=int, default=3)
+    p.set_defaults(func=bench_framing)
+
+    p = sub.add_parser("broadcast", help="Room fan-out: per-client serialization vs encode-once broadcast")
+    p.add_argument("--players", type=int, nargs="+", default=[10, 100, 500])
+    p.add_argument("--repeat", type=int, default=20)
+    p.set_defaults(func=bench_broadcast)
+
+    p = sub.add_parser("stress-room", help="Concurrent ANSWER storm against one room; checks consistency")
+    p.add_argument("--players", type=int, default=2000)
+    p.add_argument("--questions", type=int, default=5)
+    p.add_argument("--threads", type=int, default=16)
+    p.add_argument("--workers", type=int, default=4)
+    p.add_argument("--timeout", type=float, default=1.0, help="Question timeout in seconds")
+    p.add_argument("--seed", type=int, default=1)
+    p.add_argument("--switch-interval", type=float, default=1e-5,
+                   help="sys.setswitchinterval value; smaller means more thread interleaving")
+    p.set_defaults(func=bench_stress_room)
+
+    p = sub.add_parser("indexes", help="Nickname lookup and disconnect cost as connections grow")
+    p.add_argument("--clients", type=int, nargs="+", default=[1000, 10000, 50000])
+    p.add_argument("--ops", type=int, default=200)
+    p.set_defaults(func=bench_indexes)
+
+    p = sub.add_parser("lobby", help="LOBBY_INFO cost: rebuild per request vs cached snapshot")
+    p.add_argument("--rooms", type=int, nargs="+", default=[10, 100, 1000])
+    p.add_argument("--requests", type=int, default=2000)
+    p.add_argument("--change-every", type=int, default=50)
+    p.set_defaults(func=bench_lobby)
+
+    p = sub.add_parser("admin", help="ADMIN_UPDATE cost: full rebuild per request vs coalesced deltas")
+    p.add_argument("--clients", type=int, nargs="+", default=[100, 1000, 5000])
+    p.add_argument("--duration", type=float, default=2.0)
+    p.add_argument("--rate", type=float, default=4.0)
+    p.set_defaults(func=bench_admin)
+
+    p = sub.add_parser("bank", help="Question loading: full re-parse vs mtime-cached refresh")
+    p.add_argument("--directory", default=".")
+    p.add_argument("--loads", type=int, default=500)
+    p.set_defaults(func=bench_bank)
+
+    p = sub.add_parser("compiled", help="Large topics: JSON bank vs compiled, memory-mapped .qbank")
+    p.add_argument("--questions", type=int, nargs="+", default=[10000, 100000, 500000])
+    p.add_argument("--rooms", type=int, default=100)
+    p.add_argument("--child", help=argparse.SUPPRESS)
+    p.set_defaults(func=bench_compiled)
+
+    p = sub.add_parser("store", help="Room creation: JSON bank sampling vs indexed SQLite store")
+    p.add_argument("--questions", type=int, nargs="+", default=[1000, 10000, 100000])
+    p.add_argument("--count", type=int, default=20, help="Questions per room")
+    p.add_argument("--rooms", type=int, default=50)
+    p.add_argument("--seed", type=int, default=1)
+    p.set_defaults(func=bench_store)
+
+    p = sub.add_parser("selection", help="Room question selection: copy+shuffle topic vs index sampling")
+    p.add_argument("--sizes", type=int, nargs="+", default=[10, 1000, 100000, 1000000])
+    p.add_argument("--count", type=int, default=10, help="Questions per game")
+    p.add_argument("--budget", type=int, default=2000000, help="Rooms per size = budget / size")
+    p.add_argument("--seed", type=int, default=1)
+    p.set_defaults(func=bench_selection)
+
+    p = sub.add_parser("grading", help="Short-answer grading throughput, alone and inside a room")
+    p.add_argument("--answers", type=int, default=20000)
+    p.add_argument("--target", type=int, default=10000, help="Required answers/s per room")
+    p.add_argument("--seed", type=int, default=1)
+    p.set_defaults(func=bench_grading)
+
+    p = sub.add_parser("leaderboard", help="Per-question standings: full sort + full list vs incremental top-K")
+    p.add_argument("--players", type=int, nargs="+", default=[1000, 10000, 50000])
+    p.add_argument("--questions", type=int, default=5)
+    p.add_argument("--seed", type=int, default=1)
+    p.set_defaults(func=bench_leaderboard)
+
+    p = sub.add_parser("global", help="Global leaderboard: ingest cost on game threads and lookup latency")
+    p.add_argument("--games", type=int, default=2000)
+    p.add_argument("--room-size", type=int, default=50)
+    p.add_argument("--players", type=int, default=100000)
+    p.add_argument("--topics", nargs="+", default=["Python", "Linux", "Networking", "Security"])
+    p.add_argument("--lookups", type=int, default=2000)
+    p.add_argument("--seed", type=int, default=1)
+    p.set_defaults(func=bench_global)
+
+    p = sub.add_parser("journal", help="Cost per scored answer of the room journal under each fsync policy")
+    p.add_argument("--rooms", type=int, default=50)
+    p.add_argument("--players", type=int, default=1000)
+    p.add_argument("--fsync", nargs="+", default=["never", "interval", "always"])
+    p.add_argument("--snapshot-every", type=int, default=10000)
+    p.set_defaults(func=bench_journal)
+
+    p = sub.add_parser("answers", help="Answer history: record() cost, file size and NumPy analytics speed")
+    p.add_argument("--rows", type=int, default=5000000)
+    p.add_argument("--questions", type=int, default=2000)
+    p.add_argument("--batch", type=int, default=8192, help="Rows per flushed chunk")
+    p.add_argument("--seed", type=int, default=1)
+    p.set_defaults(func=bench_answers)
+
+    p = sub.add_parser("adaptive", help="Adaptive question selection: pick cost vs topic size, ramp, repeats")
+    p.add_argument("--sizes", type=int, nargs="+", default=[1000, 10000, 100000, 1000000])
+    p.add_argument("--count", type=int, default=10, help="Questions per game")
+    p.add_argument("--games", type=int, default=20000)
+    p.add_argument("--history", type=int, default=50, help="Questions remembered per player")
+    p.add_argument("--returning-topic", type=int, default=200)
+    p.add_argument("--returning-games", type=int, default=500)
+    p.add_argument("--seed", type=int, default=1)
+    p.set_defaults(func=bench_adaptive)
+
+    p = sub.add_parser("suite", help="Hot-path micro-benchmarks compared against a stored baseline")
+    p.add_argument("--sizes", type=int, nargs="+", default=[10, 100, 1000, 10000], help="Players per room")
+    p.add_argument("--min-time", type=float, default=0.1, help="Seconds per timing round")
+    p.add_argument("--repeat", type=int, default=15, help="Rounds per benchmark; the median is compared")
+    p.add_argument("--threshold", type=float, default=0.25,
+                   help="Fail if a benchmark's median is slower than its baseline by more than this fraction")
+    p.add_argument("--noise", type=float, default=1.5,
+                   help="Widen a benchmark's allowance to this many times its spread (interquartile range "
+                        "over median of its reference-relative rounds, the larger of this run's and the "
+                        "baseline's)")
+    p.add_argument("--baseline", default=SUITE_BASELINE)
+    p.add_argument("--out", default="bench_results.json")
+    p.add_argument("--save-baseline", action="store_true", help="Write the results as the new baseline")
+    p.set_defaults(func=bench_suite)
+
+    p = sub.add_parser("metrics", help="Cost per event of recording a metric, alone and in dispatch_message")
+    p.add_argument("--min-time", type=float, default=0.2, help="Seconds per timing round")
+    p.add_argument("--repeat", type=int, default=5, help="Rounds per benchmark; the best is kept")
+    p.add_argument("--threads", type=int, default=4)
+    p.add_argument("--events", type=int, default=200000, help="Events per thread in the contended run")
+    p.add_argument("--budget", type=float, default=1e-6, help="Fail if any recording path costs more seconds per event")
+    p.set_defaults(func=bench_metrics)
+
+    args = parser.parse_args(argv)
+    args.func(args)
+
+if __name__ == "__main__":
+    main()
@@ -4,10 +4,12 @@ import json
 import threading
 
 
+from protocol import FrameReader, encode_message
+
 from PyQt5.QtWidgets import (QApplication, QMainWindow, QWidget, QVBoxLayout, 
                             QHBoxLayout, QLabel, QLineEdit, QPushButton, 
-                            QTextEdit, QListWidget, QComboBox, QRadioButton,
-                            QButtonGroup, QProgressBar, QMessageBox, QStackedWidget)
+                            QTextEdit, QListWidget, QListWidgetItem, QComboBox, QRadioButton,
+                            QButtonGroup, QProgressBar, QMessageBox, QStackedWidget, QSpinBox)
 from PyQt5.QtCore import QTimer, pyqtSignal, QObject, QThread
 from PyQt5.QtGui import QFont
 
@@ -23,22 +25,18 @@ class NetworkThread(QThread):
         self.running = True
         
     def run(self):
-        buffer = ""
+        reader = FrameReader()
         try:
             while self.running:
-                data = self.socket.recv(1024).decode('utf-8')
-                if not data:
+                frames = reader.recv(self.socket)
+                if frames is None:
                     break
-                    
-                buffer += data
-                while '\n' in buffer:
-                    line, buffer = buffer.split('\n', 1)
-                    if line.strip():
-                        try:
-                            message = json.loads(line.strip())
-                            self.receiver.message_received.emit(message)
-                        except json.JSONDecodeError:
-                            pass
+                for frame in frames:
+                    try:
+                        message = json.loads(frame)
+                        self.receiver.message_received.emit(message)
+                    except json.JSONDecodeError:
+                        pass
         except:
             pass
         finally:
@@ -57,6 +55,9 @@ class QuizClient(QMainWindow):
         self.receiver = MessageReceiver()
         self.timer = QTimer()
         self.time_left = 0
+        self.expected_disconnect = False
+        self.lobby_seq = None
+        self.room_items = {}
         
         self.setup_ui()
         self.setup_connections()
@@ -193,6 +194,10 @@ class QuizClient(QMainWindow):
         self.refresh_btn.setMaximumWidth(80)
         rooms_header_layout.addWidget(self.refresh_btn)
         
+        self.global_leaderboard_btn = QPushButton("🏆 Leaderboard")
+        self.global_leaderboard_btn.clicked.connect(self.request_global_leaderboard)
+        rooms_header_layout.addWidget(self.global_leaderboard_btn)
+        
         left_panel.addLayout(rooms_header_layout)
         
         self.rooms_list = QListWidget()
@@ -213,9 +218,17 @@ class QuizClient(QMainWindow):
         create_layout = QHBoxLayout()
         create_layout.addWidget(QLabel("Topic:"))
         self.topic_combo = QComboBox()
+        self.difficulty_combo = QComboBox()
+        self.difficulty_combo.addItems(["Any", "easy", "medium", "hard"])
+        self.question_count_spin = QSpinBox()
+        self.question_count_spin.setRange(0, 100)
+        self.question_count_spin.setSpecialValueText("Default")  # 0 = server's questions per game
         self.create_room_btn = QPushButton("Create Room")
         self.create_room_btn.clicked.connect(self.create_room)
         create_layout.addWidget(self.topic_combo)
+        create_layout.addWidget(self.difficulty_combo)
+        create_layout.addWidget(QLabel("Questions:"))
+        create_layout.addWidget(self.question_count_spin)
         create_layout.addWidget(self.create_room_btn)
         left_panel.addLayout(create_layout)
         
@@ -249,17 +262,37 @@ class QuizClient(QMainWindow):
         lobby_widget.setLayout(layout)
         self.stacked_widget.addWidget(lobby_widget)
 
-    def update_rooms_display(self, rooms):
-        """Update the rooms list display"""
-        # Clear existing rooms list
-        self.rooms_list.clear()
-        
-        # Add new room items to the list
+    def update_rooms_display(self, rooms, removed=()):
+        """Update the rooms list in place: add or refresh rooms, drop removed codes"""
+        for code in removed:
+            item = self.room_items.pop(code, None)
+            if item is not None:
+                self.rooms_list.takeItem(self.rooms_list.row(item))
+                
         for room in rooms:
-            # Create display text with status icons
-            status_icon = "🟢" if room['status'] == 'Waiting' else "🔴" if room['status'] == 'In Progress' else "⚫"
-            item_text = f"{room['code']} - {room['topic']} ({room['players']} players) {status_icon} {room['status']}"
-            self.rooms_list.addItem(item_text)
+            item_text = f"{room['code']} - {room['topic']} ({room['players']} players) [{room['status']}]"
+            item = self.room_items.get(room['code'])
+            if item is None:
+                self.room_items[room['code']] = QListWidgetItem(item_text, self.rooms_list)
+            elif item.text() != item_text:
+                item.setText(item_text)
+                
+    def apply_lobby_delta(self, data):
+        """Apply one LOBBY_DELTA; request a full LOBBY_INFO if a seq number was missed"""
+        seq = data.get("seq")
+        if self.lobby_seq is None or seq <= self.lobby_seq:
+            return  # No snapshot yet (or stale delta): the next LOBBY_INFO covers it
+        if seq != self.lobby_seq + 1:
+            print(f"Lobby delta gap ({self.lobby_seq} -> {seq}), resyncing")  # Debug
+            self.lobby_seq = None
+            self.send_message({"type": "LOBBY_SYNC", "user": self.nickname, "data": {}})
+            return
+        self.lobby_seq = seq
+        room = data.get("room", {})
+        if data.get("op") == "remove":
+            self.update_rooms_display([], removed=[room.get("code")])
+        else:
+            self.update_rooms_display([room])
             
     def create_room_item(self, room):
         """Create a visual room item"""
@@ -520,6 +553,7 @@ class QuizClient(QMainWindow):
             self.socket = socket.socket(socket.AF_INET, socket.SOCK_STREAM)
             self.socket.connect((host, port))
             self.nickname = nickname
+            self.expected_disconnect = False
             
             # Start network thread
             self.network_thread = NetworkThread(self.socket, self.receiver)
@@ -541,8 +575,7 @@ class QuizClient(QMainWindow):
         """Send message to server"""
         if self.socket:
             try:
-                json_msg = json.dumps(message) + '\n'
-                self.socket.send(json_msg.encode('utf-8'))
+                self.socket.sendall(encode_message(message))
             except:
                 pass
                 
@@ -555,16 +588,31 @@ class QuizClient(QMainWindow):
         if msg_type == "LOBBY_INFO":
             self.stacked_widget.setCurrentIndex(1)  # Switch to lobby screen
             
-            # Update rooms list
-            self.rooms_list.clear()
-            for room in data.get("rooms", []):
-                item_text = f"{room['code']} - {room['topic']} ({room['players']} players) [{room['status']}]"
-                self.rooms_list.addItem(item_text)
+            # Full snapshot; LOBBY_DELTA messages continue from its seq
+            rooms = data.get("rooms", [])
+            codes = {room['code'] for room in rooms}
+            self.lobby_seq = data.get("seq")
+            self.update_rooms_display(rooms, removed=[code for code in self.room_items if code not in codes])
                 
             # Update topics combo
             self.topic_combo.clear()
             self.topic_combo.addItems(data.get("topics", []))
             
+        elif msg_type == "LOBBY_DELTA":
+            self.apply_lobby_delta(data)
+            
+        elif msg_type == "LOBBY_ERROR":
+            # Nickname rejected (already in use or reserved)
+            self.expected_disconnect = True
+            if self.network_thread:
+                self.network_thread.stop()
+            if self.socket:
+                self.socket.close()
+                self.socket = None
+            self.stacked_widget.setCurrentIndex(0)  # Return to login screen
+            self.status_label.setText(data.get("message", "Nickname rejected"))
+            QMessageBox.warning(self, "Cannot Join Lobby", data.get("message", "Nickname rejected"))
+            
         elif msg_type == "ROOM_CREATED":
             room_code = data.get("room_code")
             topic = data.get("topic")
@@ -580,6 +628,7 @@ class QuizClient(QMainWindow):
         elif msg_type == "ROOM_JOINED":
             # We successfully joined a room
             self.current_room = message.get("room_code")
+            self.lobby_seq = None  # No lobby deltas while in a room; LOBBY_INFO on return
             topic = data.get("topic", "Unknown")
             players = data.get("players", [])
             
@@ -643,6 +692,9 @@ class QuizClient(QMainWindow):
         elif msg_type == "QUIZ_END":
             self.display_final_results(data)
             
+        elif msg_type == "GLOBAL_LEADERBOARD":
+            self.display_global_leaderboard(data)
+            
     def display_question(self, data):
         """Display a quiz question"""
         question_text = f"Question {data['question_num']}/{data['total_questions']}: {data['question']}"
@@ -740,14 +792,32 @@ class QuizClient(QMainWindow):
         # Remove after 3 seconds
         QTimer.singleShot(3000, lambda: result_label.deleteLater())
         
+    def standings_text(self, top, data):
+        """Format the top-K list plus this player's own rank and neighbours"""
+        text = ""
+        rank = 0
+        for i, (player, score) in enumerate(top, 1):
+            if i == 1 or score != top[i - 2][1]:
+                rank = i
+            marker = " (you)" if player == self.nickname else ""
+            text += f"{rank}. {player}: {score} points{marker}\n"
+        shown = {player for player, _ in top}
+        around = [entry for entry in data.get('around', []) if entry[1] not in shown]
+        if around:
+            text += "...\n"
+            for rank, player, score in around:
+                marker = " (you)" if player == self.nickname else ""
+                text += f"{rank}. {player}: {score} points{marker}\n"
+        if 'rank' in data:
+            text += f"\nYou: rank {data['rank']} of {data.get('player_count', len(top))} ({data['score']} points)\n"
+        return text
+        
     def display_leaderboard(self, data):
         """Display current leaderboard"""
         scores = data.get('scores', [])
         is_final = data.get('is_final', False)
         
-        leaderboard_text = "LEADERBOARD:\n"
-        for i, (player, score) in enumerate(scores, 1):
-            leaderboard_text += f"{i}. {player}: {score} points\n"
+        leaderboard_text = "LEADERBOARD:\n" + self.standings_text(scores, data)
             
         # Show leaderboard in a message box
         msg_box = QMessageBox()
@@ -764,9 +834,7 @@ class QuizClient(QMainWindow):
         """Display final quiz results"""
         final_scores = data.get('final_scores', [])
         
-        result_text = "QUIZ COMPLETED!\n\nFinal Results:\n"
-        for i, (player, score) in enumerate(final_scores, 1):
-            result_text += f"{i}. {player}: {score} points\n"
+        result_text = "QUIZ COMPLETED!\n\nFinal Results:\n" + self.standings_text(final_scores, data)
             
         msg_box = QMessageBox()
         msg_box.setWindowTitle("Quiz Complete")
@@ -782,6 +850,30 @@ class QuizClient(QMainWindow):
         self.short_answer_input.setVisible(False)
         self.submit_btn.setVisible(False)
         
+    def request_global_leaderboard(self):
+        """Ask for the all-time leaderboard and the selected topic's"""
+        if self.socket and self.nickname:
+            self.send_message({
+                "type": "GLOBAL_LEADERBOARD",
+                "user": self.nickname,
+                "data": {"topic": self.topic_combo.currentText()}
+            })
+            
+    def display_global_leaderboard(self, data):
+        """Display the global leaderboard (all rooms, kept across server restarts)"""
+        all_time = data.get('all_time', {})
+        text = "ALL TIME:\n" + (self.standings_text(all_time.get('scores', []), all_time) or "No games yet\n")
+        if 'by_topic' in data:
+            by_topic = data['by_topic']
+            text += f"\n{data.get('topic', '').upper()}:\n"
+            text += self.standings_text(by_topic.get('scores', []), by_topic) or "No games yet\n"
+            
+        msg_box = QMessageBox(self)
+        msg_box.setWindowTitle("Global Leaderboard")
+        msg_box.setText(text)
+        msg_box.setStyleSheet(self.styleSheet())
+        msg_box.exec_()
+        
     def refresh_lobby(self):
         """Refresh lobby data (rooms and topics)"""
         if self.socket and self.nickname:
@@ -825,10 +917,15 @@ class QuizClient(QMainWindow):
         if not topic:
             return
             
+        data = {"topic": topic}
+        if self.question_count_spin.value():
+            data["count"] = self.question_count_spin.value()
+        if self.difficulty_combo.currentIndex() > 0:
+            data["difficulty"] = self.difficulty_combo.currentText()
         self.send_message({
             "type": "CREATE_ROOM",
             "user": self.nickname,
-            "data": {"topic": topic}
+            "data": data
         })
         
     def delete_room(self):
@@ -909,6 +1006,8 @@ class QuizClient(QMainWindow):
         
     def handle_disconnect(self):
         """Handle server disconnection"""
+        if self.expected_disconnect:
+            return
         QMessageBox.critical(self, "Disconnected", "Connection to server lost!")
         self.stacked_widget.setCurrentIndex(0)  # Return to login screen
         
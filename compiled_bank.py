@@ -0,0 +1,261 @@
+"""Compiled question bank: questions_<topic>.json -> questions_<topic>.qbank.
+
+Layout (little-endian):
+    header   4s magic "QBNK", u32 format version, u32 question count,
+             u32 topic length, then the topic name in UTF-8
+    offsets  (count + 1) x u64, record start relative to the record area
+    ids      count x u64, answer_log.question_id() of each question
+    levels   count x u8, difficulty label (0 none, 1 easy, 2 medium, 3 hard)
+    records  u8 type code, u8 option count, u8 alias count, u8 tag count,
+             f64 tolerance, then u32-length-prefixed UTF-8 strings:
+             question, answer, answer key, options..., aliases..., tags...
+    tags     u32 tag count, then per tag in name order: u32-length-prefixed
+             UTF-8 name, u32 member count, member count x u32 question
+             indices in ascending order
+
+The answer key is the answer normalized as grading.normalize() does, so
+the grader built from it does no extra work per question. The ids and
+levels let adaptive selection rank a topic without decoding its records,
+and the levels and tag index let a filtered sample pick its questions
+the same way.
+The server mmaps the file and decodes one record per index on demand;
+nothing is parsed up front.
+
+Usage: python compiled_bank.py [questions_<topic>.json ...]
+"""
+import argparse
+import glob
+import json
+import mmap
+import os
+import struct
+import sys
+from array import array
+from bisect import bisect_left
+from collections.abc import Sequence
+
+from answer_log import question_id
+from grading import normalize
+
+MAGIC = b"QBNK"
+FORMAT_VERSION = 4
+HEADER = struct.Struct("<4sIII")
+OFFSET = struct.Struct("<Q")
+ID = struct.Struct("<Q")
+RECORD = struct.Struct("<BBBBd")
+MAX_LIST = 255
+LENGTH = struct.Struct("<I")
+TYPE_CODES = {"short": 0, "mcq": 1}
+TYPE_NAMES = {code: name for name, code in TYPE_CODES.items()}
+LEVEL_CODES = {None: 0, "easy": 1, "medium": 2, "hard": 3}
+LEVEL_NAMES = {code: name for name, code in LEVEL_CODES.items()}
+
+def answer_key(question):
+    return normalize(question["answer"], question["type"] == "mcq")
+
+def encode_record(question):
+    options = question.get("options", []) if question["type"] == "mcq" else []
+    aliases = question.get("aliases", [])
+    tags = question.get("tags", [])
+    for field, values in (("options", options), ("aliases", aliases), ("tags", tags)):
+        if len(values) > MAX_LIST:
+            raise ValueError(f"question {question['question']!r} has more than {MAX_LIST} {field}")
+    parts = [RECORD.pack(TYPE_CODES[question["type"]], len(options), len(aliases), len(tags),
+                         float(question.get("tolerance") or 0.0))]
+    for text in (question["question"], question["answer"], answer_key(question), *options, *aliases, *tags):
+        data = str(text).encode("utf-8")
+        parts.append(LENGTH.pack(len(data)))
+        parts.append(data)
+    return b"".join(parts)
+
+def encode_tag_index(questions):
+    members = {}
+    for index, q in enumerate(questions):
+        for tag in q.get("tags", ()):
+            members.setdefault(tag, array("I")).append(index)
+    parts = [LENGTH.pack(len(members))]
+    for tag in sorted(members):
+        name = tag.encode("utf-8")
+        indices = members[tag]
+        if sys.byteorder == "big":
+            indices.byteswap()
+        parts += [LENGTH.pack(len(name)), name, LENGTH.pack(len(indices)), indices.tobytes()]
+    return b"".join(parts)
+
+def compile_questions(questions, out_path):
+    """Write questions to out_path atomically; a server mapping the old file keeps its copy."""
+    from question_bank import normalize_tags, topic_for_file
+    topic = topic_for_file(os.path.basename(out_path))
+    for q in questions:
+        if q.get("difficulty") is not None:
+            q["difficulty"] = str(q["difficulty"]).strip().lower()
+        if q.get("difficulty") not in LEVEL_CODES:
+            raise ValueError(f"question {q['question']!r} has unknown difficulty {q['difficulty']!r}")
+        if "tags" in q:
+            q["tags"] = normalize_tags(q["tags"])
+    records = [encode_record(q) for q in questions]
+    offsets = [0]
+    for record in records:
+        offsets.append(offsets[-1] + len(record))
+    name = topic.encode("utf-8")
+    tmp_path = out_path + ".tmp"
+    with open(tmp_path, "wb") as f:
+        f.write(HEADER.pack(MAGIC, FORMAT_VERSION, len(records), len(name)))
+        f.write(name)
+        f.write(b"".join(OFFSET.pack(offset) for offset in offsets))
+        f.write(b"".join(ID.pack(question_id(topic, q["question"])) for q in questions))
+        f.write(bytes(LEVEL_CODES[q.get("difficulty")] for q in questions))
+        f.writelines(records)
+        f.write(encode_tag_index(questions))
+    os.replace(tmp_path, out_path)
+    return len(records)
+
+def compiled_path(json_path):
+    return json_path[:-len(".json")] + ".qbank"
+
+class CompiledTopic(Sequence):
+    """Read-only sequence of question dicts backed by a memory-mapped .qbank file.
+
+    Only the header is read on open; each question is decoded from the
+    mapping when indexed, so resident memory is the pages actually touched.
+    """
+    def __init__(self, path):
+        self.path = path
+        with open(path, "rb") as f:
+            self.map = mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ)
+        magic, version, count, name_length = HEADER.unpack_from(self.map, 0)
+        if magic != MAGIC or version != FORMAT_VERSION:
+            raise ValueError(f"{path} is not a version {FORMAT_VERSION} question bank")
+        self.count = count
+        self.topic = str(self.map[HEADER.size:HEADER.size + name_length], "utf-8")
+        self.offsets_at = HEADER.size + name_length
+        self.ids_at = self.offsets_at + (count + 1) * OFFSET.size
+        self.levels_at = self.ids_at + count * ID.size
+        self.records_at = self.levels_at + count
+        self.tags_at = self.records_at + OFFSET.unpack_from(self.map, self.offsets_at + count * OFFSET.size)[0]
+        if self.tags_at + LENGTH.size > len(self.map):
+            raise ValueError(f"{path} is truncated or corrupt")
+        self.tag_index = None
+
+    def __len__(self):
+        return self.count
+
+    def question_ids(self):
+        """array('Q') of every question's id, copied from the id table without decoding records."""
+        ids = array("Q")
+        ids.frombytes(self.map[self.ids_at:self.levels_at])
+        if sys.byteorder == "big":
+            ids.byteswap()
+        return ids
+
+    def difficulties(self):
+        """Every question's difficulty label (None if unlabelled), from the level table."""
+        return [LEVEL_NAMES.get(code) for code in self.map[self.levels_at:self.records_at]]
+
+    def tag_members(self, tag):
+        """array('I') of the indices of questions tagged tag, ascending, from the tag index."""
+        if self.tag_index is None:
+            index = {}
+            pos = self.tags_at
+            (tag_count,) = LENGTH.unpack_from(self.map, pos)
+            pos += LENGTH.size
+            for _ in range(tag_count):
+                (length,) = LENGTH.unpack_from(self.map, pos)
+                pos += LENGTH.size
+                name = str(self.map[pos:pos + length], "utf-8")
+                (member_count,) = LENGTH.unpack_from(self.map, pos + length)
+                pos += length + LENGTH.size
+                index[name] = (pos, member_count)
+                pos += member_count * LENGTH.size
+            if pos != len(self.map):
+                raise ValueError(f"{self.path} has a corrupt tag index")
+            self.tag_index = index
+        members = array("I")
+        if tag in self.tag_index:
+            pos, member_count = self.tag_index[tag]
+            members.frombytes(self.map[pos:pos + member_count * LENGTH.size])
+            if sys.byteorder == "big":
+                members.byteswap()
+        return members
+
+    def matching(self, difficulty=None, tags=()):
+        """Indices of the questions with difficulty and every one of tags, ascending.
+
+        Reads only the level table and the tag index; no record is decoded.
+        Unlabelled questions count as "medium", as they do in a JSON topic.
+        """
+        levels = self.map[self.levels_at:self.records_at]
+        codes = None
+        if difficulty:
+            codes = {LEVEL_CODES[difficulty]} if difficulty in LEVEL_CODES else set()
+            if difficulty == "medium":
+                codes.add(LEVEL_CODES[None])
+        if not tags:
+            return (i for i, code in enumerate(levels) if codes is None or code in codes)
+        rarest, *others = sorted((self.tag_members(tag) for tag in tags), key=len)
+        return (i for i in rarest
+                if (codes is None or levels[i] in codes)
+                and all(contains(members, i) for members in others))
+
+    def __getitem__(self, index):
+        if isinstance(index, slice):
+            return [self[i] for i in range(*index.indices(self.count))]
+        if index < 0:
+            index += self.count
+        if not 0 <= index < self.count:
+            raise IndexError("question index out of range")
+        pos = self.records_at + OFFSET.unpack_from(self.map, self.offsets_at + index * OFFSET.size)[0]
+        type_code, option_count, alias_count, tag_count, tolerance = RECORD.unpack_from(self.map, pos)
+        pos += RECORD.size
+        strings = []
+        for _ in range(3 + option_count + alias_count + tag_count):
+            length = LENGTH.unpack_from(self.map, pos)[0]
+            pos += LENGTH.size
+            strings.append(str(self.map[pos:pos + length], "utf-8"))
+            pos += length
+        question = {"type": TYPE_NAMES[type_code], "question": strings[0], "answer": strings[1],
+                    "answer_key": strings[2]}
+        aliases_at = 3 + option_count
+        tags_at = aliases_at + alias_count
+        if type_code == TYPE_CODES["mcq"]:
+            question["options"] = strings[3:aliases_at]
+        if alias_count:
+            question["aliases"] = strings[aliases_at:tags_at]
+        if tag_count:
+            question["tags"] = strings[tags_at:]
+        if tolerance:
+            question["tolerance"] = tolerance
+        level = self.map[self.levels_at + index]
+        if level:
+            question["difficulty"] = LEVEL_NAMES[level]
+        return question
+
+def contains(members, index):
+    pos = bisect_left(members, index)
+    return pos < len(members) and members[pos] == index
+
+def main(argv=None):
+    from question_bank import validate_questions
+    parser = argparse.ArgumentParser(description="Compile questions_*.json into memory-mappable .qbank files")
+    parser.add_argument("files", nargs="*", help="JSON question files (default: questions_*.json here)")
+    args = parser.parse_args(argv)
+    files = args.files or sorted(glob.glob("questions_*.json"))
+    if not files:
+        print("No questions_*.json files found")
+        return 1
+    status = 0
+    for path in files:
+        with open(path, "r", encoding="utf-8") as f:
+            questions = validate_questions(json.load(f), path)
+        out_path = compiled_path(path)
+        try:
+            count = compile_questions(questions, out_path)
+        except ValueError as e:
+            print(f"  ✗ {path}: {e}")
+            status = 1
+            continue
+        print(f"  ✓ {path} -> {out_path}: {count} questions, {os.path.getsize(out_path)} bytes")
+    return status
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,151 @@
+"""Global leaderboard: final scores from every finished room, kept across restarts.
+
+Each finished quiz adds its players' scores to two running totals, one for the
+topic and one all-time (scope ""). Totals live in a SQLite file and are loaded
+into one leaderboard.Leaderboard per scope at startup, so top-K and a player's
+rank are answered from memory. Games are handed to a writer thread through a
+queue; record() never waits on the disk.
+"""
+import queue
+import sqlite3
+import threading
+import time
+import traceback
+
+from leaderboard import Leaderboard, TOP_K
+
+DEFAULT_LEADERBOARD_DB = "leaderboard.db"
+ALL_TIME = ""
+
+SCHEMA = """
+CREATE TABLE IF NOT EXISTS results (
+    id INTEGER PRIMARY KEY,
+    finished_at REAL NOT NULL,
+    room_code TEXT NOT NULL,
+    topic TEXT NOT NULL,
+    nickname TEXT NOT NULL,
+    score INTEGER NOT NULL
+);
+CREATE TABLE IF NOT EXISTS totals (
+    scope TEXT NOT NULL,
+    nickname TEXT NOT NULL,
+    score INTEGER NOT NULL,
+    games INTEGER NOT NULL,
+    PRIMARY KEY (scope, nickname)
+) WITHOUT ROWID;
+"""
+
+class GlobalLeaderboard:
+    """Per-topic and all-time totals, persisted by a background writer.
+
+    record() only enqueues. The writer drains whatever is queued, writes it
+    in one transaction, then applies it to the in-memory boards under a
+    lock that readers hold only for a few bisects.
+    """
+    def __init__(self, path=DEFAULT_LEADERBOARD_DB):
+        self.path = path
+        self.lock = threading.Lock()
+        self.boards = {ALL_TIME: Leaderboard()}
+        self.pending = queue.Queue()
+        self.games = 0
+        self.writes = 0
+        self.writer = None
+        db = sqlite3.connect(path)
+        try:
+            db.executescript(SCHEMA)
+            for scope, nickname, score in db.execute("SELECT scope, nickname, score FROM totals"):
+                self.board(scope).add(nickname, score)
+        finally:
+            db.close()
+        print(f"  ✓ Global leaderboard {path}: {len(self.boards[ALL_TIME])} players, "
+              f"{len(self.boards) - 1} topics")
+
+    def board(self, scope):
+        board = self.boards.get(scope)
+        if board is None:
+            board = self.boards[scope] = Leaderboard()
+        return board
+
+    def start(self):
+        if self.writer is None:
+            self.writer = threading.Thread(target=self.write_loop, name="global-leaderboard", daemon=True)
+            self.writer.start()
+
+    def record(self, room_code, topic, standings):
+        """Queue a finished game's [name, score] standings. Safe from any thread."""
+        if standings:
+            self.pending.put((time.time(), room_code, topic, [tuple(entry) for entry in standings]))
+
+    def write_loop(self):
+        db = sqlite3.connect(self.path)
+        while True:
+            games = [self.pending.get()]
+            while True:
+                try:
+                    games.append(self.pending.get_nowait())
+                except queue.Empty:
+                    break
+            stop = None in games
+            games = [game for game in games if game is not None]
+            try:
+                self.write(db, games)
+            except Exception:
+                print("Global leaderboard write failed:")
+                traceback.print_exc()
+            if stop:
+                db.close()
+                return
+
+    def write(self, db, games):
+        if not games:
+            return
+        with db:
+            for finished_at, room_code, topic, standings in games:
+                db.executemany("INSERT INTO results (finished_at, room_code, topic, nickname, score) "
+                               "VALUES (?, ?, ?, ?, ?)",
+                               [(finished_at, room_code, topic, name, score) for name, score in standings])
+                for scope in (ALL_TIME, topic):
+                    db.executemany("INSERT INTO totals (scope, nickname, score, games) VALUES (?, ?, ?, 1) "
+                                   "ON CONFLICT (scope, nickname) DO UPDATE SET "
+                                   "score = score + excluded.score, games = games + 1",
+                                   [(scope, name, score) for name, score in standings])
+        for _, _, topic, standings in games:
+            # One game per lock hold, so a large batch never stalls readers for long
+            with self.lock:
+                for scope in (ALL_TIME, topic):
+                    board = self.board(scope)
+                    for name, score in standings:
+                        if name in board.scores:
+                            board.add_points(name, score)
+                        else:
+                            board.add(name, score)
+        self.games += len(games)
+        self.writes += 1
+
+    def view(self, nickname, topic=None, k=TOP_K):
+        """All-time top-k plus nickname's rank, and the same for topic if given."""
+        with self.lock:
+            board = self.boards[ALL_TIME]
+            result = {"all_time": board.view_for(nickname, board.top(k), k),
+                      "topics": sorted(scope for scope in self.boards if scope != ALL_TIME)}
+            if topic:
+                board = self.boards.get(topic) or Leaderboard()
+                result["topic"] = topic
+                result["by_topic"] = board.view_for(nickname, board.top(k), k)
+        return result
+
+    def top(self, scope=ALL_TIME, k=TOP_K):
+        with self.lock:
+            board = self.boards.get(scope)
+            return board.top(k) if board is not None else []
+
+    def stop(self, timeout=2.0):
+        """Flush queued games to disk, waiting at most timeout seconds."""
+        if self.writer is None:
+            return
+        self.pending.put(None)
+        self.writer.join(timeout)
+
+    def stats(self):
+        return {"players": len(self.boards[ALL_TIME]), "topics": len(self.boards) - 1,
+                "games": self.games, "writes": self.writes, "queued": self.pending.qsize()}
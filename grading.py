@@ -0,0 +1,129 @@
+import re
+import unicodedata
+
+# Everything but letters, digits, "+" and "#" (C++, C#); dots only survive
+# before a digit (3.14, .5) and hyphens only as a leading minus sign (-40)
+PUNCTUATION = re.compile(r"[^\w\s.+#-]|_|\.(?!\d)|(?<=\w)-|-(?!\d)")
+WHITESPACE = re.compile(r"\s+")
+NUMBER = re.compile(r"[-+]?(\d+(\.\d*)?|\.\d+)([eE][-+]?\d+)?$")
+DIGITS = re.compile(r"\d+")
+
+def normalize(text, punctuation=False):
+    """Casefold and collapse whitespace; also drop punctuation unless punctuation=True."""
+    text = unicodedata.normalize("NFKC", str(text)).casefold()
+    if not punctuation:
+        text = PUNCTUATION.sub(" ", text)
+    return WHITESPACE.sub(" ", text).strip()
+
+def parse_number(text):
+    text = text.replace(" ", "")
+    if NUMBER.match(text):
+        try:
+            return float(text)
+        except ValueError:
+            return None
+    return None
+
+def edit_budget(key):
+    """Typos tolerated for a key of this length: none for short keys, then 1, then 2."""
+    if len(key) <= 4:
+        return 0
+    if len(key) <= 10:
+        return 1
+    return 2
+
+def within_distance(a, b, k):
+    """True if Levenshtein(a, b) <= k. Only the 2k+1 cells of each row around
+    the diagonal are kept, indexed relative to it (band[d] is column
+    i + d - k of row i), and the scan stops as soon as every cell in the
+    band exceeds k, so the cost is O(k * min(len(a), len(b))) time and
+    O(k) memory."""
+    if len(a) > len(b):
+        a, b = b, a
+    n, m = len(a), len(b)
+    if m - n > k:
+        return False
+    if k == 0:
+        return a == b
+    big = k + 1
+    width = 2 * k + 1
+    # Row 0: column j costs j; columns off either end of b are out of reach
+    previous = [d - k if k <= d <= m + k else big for d in range(width)]
+    current = [big] * width
+    for i in range(1, n + 1):
+        ai = a[i - 1]
+        lo = max(0, k - i)
+        hi = min(width - 1, m - i + k)
+        left = big
+        row_min = big
+        for d in range(lo, hi + 1):
+            j = i + d - k
+            if j == 0:
+                value = i
+            else:
+                value = previous[d] if ai == b[j - 1] else previous[d] + 1
+                if d + 1 < width and previous[d + 1] + 1 < value:
+                    value = previous[d + 1] + 1
+                if left + 1 < value:
+                    value = left + 1
+                if value > big:
+                    value = big
+            current[d] = value
+            left = value
+            if value < row_min:
+                row_min = value
+        if row_min > k:
+            return False
+        for d in range(lo):
+            current[d] = big
+        for d in range(hi + 1, width):
+            current[d] = big
+        previous, current = current, previous
+    return previous[m - n + k] <= k
+
+class AnswerKey:
+    """Everything needed to grade one question, built once when it is asked.
+
+    Multiple choice answers must match an option exactly up to case and
+    whitespace (options like "C" and "C++" must stay distinct). Short
+    answers ignore punctuation and also accept a number within the
+    question's "tolerance", or a spelling within edit_budget() typos of
+    the answer or any of its "aliases". Typos are only forgiven in
+    letters: every run of digits in the key ("255.255.255.0", "1984",
+    "3.10") must appear unchanged and in order.
+    """
+    __slots__ = ("strict", "keys", "number", "tolerance", "longest", "digits")
+
+    def __init__(self, answer, aliases=(), strict=False, tolerance=0.0):
+        self.strict = strict
+        keys = [normalize(answer, strict)] + [normalize(alias, strict) for alias in aliases]
+        self.keys = tuple(dict.fromkeys(key for key in keys if key))
+        # Numeric answers are compared by value; "22" must not fuzzy-match "23"
+        self.number = None if strict or not self.keys else parse_number(self.keys[0])
+        self.tolerance = float(tolerance or 0.0)
+        self.longest = max((len(key) + edit_budget(key) for key in self.keys), default=0)
+        self.digits = tuple(DIGITS.findall(key) for key in self.keys)
+
+    @classmethod
+    def for_question(cls, question):
+        key = question.get("grader")
+        if key is None:
+            key = cls(question.get("answer_key") or question["answer"], question.get("aliases", ()),
+                      strict=question["type"] == "mcq", tolerance=question.get("tolerance", 0.0))
+        return key
+
+    def grade(self, answer):
+        """O(len(answer)): normalization plus a bounded, early-exit distance check per key."""
+        if not isinstance(answer, str) or len(answer) > 4 * self.longest + 16:
+            return False
+        answer = normalize(answer, self.strict)
+        if answer in self.keys:
+            return True
+        if self.strict:
+            return False
+        if self.number is not None:
+            value = parse_number(answer)
+            return value is not None and abs(value - self.number) <= self.tolerance
+        digits = DIGITS.findall(answer)
+        return any(digits == key_digits and within_distance(answer, key, edit_budget(key))
+                   for key, key_digits in zip(self.keys, self.digits))
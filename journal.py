@@ -0,0 +1,252 @@
+"""Append-only journal of room state transitions, for recovery after a restart.
+
+Rooms append one small record per transition (room created or deleted,
+player joined or left, quiz started, question advanced, answer scored, quiz
+ended). append() only queues the record; a writer thread writes whatever has
+queued as one batch, then fsyncs according to the policy:
+
+    always    fsync after every batch (a crash loses nothing that was written)
+    interval  fsync at most once per FSYNC_INTERVAL seconds (the default); an
+              idle writer still fsyncs its last batch once the interval is up
+    never     leave it to the OS
+
+The writer also folds every record into a plain-dict copy of the room state
+(apply_record). Every snapshot_every records (or more, if the state itself
+is bigger than that) the copy is written to snapshot.json and the journal is
+truncated, so replay after a restart reads one snapshot plus a bounded tail. Files in the journal directory:
+
+    snapshot.json   {"seq": N, "rooms": {code: room state}}
+    journal.log     one JSON record per line, each with a "seq" > the snapshot's
+"""
+import json
+import os
+import threading
+import time
+import traceback
+
+DEFAULT_JOURNAL_DIR = "journal"
+DEFAULT_SNAPSHOT_EVERY = 10000
+FSYNC_POLICIES = ("always", "interval", "never")
+FSYNC_INTERVAL = 1.0
+
+def portable_question(question):
+    """A question dict as plain JSON (without the precomputed grader)."""
+    return {key: value for key, value in question.items() if key != "grader"}
+
+def apply_record(rooms, record):
+    """Fold one journal record into rooms ({code: state dict}). Used both live
+    and on replay, so the two can never disagree. "answered" maps who has
+    answered the current question to the points it earned them."""
+    op = record["op"]
+    code = record["room"]
+    if op == "room":
+        rooms[code] = {"code": code, "topic": record["topic"], "questions": record["questions"],
+                       "status": "Waiting", "index": 0, "scores": {}, "answered": {}}
+        return
+    room = rooms.get(code)
+    if room is None:
+        return
+    if op == "join":
+        room["scores"][record["player"]] = record.get("score", 0)
+    elif op == "leave":
+        room["scores"].pop(record["player"], None)
+    elif op == "answer":
+        if record["player"] in room["scores"]:
+            room["scores"][record["player"]] += record["points"]
+        room.setdefault("answered", {})[record["player"]] = record["points"]
+    elif op == "question":
+        room["index"] = record["index"]
+        room["answered"] = {}
+    elif op == "start":
+        if "questions" in record:
+            room["questions"] = record["questions"]
+        room["status"] = "In Progress"
+        room["index"] = 0
+        room["answered"] = {}
+    elif op == "end":
+        room["status"] = "Finished"
+    elif op == "delete":
+        del rooms[code]
+
+class Journal:
+    def __init__(self, directory=DEFAULT_JOURNAL_DIR, fsync="interval", snapshot_every=DEFAULT_SNAPSHOT_EVERY,
+                 flush_interval=0.05):
+        if fsync not in FSYNC_POLICIES:
+            raise ValueError(f"fsync policy must be one of {FSYNC_POLICIES}")
+        self.directory = directory
+        self.fsync = fsync
+        self.snapshot_every = snapshot_every
+        self.flush_interval = flush_interval
+        self.journal_path = os.path.join(directory, "journal.log")
+        self.snapshot_path = os.path.join(directory, "snapshot.json")
+        self.lock = threading.Lock()
+        self.wakeup = threading.Condition(self.lock)
+        self.buffer = []
+        self.seq = 0
+        self.rooms = {}
+        self.applied = 0
+        self.since_snapshot = 0
+        self.last_fsync = 0.0
+        self.unsynced = 0
+        self.file = None
+        self.writer = None
+        self.closed = False
+        self.records = 0
+        self.batches = 0
+        self.fsyncs = 0
+        self.snapshots = 0
+        os.makedirs(directory, exist_ok=True)
+
+    def recover(self):
+        """Load the snapshot, replay the journal after it and compact both into
+        a fresh snapshot. Returns {code: room state} for rooms that were live."""
+        snapshot_seq = 0
+        if os.path.exists(self.snapshot_path):
+            with open(self.snapshot_path, "r", encoding="utf-8") as f:
+                snapshot = json.load(f)
+            snapshot_seq = snapshot["seq"]
+            self.rooms = snapshot["rooms"]
+        self.seq = snapshot_seq
+        replayed = 0
+        if os.path.exists(self.journal_path):
+            with open(self.journal_path, "r", encoding="utf-8") as f:
+                for line in f:
+                    try:
+                        record = json.loads(line)
+                    except ValueError:
+                        # A torn final write from a crash; nothing after it was acknowledged
+                        print(f"  ✗ Journal: ignoring incomplete record after seq {self.seq}")
+                        break
+                    if record["seq"] <= snapshot_seq:
+                        continue
+                    apply_record(self.rooms, record)
+                    self.seq = record["seq"]
+                    replayed += 1
+        # Finished rooms have nothing left to resume
+        self.rooms = {code: room for code, room in self.rooms.items() if room["status"] != "Finished"}
+        self.applied = self.seq
+        self.write_snapshot()
+        print(f"  ✓ Journal {self.directory}: snapshot seq {snapshot_seq}, replayed {replayed} records, "
+              f"{len(self.rooms)} rooms to restore")
+        return {code: dict(room, scores=dict(room["scores"])) for code, room in self.rooms.items()}
+
+    def start(self):
+        if self.writer is None:
+            self.file = open(self.journal_path, "ab")
+            self.writer = threading.Thread(target=self.write_loop, name="journal", daemon=True)
+            self.writer.start()
+
+    def append(self, op, room, **fields):
+        """Queue one record. Never touches the disk; safe from any thread."""
+        with self.lock:
+            if self.closed:
+                return
+            self.seq += 1
+            fields.update(seq=self.seq, op=op, room=room)
+            self.buffer.append(fields)
+            if len(self.buffer) == 1:
+                self.wakeup.notify()
+
+    def write_loop(self):
+        while True:
+            with self.lock:
+                while not self.buffer and not self.closed:
+                    if not self.unsynced:
+                        self.wakeup.wait()
+                        continue
+                    # Records written since the last fsync get one when the interval
+                    # is up, even if no later batch comes along to trigger it
+                    remaining = self.last_fsync + FSYNC_INTERVAL - time.monotonic()
+                    if remaining <= 0:
+                        break
+                    self.wakeup.wait(remaining)
+                closed = self.closed
+                idle = not self.buffer
+            if idle and not closed:
+                try:
+                    self.sync(time.monotonic())
+                except Exception:
+                    print("Journal fsync failed:")
+                    traceback.print_exc()
+                    # Retry after another interval rather than spinning on the failure
+                    self.last_fsync = time.monotonic()
+                continue
+            if not closed:
+                # Let a burst of appends collect into one write
+                time.sleep(self.flush_interval)
+            with self.lock:
+                batch, self.buffer = self.buffer, []
+            try:
+                self.write_batch(batch)
+            except Exception:
+                print("Journal write failed:")
+                traceback.print_exc()
+            if closed:
+                return
+
+    def write_batch(self, batch):
+        if not batch:
+            return
+        self.file.write("".join(json.dumps(record) + "\n" for record in batch).encode("utf-8"))
+        self.file.flush()
+        if self.fsync != "never":
+            self.unsynced += len(batch)
+            now = time.monotonic()
+            if self.fsync == "always" or now - self.last_fsync >= FSYNC_INTERVAL:
+                self.sync(now)
+        for record in batch:
+            apply_record(self.rooms, record)
+        self.applied = batch[-1]["seq"]
+        self.records += len(batch)
+        self.batches += 1
+        self.since_snapshot += len(batch)
+        # Snapshots cost O(live state), so wait for at least that many records
+        # to keep the cost per record constant however many players are online
+        if self.since_snapshot >= self.snapshot_every and self.since_snapshot >= self.state_size():
+            self.write_snapshot()
+
+    def sync(self, now):
+        os.fsync(self.file.fileno())
+        self.last_fsync = now
+        self.unsynced = 0
+        self.fsyncs += 1
+
+    def state_size(self):
+        return sum(len(room["scores"]) + 1 for room in self.rooms.values())
+
+    def write_snapshot(self):
+        """Write the folded state atomically, then start an empty journal."""
+        tmp_path = self.snapshot_path + ".tmp"
+        with open(tmp_path, "w", encoding="utf-8") as f:
+            json.dump({"seq": self.applied, "rooms": self.rooms}, f)
+            f.flush()
+            os.fsync(f.fileno())
+        os.replace(tmp_path, self.snapshot_path)
+        # Records up to applied are now in the snapshot; a crash before this
+        # truncate only leaves records that replay skips by seq
+        if self.file is not None:
+            self.file.close()
+            self.file = open(self.journal_path, "wb")
+        else:
+            open(self.journal_path, "wb").close()
+        self.since_snapshot = 0
+        # Everything written so far is in the fsynced snapshot
+        self.unsynced = 0
+        self.snapshots += 1
+
+    def close(self, timeout=2.0):
+        """Write everything queued, snapshot it and stop the writer."""
+        with self.lock:
+            if self.closed:
+                return
+            self.closed = True
+            self.wakeup.notify()
+        if self.writer is not None:
+            self.writer.join(timeout)
+            if not self.writer.is_alive():
+                self.write_snapshot()
+                self.file.close()
+
+    def stats(self):
+        return {"seq": self.seq, "records": self.records, "batches": self.batches, "fsyncs": self.fsyncs,
+                "unsynced": self.unsynced, "snapshots": self.snapshots, "rooms": len(self.rooms), "queued": len(self.buffer)}
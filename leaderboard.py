@@ -0,0 +1,151 @@
+from bisect import bisect_left, insort
+from itertools import accumulate
+
+TOP_K = 10
+NEIGHBOURS = 2
+
+class Leaderboard:
+    """Scores kept in rank order incrementally, as a list of sorted buckets.
+
+    Entries are (-score, name) tuples spread over buckets of at most
+    2 * LOAD entries, with each bucket's last entry kept in maxes for
+    bisecting. An update is a remove plus an insert: O(log n + LOAD).
+    The number of entries before each bucket is cached after the first
+    lookup following a change, so rank() is O(log n) while the standings
+    are not changing and O(n / LOAD) right after. Nothing is ever sorted
+    from scratch. Ranks are competition ranks: tied scores
+    share a rank and the next rank skips ahead (1, 2, 2, 4).
+    """
+    LOAD = 256
+
+    def __init__(self):
+        self.scores = {}
+        self.buckets = []
+        self.maxes = []
+        self.offsets = None
+
+    def __len__(self):
+        return len(self.scores)
+
+    def insert(self, entry):
+        self.offsets = None
+        if not self.buckets:
+            self.buckets.append([entry])
+            self.maxes.append(entry)
+            return
+        i = bisect_left(self.maxes, entry)
+        if i == len(self.buckets):
+            i -= 1
+        bucket = self.buckets[i]
+        insort(bucket, entry)
+        self.maxes[i] = bucket[-1]
+        if len(bucket) > 2 * self.LOAD:
+            self.buckets[i:i + 1] = [bucket[:self.LOAD], bucket[self.LOAD:]]
+            self.maxes[i:i + 1] = [bucket[self.LOAD - 1], bucket[-1]]
+
+    def delete(self, entry):
+        self.offsets = None
+        i = bisect_left(self.maxes, entry)
+        bucket = self.buckets[i]
+        del bucket[bisect_left(bucket, entry)]
+        if bucket:
+            self.maxes[i] = bucket[-1]
+        else:
+            del self.buckets[i]
+            del self.maxes[i]
+
+    def position(self, entry):
+        """Number of entries ordered before entry."""
+        if self.offsets is None:
+            self.offsets = [0, *accumulate(map(len, self.buckets))]
+        i = bisect_left(self.maxes, entry)
+        before = self.offsets[i]
+        if i < len(self.buckets):
+            before += bisect_left(self.buckets[i], entry)
+        return before
+
+    def add(self, name, score=0):
+        if name in self.scores:
+            self.remove(name)
+        self.scores[name] = score
+        self.insert((-score, name))
+
+    def remove(self, name):
+        score = self.scores.pop(name, None)
+        if score is not None:
+            self.delete((-score, name))
+
+    def add_points(self, name, points):
+        score = self.scores.get(name)
+        if score is None or not points:
+            return
+        self.delete((-score, name))
+        self.scores[name] = score + points
+        self.insert((-(score + points), name))
+
+    def rank_of_score(self, score):
+        return self.position((-score, "")) + 1
+
+    def rank(self, name):
+        score = self.scores.get(name)
+        return None if score is None else self.rank_of_score(score)
+
+    def slice(self, start, stop):
+        """Entries at positions start..stop-1 as [name, score] pairs."""
+        result = []
+        offset = 0
+        for bucket in self.buckets:
+            if offset + len(bucket) > start:
+                for neg_score, name in bucket[max(0, start - offset):stop - offset]:
+                    result.append([name, -neg_score])
+            offset += len(bucket)
+            if offset >= stop:
+                break
+        return result
+
+    def top(self, k=TOP_K):
+        return self.slice(0, k)
+
+    def around(self, name, radius=NEIGHBOURS):
+        """[rank, name, score] for name and up to radius players either side of it."""
+        score = self.scores.get(name)
+        if score is None:
+            return []
+        pos = self.position((-score, name))
+        return [[self.rank_of_score(s), n, s] for n, s in self.slice(max(0, pos - radius), pos + radius + 1)]
+
+    def standings(self):
+        return self.slice(0, len(self.scores))
+
+    def personal_views(self, k=TOP_K, radius=NEIGHBOURS):
+        """The per-player part of view_for() (rank, score and, outside the
+        top k, neighbours) for everyone in one O(n) pass over the standings
+        instead of a rank lookup per player. Returns {name: view}."""
+        standings = self.standings()
+        rows = []
+        rank = 0
+        previous = None
+        for position, (name, score) in enumerate(standings):
+            if score != previous:
+                rank = position + 1
+                previous = score
+            rows.append([rank, name, score])
+        views = {}
+        for position, row in enumerate(rows):
+            if position < k:
+                views[row[1]] = {"rank": row[0], "score": row[2]}
+            else:
+                views[row[1]] = {"rank": row[0], "score": row[2],
+                                 "around": rows[max(0, position - radius):position + radius + 1]}
+        return views
+
+    def view_for(self, name, top, k=TOP_K, radius=NEIGHBOURS):
+        """The compact leaderboard one player sees: shared top-k plus their own rank and neighbours."""
+        view = {"scores": top, "player_count": len(self.scores)}
+        score = self.scores.get(name)
+        if score is not None:
+            view["rank"] = self.rank_of_score(score)
+            view["score"] = score
+            if self.position((-score, name)) >= k:
+                view["around"] = self.around(name, radius)
+        return view
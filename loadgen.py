@@ -0,0 +1,332 @@
+"""Headless load generator: a fleet of asyncio bots playing real quizzes.
+
+Each bot is one TCP connection speaking the same protocol as client.py. Bots
+are grouped into rooms; the first bot of each group creates the room, the
+rest join it, and once everyone is in the host starts the quiz. Every bot
+then answers each QUESTION after a random think time, and now and then chats
+in the lobby and the room. At the end the fleet prints:
+
+    QUESTION fan-out   time from the first player in a room receiving a
+                       question to each other player receiving it
+    first QUESTION     START_QUIZ sent -> question 1 received, per player
+    ANSWER round trip  ANSWER sent -> SCORE_UPDATE received
+    messages/second    sent and received by the whole fleet
+    server RSS         sampled from /proc while the test runs (Linux)
+
+By default a server is started on a free port with journaling, answer
+history and adaptive selection off, so runs don't leave files behind and
+compare like with like; --connect points the fleet at a running server.
+
+Usage:
+    python loadgen.py --engine asyncio --players 2000 --rooms 200
+    python loadgen.py --connect 127.0.0.1:8888 --server-pid 12345
+"""
+import argparse
+import asyncio
+import json
+import os
+import random
+import socket
+import subprocess
+import sys
+import tempfile
+import time
+
+from protocol import FrameReader, ProtocolError, encode_message
+from bench import proc_status, proc_cpu_seconds
+
+HERE = os.path.dirname(os.path.abspath(__file__))
+CONNECT_CONCURRENCY = 100
+RSS_INTERVAL = 0.5
+
+def percentiles(samples):
+    """p50/p90/p99/max of samples in milliseconds, or None if there are none."""
+    if not samples:
+        return None
+    ordered = sorted(samples)
+    pick = lambda p: ordered[min(len(ordered) - 1, int(p / 100 * len(ordered)))] * 1000
+    return {"count": len(ordered), "p50": pick(50), "p90": pick(90), "p99": pick(99), "max": ordered[-1] * 1000}
+
+class FleetRoom:
+    """One room's bots and the shared timing records for its questions."""
+    def __init__(self, index, size):
+        self.index = index
+        self.size = size
+        self.code = None
+        self.created = asyncio.Event()
+        self.joined = 0
+        self.all_joined = asyncio.Event()
+        self.started_at = None
+        self.receipts = {}  # question number -> [receive times]
+
+class Bot:
+    def __init__(self, fleet, nickname, room, host):
+        self.fleet = fleet
+        self.nickname = nickname
+        self.room = room
+        self.host = host
+        self.reader = None
+        self.writer = None
+        self.frames = FrameReader()
+        self.waiting = {}
+        self.answered_at = None
+        self.done = None
+
+    async def send(self, msg_type, data=None, **fields):
+        message = {"type": msg_type, "user": self.nickname, "data": data or {}, **fields}
+        self.writer.write(encode_message(message))
+        self.fleet.sent += 1
+        await self.writer.drain()
+
+    async def expect(self, msg_type, timeout):
+        future = self.waiting[msg_type] = asyncio.get_running_loop().create_future()
+        return await asyncio.wait_for(future, timeout)
+
+    async def run(self, address):
+        args = self.fleet.args
+        self.done = asyncio.get_running_loop().create_future()
+        reading = None
+        try:
+            async with self.fleet.connect_slots:
+                self.reader, self.writer = await asyncio.open_connection(*address)
+            reading = asyncio.create_task(self.read_loop())
+            lobby = self.expect("LOBBY_INFO", args.timeout)
+            await self.send("JOIN_LOBBY")
+            topics = (await lobby)["data"]["topics"]
+            if random.random() < args.chat:
+                await self.send("LOBBY_CHAT", {"message": f"hello from {self.nickname}"})
+            if self.host:
+                created = self.expect("ROOM_CREATED", args.timeout)
+                await self.send("CREATE_ROOM", {"topic": args.topic or random.choice(topics),
+                                                "count": args.questions})
+                self.room.code = (await created)["data"]["room_code"]
+                self.room.created.set()
+            else:
+                await asyncio.wait_for(self.room.created.wait(), args.timeout)
+            joined = self.expect("ROOM_JOINED", args.timeout)
+            await self.send("JOIN_ROOM", {"room_code": self.room.code})
+            await joined
+            self.room.joined += 1
+            if self.room.joined == self.room.size:
+                self.room.all_joined.set()
+            if self.host:
+                try:
+                    await asyncio.wait_for(self.room.all_joined.wait(), args.timeout)
+                except asyncio.TimeoutError:
+                    pass  # start with whoever made it
+                self.room.started_at = time.perf_counter()
+                await self.send("START_QUIZ", room_code=self.room.code)
+            await asyncio.wait_for(self.done, args.timeout + args.questions * (args.think[1] + 40))
+            self.fleet.finished += 1
+        except (asyncio.TimeoutError, OSError, ProtocolError) as e:
+            self.fleet.failures[type(e).__name__] = self.fleet.failures.get(type(e).__name__, 0) + 1
+        finally:
+            if reading is not None:
+                reading.cancel()
+            if self.writer is not None:
+                self.writer.close()
+
+    async def read_loop(self):
+        while True:
+            data = await self.reader.read(65536)
+            received = time.perf_counter()
+            if not data:
+                if not self.done.done():
+                    self.done.set_exception(ConnectionResetError("server closed the connection"))
+                return
+            for frame in self.frames.feed(data):
+                self.dispatch(json.loads(frame), received)
+
+    def dispatch(self, message, received):
+        fleet = self.fleet
+        msg_type = message.get("type")
+        fleet.received += 1
+        future = self.waiting.pop(msg_type, None)
+        if future is not None and not future.done():
+            future.set_result(message)
+        if msg_type == "QUESTION":
+            number = message["data"]["question_num"]
+            self.room.receipts.setdefault(number, []).append(received)
+            if number == 1 and self.room.started_at is not None:
+                fleet.first_question.append(received - self.room.started_at)
+            asyncio.create_task(self.answer(message["data"]))
+        elif msg_type == "SCORE_UPDATE":
+            if self.answered_at is not None:
+                fleet.answer_rtt.append(received - self.answered_at)
+                self.answered_at = None
+        elif msg_type == "QUIZ_END":
+            if not self.done.done():
+                self.done.set_result(message)
+        elif msg_type and msg_type.endswith("_ERROR"):
+            fleet.errors[msg_type] = fleet.errors.get(msg_type, 0) + 1
+
+    async def answer(self, question):
+        args = self.fleet.args
+        await asyncio.sleep(random.uniform(*args.think))
+        answer = random.choice(question["options"]) if question.get("options") else random.choice(["yes", "42"])
+        try:
+            self.answered_at = time.perf_counter()
+            await self.send("ANSWER", {"answer": answer}, room_code=self.room.code)
+            if random.random() < args.chat:
+                await self.send("ROOM_CHAT", {"message": "good one"}, room_code=self.room.code)
+        except OSError:
+            self.answered_at = None
+
+class Fleet:
+    def __init__(self, args):
+        self.args = args
+        self.sent = 0
+        self.received = 0
+        self.finished = 0
+        self.failures = {}
+        self.errors = {}
+        self.first_question = []
+        self.answer_rtt = []
+        self.rss = []
+        self.connect_slots = asyncio.Semaphore(CONNECT_CONCURRENCY)
+
+    async def sample_rss(self, pid):
+        while True:
+            rss, _ = proc_status(pid)
+            if rss is not None:
+                self.rss.append(rss)
+            await asyncio.sleep(RSS_INTERVAL)
+
+    async def run(self, address, server_pid=None):
+        args = self.args
+        rooms = [FleetRoom(i, 0) for i in range(args.rooms)]
+        bots = []
+        for i in range(args.players):
+            room = rooms[i % args.rooms]
+            room.size += 1
+            bots.append(Bot(self, f"bot{i}", room, host=room.size == 1))
+        sampler = asyncio.create_task(self.sample_rss(server_pid)) if server_pid else None
+        cpu_before = proc_cpu_seconds(server_pid) if server_pid else None
+        start = time.perf_counter()
+        own_cpu = time.process_time()
+        await asyncio.gather(*(bot.run(address) for bot in bots))
+        elapsed = time.perf_counter() - start
+        own_cpu = time.process_time() - own_cpu
+        if sampler is not None:
+            sampler.cancel()
+        fan_out = [t - min(times) for room in rooms for times in room.receipts.values() for t in times]
+        cpu_after = proc_cpu_seconds(server_pid) if server_pid else None
+        return {
+            "players": args.players, "rooms": args.rooms, "questions": args.questions,
+            "finished": self.finished, "failures": self.failures, "errors": self.errors,
+            "elapsed_s": elapsed, "sent": self.sent, "received": self.received,
+            "sent_per_s": self.sent / elapsed, "received_per_s": self.received / elapsed,
+            "question_fan_out_ms": percentiles(fan_out),
+            "first_question_ms": percentiles(self.first_question),
+            "answer_rtt_ms": percentiles(self.answer_rtt),
+            "server_rss_kb": {"start": self.rss[0], "peak": max(self.rss), "end": self.rss[-1]} if self.rss else None,
+            "server_cpu_s": cpu_after - cpu_before if cpu_before is not None and cpu_after is not None else None,
+            "loadgen_cpu_s": own_cpu,
+        }
+
+def free_port():
+    with socket.socket() as s:
+        s.bind(("127.0.0.1", 0))
+        return s.getsockname()[1]
+
+def start_server(engine, port, directory, extra_args=()):
+    """Start server.py on port with every on-disk feature pointed at directory or off."""
+    proc = subprocess.Popen(
+        [sys.executable, "server.py", "--engine", engine, "--port", str(port), "--backlog", "1024",
+         "--journal-dir", "", "--answer-log", "", "--question-stats", "",
+         "--leaderboard-db", os.path.join(directory, "leaderboard.db"), *extra_args],
+        cwd=HERE, stdin=subprocess.DEVNULL, stdout=subprocess.DEVNULL, stderr=subprocess.DEVNULL
+    )
+    deadline = time.time() + 10
+    while time.time() < deadline:
+        try:
+            socket.create_connection(("127.0.0.1", port), timeout=0.5).close()
+            return proc
+        except OSError:
+            if proc.poll() is not None:
+                break
+            time.sleep(0.1)
+    proc.kill()
+    raise RuntimeError(f"{engine} server did not start on port {port}")
+
+def print_report(report, target):
+    print(f"\n=== LOAD TEST: {report['players']} bots in {report['rooms']} rooms, "
+          f"{report['questions']} questions each, against {target} ===")
+    print(f"Finished quizzes: {report['finished']}/{report['players']} bots in {report['elapsed_s']:.1f}s")
+    if report["failures"] or report["errors"]:
+        print(f"Failures: {report['failures'] or 'none'}  server errors: {report['errors'] or 'none'}")
+    print(f"Messages: sent {report['sent']:,} ({report['sent_per_s']:,.0f}/s), "
+          f"received {report['received']:,} ({report['received_per_s']:,.0f}/s)")
+    print(f"{'Latency (ms)':<22} {'count':>8} {'p50':>8} {'p90':>8} {'p99':>8} {'max':>8}")
+    for label, key in (("QUESTION fan-out", "question_fan_out_ms"), ("first QUESTION", "first_question_ms"),
+                       ("ANSWER round trip", "answer_rtt_ms")):
+        stats = report[key]
+        if stats is None:
+            print(f"{label:<22} {'-':>8}")
+        else:
+            print(f"{label:<22} {stats['count']:>8,} {stats['p50']:>8.1f} {stats['p90']:>8.1f} "
+                  f"{stats['p99']:>8.1f} {stats['max']:>8.1f}")
+    rss = report["server_rss_kb"]
+    if rss is not None:
+        print(f"Server RSS: {rss['start'] / 1024:.1f} MB at start, {rss['peak'] / 1024:.1f} MB peak, "
+              f"{rss['end'] / 1024:.1f} MB at end")
+    if report["server_cpu_s"] is not None:
+        print(f"Server CPU: {report['server_cpu_s']:.1f}s", end="  ")
+    # One process drives every bot; near 100% of elapsed, latencies include its own queueing
+    print(f"Load generator CPU: {report['loadgen_cpu_s']:.1f}s "
+          f"({report['loadgen_cpu_s'] / report['elapsed_s']:.0%} of one core)")
+
+def parse_args(argv=None):
+    parser = argparse.ArgumentParser(description="Simulate many quiz players against a server")
+    parser.add_argument("--players", type=int, default=1000)
+    parser.add_argument("--rooms", type=int, default=100)
+    parser.add_argument("--questions", type=int, default=5, help="Questions per room")
+    parser.add_argument("--topic", help="Topic for every room (default: a random one per room)")
+    parser.add_argument("--think", type=float, nargs=2, default=[0.5, 3.0], metavar=("MIN", "MAX"),
+                        help="Seconds a bot waits before answering")
+    parser.add_argument("--chat", type=float, default=0.1, help="Chance a bot chats per question")
+    parser.add_argument("--timeout", type=float, default=60.0, help="Seconds to wait for each setup step")
+    parser.add_argument("--engine", choices=["threaded", "asyncio"], default="asyncio",
+                        help="Engine of the server started for the test")
+    parser.add_argument("--server-arg", action="append", default=[],
+                        help="Extra argument for the started server (repeatable)")
+    parser.add_argument("--connect", metavar="HOST:PORT", help="Use a running server instead of starting one")
+    parser.add_argument("--server-pid", type=int, help="PID of the --connect server, for RSS and CPU")
+    parser.add_argument("--json", metavar="PATH", help="Also write the report as JSON")
+    parser.add_argument("--seed", type=int)
+    args = parser.parse_args(argv)
+    if args.rooms < 1 or args.players < args.rooms:
+        parser.error("need at least one room and one player per room")
+    return args
+
+def main(argv=None):
+    from aio_server import raise_fd_limit
+    args = parse_args(argv)
+    raise_fd_limit()
+    random.seed(args.seed)
+    proc = None
+    with tempfile.TemporaryDirectory(prefix="loadgen_") as directory:
+        if args.connect:
+            host, _, port = args.connect.rpartition(":")
+            address, pid, target = (host or "127.0.0.1", int(port)), args.server_pid, args.connect
+        else:
+            port = free_port()
+            proc = start_server(args.engine, port, directory, args.server_arg)
+            address, pid, target = ("127.0.0.1", port), proc.pid, f"{args.engine} server pid {proc.pid}"
+        try:
+            report = asyncio.run(Fleet(args).run(address, pid))
+        finally:
+            if proc is not None:
+                proc.terminate()
+                try:
+                    proc.wait(timeout=10)
+                except subprocess.TimeoutExpired:
+                    proc.kill()
+    print_report(report, target)
+    if args.json:
+        with open(args.json, "w", encoding="utf-8") as f:
+            json.dump(report, f, indent=2)
+    return 0 if report["finished"] == args.players else 1
+
+if __name__ == "__main__":
+    sys.exit(main())
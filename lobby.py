@@ -0,0 +1,89 @@
+import threading
+
+from protocol import encode_message
+
+class LobbySnapshot:
+    """Versioned, pre-serialized LOBBY_INFO plus LOBBY_DELTA pushes.
+
+    invalidate() is called when a room is created or deleted, changes
+    status or player count, or the topic list changes. Each call bumps
+    the lobby sequence number and pushes a compact LOBBY_DELTA (add,
+    update or remove one room) to everyone in the lobby; a topic change
+    pushes a full LOBBY_INFO instead. The LOBBY_INFO bytes carry the seq
+    they were built at, are rebuilt lazily on the next request and are
+    reused until the next change.
+
+    Deltas and snapshots are built and queued under one lock, so each
+    client sees them in seq order and a client that sees a gap can
+    resync with LOBBY_SYNC.
+    """
+    def __init__(self, server, broadcast_encoded):
+        self.server = server
+        self.broadcast_encoded = broadcast_encoded
+        self.lock = threading.Lock()
+        self.seq = 0
+        self.cached_seq = -1
+        self.cached_bytes = None
+        self.published = {}
+
+    def invalidate(self, room=None):
+        with self.lock:
+            if room is None:
+                self.seq += 1
+                self.push(self.info_bytes_locked(), "LOBBY_INFO")
+                return
+            delta = self.room_delta(room)
+            if delta is None:
+                return
+            self.seq += 1
+            delta["seq"] = self.seq
+            self.push(encode_message({"type": "LOBBY_DELTA", "user": "SERVER", "data": delta}), "LOBBY_DELTA")
+
+    def room_delta(self, room):
+        """Diff room against what lobby clients were last told; None if nothing visible changed."""
+        previous = self.published.get(room.code)
+        if self.server.rooms.get(room.code) is not room or room.status == "Closed":
+            if previous is None:
+                return None
+            del self.published[room.code]
+            return {"op": "remove", "room": {"code": room.code}}
+        entry = self.room_entry(room)
+        if entry == previous:
+            return None
+        self.published[room.code] = entry
+        return {"op": "add" if previous is None else "update", "room": entry}
+
+    def push(self, data, msg_type):
+        self.broadcast_encoded(list(self.server.lobby_members), data, msg_type)
+
+    def room_entry(self, room):
+        return {"code": room.code, "topic": room.topic, "players": len(room.clients), "status": room.status}
+
+    def build_message(self):
+        # published is left alone: a room whose change is still in flight may
+        # already show here, and its delta then repeats the same entry.
+        rooms = [self.room_entry(room) for room in list(self.server.rooms.values()) if room.status != "Closed"]
+        return {
+            "type": "LOBBY_INFO",
+            "user": "SERVER",
+            "data": {
+                "seq": self.seq,
+                "rooms": rooms,
+                "topics": list(self.server.quiz_data.keys())
+            }
+        }
+
+    def info_bytes_locked(self):
+        if self.cached_seq != self.seq:
+            self.cached_bytes = encode_message(self.build_message())
+            self.cached_seq = self.seq
+        return self.cached_bytes
+
+    def info_bytes(self):
+        with self.lock:
+            return self.info_bytes_locked()
+
+    def send_info(self, clients):
+        """Queue the current snapshot to clients, ordered against concurrent deltas."""
+        with self.lock:
+            self.broadcast_encoded(clients, self.info_bytes_locked(), "LOBBY_INFO")
@@ -0,0 +1,213 @@
+"""Counters, histograms and gauges in the Prometheus text format.
+
+Recording is meant for hot paths: Histogram.observe() appends the value to
+a deque (atomic, no lock) and every FOLD_EVERY values one caller sorts the
+batch into buckets under the histogram's lock, so the per-event cost is an
+append plus a share of one bisect. Counter.inc() is one locked addition. Everything that can be read on demand
+instead (clients connected, rooms by status, queue depths) is a gauge whose
+callback runs only when /metrics is scraped.
+
+A Registry renders its metrics as text for the HTTP endpoint started by
+serve(). Labelled metrics take one label; once a family has MAX_LABEL_VALUES
+children, new values are folded into "other" so a client sending made-up
+message types can't grow it without bound.
+"""
+import threading
+from bisect import bisect_left
+from collections import deque
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+LATENCY_BUCKETS = (0.00005, 0.0001, 0.00025, 0.0005, 0.001, 0.0025, 0.005, 0.01, 0.025, 0.05,
+                   0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0)
+MAX_LABEL_VALUES = 64
+OTHER = "other"
+CONTENT_TYPE = "text/plain; version=0.0.4; charset=utf-8"
+FOLD_EVERY = 256
+
+class Histogram:
+    __slots__ = ("bounds", "counts", "total", "pending", "lock")
+
+    def __init__(self, bounds=LATENCY_BUCKETS):
+        self.bounds = tuple(bounds)
+        self.counts = [0] * (len(self.bounds) + 1)
+        self.total = 0.0
+        self.pending = deque()
+        self.lock = threading.Lock()
+
+    def observe(self, value):
+        pending = self.pending
+        pending.append(value)
+        if len(pending) >= FOLD_EVERY:
+            self.fold()
+
+    def fold(self):
+        """Move pending values into the buckets. popleft() is atomic, so values
+        appended meanwhile are left for the next fold, never lost."""
+        with self.lock:
+            pending = self.pending
+            counts = self.counts
+            bounds = self.bounds
+            total = 0.0
+            for _ in range(len(pending)):
+                value = pending.popleft()
+                counts[bisect_left(bounds, value)] += 1
+                total += value
+            self.total += total
+
+    def snapshot(self):
+        """(cumulative count per bound plus +Inf, sum)."""
+        self.fold()
+        with self.lock:
+            counts = list(self.counts)
+            total = self.total
+        cumulative = []
+        running = 0
+        for count in counts:
+            running += count
+            cumulative.append(running)
+        return cumulative, total
+
+class Counter:
+    __slots__ = ("value", "lock")
+
+    def __init__(self):
+        self.value = 0
+        self.lock = threading.Lock()
+
+    def inc(self, amount=1):
+        # acquire/release rather than `with`: half the cost, and nothing in between can raise
+        lock = self.lock
+        lock.acquire()
+        self.value += amount
+        lock.release()
+
+class Family:
+    """A metric with one label: labels(value) returns that value's child."""
+    def __init__(self, name, help, kind, label, factory):
+        self.name = name
+        self.help = help
+        self.kind = kind
+        self.label = label
+        self.factory = factory
+        self.children = {}
+        self.lock = threading.Lock()
+
+    def labels(self, value):
+        child = self.children.get(value)
+        if child is None:
+            with self.lock:
+                if len(self.children) >= MAX_LABEL_VALUES and value not in self.children:
+                    value = OTHER
+                child = self.children.get(value)
+                if child is None:
+                    child = self.children[value] = self.factory()
+        return child
+
+def escape(value):
+    return str(value).replace("\\", "\\\\").replace('"', '\\"').replace("\n", "\\n")
+
+def format_bound(bound):
+    return repr(float(bound)) if bound != int(bound) else f"{bound:.1f}"
+
+class Gauge:
+    """Read when scraped: collect() returns a number, or {label value: number}.
+    kind="counter" exposes a running total kept elsewhere (e.g. summed over
+    connections) as a counter."""
+    def __init__(self, name, help, collect, label=None, kind="gauge"):
+        self.name = name
+        self.help = help
+        self.kind = kind
+        self.collect = collect
+        self.label = label
+
+class Registry:
+    def __init__(self):
+        self.metrics = []
+        self.lock = threading.Lock()
+
+    def register(self, metric):
+        with self.lock:
+            self.metrics.append(metric)
+        return metric
+
+    def histogram(self, name, help, label=None, bounds=LATENCY_BUCKETS):
+        if label is None:
+            metric = Family(name, help, "histogram", None, lambda: Histogram(bounds))
+            return self.register(metric).labels(None)
+        return self.register(Family(name, help, "histogram", label, lambda: Histogram(bounds)))
+
+    def counter(self, name, help, label=None):
+        family = self.register(Family(name, help, "counter", label, Counter))
+        return family if label is not None else family.labels(None)
+
+    def gauge(self, name, help, collect, label=None, kind="gauge"):
+        return self.register(Gauge(name, help, collect, label, kind))
+
+    def render(self):
+        lines = []
+        with self.lock:
+            metrics = list(self.metrics)
+        for metric in metrics:
+            lines.append(f"# HELP {metric.name} {metric.help}")
+            lines.append(f"# TYPE {metric.name} {metric.kind}")
+            if isinstance(metric, Gauge):
+                try:
+                    value = metric.collect()
+                except Exception as e:
+                    lines.append(f"# {metric.name} collection failed: {escape(e)}")
+                    continue
+                if isinstance(value, dict):
+                    for label_value, number in sorted(value.items()):
+                        lines.append(f'{metric.name}{{{metric.label}="{escape(label_value)}"}} {number}')
+                else:
+                    lines.append(f"{metric.name} {value}")
+                continue
+            with metric.lock:
+                children = sorted(metric.children.items(), key=lambda item: str(item[0]))
+            for label_value, child in children:
+                label = f'{metric.label}="{escape(label_value)}"' if metric.label else ""
+                if metric.kind == "counter":
+                    lines.append(f"{metric.name}{{{label}}} {child.value}" if label else f"{metric.name} {child.value}")
+                    continue
+                cumulative, total = child.snapshot()
+                prefix = label + "," if label else ""
+                for bound, count in zip(child.bounds, cumulative):
+                    lines.append(f'{metric.name}_bucket{{{prefix}le="{format_bound(bound)}"}} {count}')
+                lines.append(f'{metric.name}_bucket{{{prefix}le="+Inf"}} {cumulative[-1]}')
+                suffix = f"{{{label}}}" if label else ""
+                lines.append(f"{metric.name}_sum{suffix} {total}")
+                lines.append(f"{metric.name}_count{suffix} {cumulative[-1]}")
+        return "\n".join(lines) + "\n"
+
+class MetricsHandler(BaseHTTPRequestHandler):
+    def do_GET(self):
+        if self.path.split("?", 1)[0] not in ("/metrics", "/"):
+            self.send_error(404)
+            return
+        body = self.server.registry.render().encode("utf-8")
+        self.send_response(200)
+        self.send_header("Content-Type", CONTENT_TYPE)
+        self.send_header("Content-Length", str(len(body)))
+        self.end_headers()
+        self.wfile.write(body)
+
+    def log_message(self, format, *args):
+        pass
+
+class MetricsServer(ThreadingHTTPServer):
+    daemon_threads = True
+
+    def __init__(self, address, registry):
+        super().__init__(address, MetricsHandler)
+        self.registry = registry
+        self.thread = threading.Thread(target=self.serve_forever, name="metrics", daemon=True)
+
+    def close(self):
+        self.shutdown()
+        self.server_close()
+
+def serve(registry, host="127.0.0.1", port=9100):
+    """Serve registry at http://host:port/metrics from a background thread."""
+    server = MetricsServer((host, port), registry)
+    server.thread.start()
+    return server
@@ -0,0 +1,186 @@
+"""On-demand sampling profiler for a running server.
+
+start(seconds) launches one thread that, every interval, reads every other
+thread's current stack with sys._current_frames() and counts it. Nothing is
+installed while no profile is running (no tracing or setprofile hooks, no
+timer, no thread), so an idle profiler costs nothing, and a profile can be
+taken from a live server without restarting it.
+
+When the profile ends, two files are written to the profile directory:
+
+- profile-<time>.folded: collapsed stacks ("thread;outer;...;inner count"),
+  readable by flamegraph.pl, speedscope and most flame graph viewers
+- profile-<time>.pstats: the same samples as a marshal'd pstats table, so
+  `python -m pstats profile-<time>.pstats` can sort and browse them
+
+A sample whose innermost Python frame is a known blocking wait (a condition
+wait, selector poll, socket read, queue get...) counts as idle. The summary
+ranks functions over the busy samples only; the files keep every sample.
+"""
+import marshal
+import os
+import re
+import sys
+import threading
+import time
+from collections import Counter
+
+DEFAULT_PROFILE_DIR = "profiles"
+DEFAULT_INTERVAL = 0.005
+DEFAULT_DURATION = 30.0
+MAX_DURATION = 600.0
+TOP_FUNCTIONS = 15
+
+# Innermost Python frames that mean "blocked in C", by (file name, function)
+IDLE_LEAVES = {
+    ("threading.py", "wait"), ("threading.py", "_wait_for_tstate_lock"), ("selectors.py", "select"),
+    ("queue.py", "get"), ("thread.py", "_worker"), ("socketserver.py", "serve_forever"),
+    ("protocol.py", "recv"), ("socket.py", "accept"),
+    ("server.py", "command_input"), ("server.py", "monitor_display"), ("server.py", "admin_update_thread"),
+}
+
+def thread_group(name):
+    """'Thread-12 (handle_client)' -> 'handle_client', 'room-worker_3' -> 'room-worker'."""
+    match = re.match(r"Thread-\d+ \((.+)\)$", name)
+    if match:
+        return match.group(1)
+    return re.sub(r"[_-]\d+$", "", name)
+
+def code_key(code):
+    return (code.co_filename, code.co_firstlineno, code.co_name)
+
+def code_label(key):
+    filename, line, name = key
+    return f"{name} ({os.path.basename(filename)}:{line})"
+
+class SamplingProfiler:
+    def __init__(self, directory=DEFAULT_PROFILE_DIR, interval=DEFAULT_INTERVAL):
+        self.directory = directory
+        self.interval = interval
+        self.lock = threading.Lock()
+        self.thread = None
+        self.stop_event = None
+        self.started_at = None
+        self.duration = 0.0
+        self.last_result = None
+
+    @property
+    def running(self):
+        return self.thread is not None
+
+    def start(self, seconds=DEFAULT_DURATION, on_done=None):
+        """Profile for seconds (capped at MAX_DURATION), then call on_done(result)
+        from the profiler thread. Returns False if a profile is already running."""
+        with self.lock:
+            if self.thread is not None:
+                return False
+            self.duration = max(self.interval, min(float(seconds), MAX_DURATION))
+            self.stop_event = threading.Event()
+            self.started_at = time.time()
+            self.thread = threading.Thread(target=self.run, args=(self.duration, self.stop_event, on_done),
+                                           name="profiler", daemon=True)
+            self.thread.start()
+            return True
+
+    def stop(self):
+        """End the running profile early; its results are still written. Returns False if none is running."""
+        with self.lock:
+            if self.thread is None:
+                return False
+            self.stop_event.set()
+            return True
+
+    def run(self, seconds, stop_event, on_done):
+        own = threading.get_ident()
+        stacks = Counter()
+        groups = {}
+        rounds = 0
+        start = time.perf_counter()
+        deadline = start + seconds
+        while not stop_event.is_set() and time.perf_counter() < deadline:
+            frames = sys._current_frames()
+            if any(ident not in groups for ident in frames):
+                groups = {thread.ident: thread_group(thread.name) for thread in threading.enumerate()}
+            for ident, frame in frames.items():
+                if ident == own:
+                    continue
+                codes = []
+                while frame is not None:
+                    codes.append(frame.f_code)
+                    frame = frame.f_back
+                stacks[(groups.get(ident, "unknown"), tuple(codes))] += 1
+            del frames
+            rounds += 1
+            stop_event.wait(self.interval)
+        elapsed = time.perf_counter() - start
+        try:
+            result = self.write(stacks, rounds, elapsed)
+        except OSError as e:
+            result = {"error": f"Cannot write profile to {self.directory}: {e}"}
+        with self.lock:
+            self.thread = None
+            self.last_result = result
+        if on_done is not None:
+            on_done(result)
+
+    def write(self, stacks, rounds, elapsed):
+        os.makedirs(self.directory, exist_ok=True)
+        base = os.path.join(self.directory, time.strftime("profile-%Y%m%d-%H%M%S", time.localtime(self.started_at)))
+        period = elapsed / rounds if rounds else self.interval
+        self_samples = Counter()
+        total_samples = Counter()
+        edges = Counter()
+        busy_self = Counter()
+        busy_total = Counter()
+        busy = 0
+        with open(base + ".folded", "w", encoding="utf-8") as f:
+            for (group, codes), count in stacks.items():
+                keys = [code_key(code) for code in codes]
+                f.write(";".join([group] + [code_label(key) for key in reversed(keys)]) + f" {count}\n")
+                leaf = keys[0]
+                self_samples[leaf] += count
+                for key in set(keys):
+                    total_samples[key] += count
+                for callee, caller in set(zip(keys, keys[1:])):
+                    edges[callee, caller] += count
+                if (os.path.basename(leaf[0]), leaf[2]) not in IDLE_LEAVES:
+                    busy += count
+                    busy_self[leaf] += count
+                    for key in set(keys):
+                        busy_total[key] += count
+        # pstats wants {func: (primitive calls, calls, own time, cumulative time, {caller: (...)})};
+        # "calls" here are samples containing the function
+        callers = {}
+        for (callee, caller), count in edges.items():
+            callers.setdefault(callee, {})[caller] = (count, count, 0.0, count * period)
+        table = {key: (count, count, self_samples[key] * period, count * period, callers.get(key, {}))
+                 for key, count in total_samples.items()}
+        with open(base + ".pstats", "wb") as f:
+            marshal.dump(table, f)
+        samples = sum(stacks.values())
+        top = [{"function": code_label(key), "self": count, "total": busy_total[key],
+                "self_pct": count / busy * 100, "total_pct": busy_total[key] / busy * 100}
+               for key, count in busy_self.most_common(TOP_FUNCTIONS)] if busy else []
+        return {"folded": base + ".folded", "pstats": base + ".pstats", "seconds": round(elapsed, 3),
+                "rounds": rounds, "samples": samples, "busy": busy, "top": top}
+
+    def status(self):
+        with self.lock:
+            if self.thread is None:
+                return {"running": False}
+            return {"running": True, "elapsed": round(time.time() - self.started_at, 1), "seconds": self.duration}
+
+def format_summary(result):
+    """Console lines for a finished profile."""
+    if "error" in result:
+        return [f"✗ {result['error']}"]
+    lines = [f"Profile: {result['rounds']} rounds over {result['seconds']:.1f}s, {result['samples']} thread samples, "
+             f"{result['busy']} busy",
+             f"  ✓ {result['folded']}", f"  ✓ {result['pstats']}"]
+    if result["top"]:
+        lines.append(f"{'Self %':>7} {'Total %':>8}  Function (busy samples only)")
+        for row in result["top"]:
+            lines.append(f"{row['self_pct']:>6.1f}% {row['total_pct']:>7.1f}%  {row['function']}")
+    else:
+        lines.append("No busy samples: every thread was waiting")
+    return lines
@@ -0,0 +1,80 @@
+import json
+import mmap
+import threading
+from typing import List, Optional
+
+# Wire format: one JSON object per line, UTF-8 encoded, terminated by '\n'.
+
+DEFAULT_RECV_SIZE = 64 * 1024
+DEFAULT_MAX_FRAME_SIZE = 1024 * 1024
+
+class ProtocolError(ValueError):
+    """Raised when the peer sends an oversized or undecodable frame."""
+
+_local = threading.local()
+
+def receive_buffer(size):
+    """This thread's scratch buffer for recv_into. A thread blocks in one recv
+    at a time and feed() copies what it needs, so readers on a thread can
+    share it. Anonymous mmap pages stay unallocated until written, so an
+    idle connection's thread holds only the pages its reads have touched."""
+    chunk = getattr(_local, "chunk", None)
+    if chunk is None or len(chunk) < size:
+        chunk = _local.chunk = memoryview(mmap.mmap(-1, size))
+    return chunk
+
+def encode_message(message) -> bytes:
+    return (json.dumps(message) + '\n').encode('utf-8')
+
+class FrameReader:
+    """Incremental newline-delimited frame decoder for one connection.
+
+    Keeps a persistent bytearray between reads, resumes the newline scan
+    where the previous read stopped, and returns every complete frame in
+    a chunk. Only the complete-frame prefix is decoded, straight from a
+    memoryview of the buffer, and it is dropped once per chunk. recv()
+    reads into the calling thread's receive_buffer(); a reader that is only
+    fed (as in the asyncio engine) never allocates one.
+    """
+    def __init__(self, recv_size=DEFAULT_RECV_SIZE, max_frame_size=DEFAULT_MAX_FRAME_SIZE):
+        self.recv_size = recv_size
+        self.max_frame_size = max_frame_size
+        self.buffer = bytearray()
+        self.scanned = 0
+
+    def feed(self, data) -> List[str]:
+        buffer = self.buffer
+        buffer += data
+        end = buffer.rfind(b'\n', self.scanned)
+        if end < 0:
+            self.scanned = len(buffer)
+            if self.scanned > self.max_frame_size:
+                raise ProtocolError(f"frame exceeds {self.max_frame_size} bytes")
+            return []
+
+        # Decode every complete frame in one pass straight out of the buffer,
+        # then drop the consumed prefix; the partial tail stays for next time.
+        view = memoryview(buffer)
+        try:
+            text = str(view[:end], 'utf-8')
+        except UnicodeDecodeError as e:
+            raise ProtocolError(f"invalid UTF-8 in frame: {e}")
+        finally:
+            view.release()
+        del buffer[:end + 1]
+        self.scanned = len(buffer)
+        if self.scanned > self.max_frame_size:
+            raise ProtocolError(f"frame exceeds {self.max_frame_size} bytes")
+
+        frames = text.split('\n')
+        if len(text) > self.max_frame_size and max(map(len, frames)) > self.max_frame_size:
+            raise ProtocolError(f"frame exceeds {self.max_frame_size} bytes")
+        return [frame for frame in frames if frame and not frame.isspace()]
+
+    def recv(self, sock) -> Optional[List[str]]:
+        """Read once from a blocking socket. Returns None on EOF."""
+        chunk = receive_buffer(self.recv_size)
+        n = sock.recv_into(chunk, self.recv_size)
+        if not n:
+            return None
+        return self.feed(chunk[:n])
@@ -0,0 +1,287 @@
+import hashlib
+import json
+import os
+import random
+import threading
+import time
+import traceback
+from array import array
+from collections.abc import Sequence
+from types import MappingProxyType
+
+from compiled_bank import CompiledTopic
+from grading import AnswerKey
+
+DEFAULT_POLL_INTERVAL = 2.0
+
+DEFAULT_TOPICS = {
+    "Security": (
+        {"type": "mcq", "question": "What does SSL stand for?", "options": ["Secure Socket Layer", "System Security Layer", "Safe Socket Link", "Secure System Layer"], "answer": "Secure Socket Layer"},
+        {"type": "short", "question": "What port does SSH use by default?", "answer": "22"},
+        {"type": "mcq", "question": "Which encryption is symmetric?", "options": ["RSA", "AES", "DSA", "ECC"], "answer": "AES"}
+    )
+}
+
+def topic_for_file(name):
+    return name.replace('questions_', '').replace('.json', '').replace('.qbank', '').title()
+
+def normalize_tags(tags):
+    """Tags as every backend stores and matches them: stripped, lowercased,
+    blanks and repeats dropped. The SQLite store keeps a question's tags
+    comma-joined, so a tag containing "," is a ValueError."""
+    normalized = []
+    for tag in tags:
+        tag = str(tag).strip().lower()
+        if "," in tag:
+            raise ValueError(f"tag {tag!r} contains ','")
+        if tag and tag not in normalized:
+            normalized.append(tag)
+    return normalized
+
+def validate_questions(questions, name):
+    """Keep well-formed questions, normalize their tags and attach their
+    precomputed grader (see grading.py)."""
+    valid_questions = []
+    for i, q in enumerate(questions):
+        if 'type' in q and 'question' in q and 'answer' in q:
+            if 'tags' in q:
+                try:
+                    q['tags'] = normalize_tags(q['tags'])
+                except ValueError as e:
+                    print(f"  ✗ {name}: question {i+1} has an invalid {e}")
+                    continue
+            if q['type'] == 'mcq' and 'options' in q or q['type'] == 'short':
+                q['grader'] = AnswerKey.for_question(q)
+                valid_questions.append(q)
+            else:
+                print(f"  ✗ {name}: question {i+1} has invalid format")
+        else:
+            print(f"  ✗ {name}: question {i+1} missing required fields")
+    return tuple(valid_questions)
+
+class CachedFile:
+    __slots__ = ("stat_key", "digest", "topic", "questions")
+
+    def __init__(self, stat_key, digest, topic, questions):
+        self.stat_key = stat_key
+        self.digest = digest
+        self.topic = topic
+        self.questions = questions
+
+class QuestionView(Sequence):
+    """One room's questions as an array('I') of indices into the shared, immutable
+    topic; questions are looked up on access and never copied."""
+    def __init__(self, source, order):
+        self.source = source
+        self.order = order
+
+    def __len__(self):
+        return len(self.order)
+
+    def __getitem__(self, index):
+        return self.source[self.order[index]]
+
+def sample_indices(n, k, rng=random):
+    """k distinct indices from range(n) in random order, by partial Fisher-Yates.
+
+    Only the k positions touched are tracked (a sparse swap map), so this
+    costs O(k) time and memory however large n is.
+    """
+    k = min(k, n)
+    swaps = {}
+    order = array('I')
+    for i in range(k):
+        j = rng.randrange(i, n)
+        order.append(swaps.get(j, j))
+        swaps[j] = swaps.get(i, i)
+    return order
+
+def reservoir_indices(indices, k, rng=random):
+    """k indices drawn uniformly from an iterable of unknown length, in random order."""
+    reservoir = array('I')
+    for seen, index in enumerate(indices):
+        if seen < k:
+            reservoir.append(index)
+        else:
+            slot = rng.randrange(seen + 1)
+            if slot < k:
+                reservoir[slot] = index
+    rng.shuffle(reservoir)
+    return reservoir
+
+class BankSnapshot:
+    """Immutable view of every loaded topic. Rooms copy what they need, so
+    swapping in a newer snapshot never touches a running quiz."""
+    __slots__ = ("version", "topics")
+
+    def __init__(self, version, topics):
+        self.version = version
+        self.topics = MappingProxyType(topics)
+
+class QuestionBank:
+    """Parsed questions_*.json files, cached by (mtime, size) and content hash.
+
+    refresh() stats every question file and only re-reads files whose
+    mtime or size changed; a file that was touched but hashes the same is
+    not re-parsed. A compiled questions_*.qbank (see compiled_bank.py) is
+    memory-mapped instead of parsed and takes precedence over the JSON
+    file for the same topic unless the JSON is newer; while it does, the
+    JSON is neither parsed nor kept. If any topic changed, a new BankSnapshot is built and
+    published with a single reference assignment, then on_change(old, new)
+    is called. start_watcher() runs refresh() every poll_interval seconds
+    on a background thread.
+    """
+    def __init__(self, directory='.', poll_interval=DEFAULT_POLL_INTERVAL, on_change=None):
+        self.directory = directory
+        self.poll_interval = poll_interval
+        self.on_change = on_change
+        self.files = {}
+        self.failed = {}
+        self.refresh_lock = threading.Lock()
+        self.snapshot = BankSnapshot(0, {})
+        self.stop_event = threading.Event()
+        self.watcher = None
+        self.reloads = 0
+        self.reload_histogram = None  # metrics.Histogram of refresh() runs that published
+        self.parses = 0
+
+    def scan(self):
+        return sorted(f for f in os.listdir(self.directory)
+                      if f.startswith('questions_') and (f.endswith('.json') or f.endswith('.qbank')))
+
+    def load_file(self, name, stat_key, cached):
+        """Return a CachedFile for name, reusing cached if the content hash is unchanged."""
+        if name.endswith('.qbank'):
+            self.parses += 1
+            topic = CompiledTopic(os.path.join(self.directory, name))
+            print(f"  ✓ Mapped {len(topic)} questions for {topic_for_file(name)} from {name}")
+            return CachedFile(stat_key, None, topic_for_file(name), topic)
+        with open(os.path.join(self.directory, name), 'rb') as f:
+            raw = f.read()
+        digest = hashlib.sha1(raw).hexdigest()
+        if cached is not None and cached.digest == digest:
+            cached.stat_key = stat_key
+            return cached
+        self.parses += 1
+        topic = topic_for_file(name)
+        questions = validate_questions(json.loads(raw.decode('utf-8')), name)
+        if questions:
+            print(f"  ✓ Loaded {len(questions)} questions for {topic} from {name}")
+        else:
+            print(f"  ✗ No valid questions found in {name}")
+        return CachedFile(stat_key, digest, topic, questions)
+
+    def refresh(self):
+        """Pick up added, changed and removed files. Returns True if the snapshot changed."""
+        with self.refresh_lock:
+            start = time.perf_counter()
+            try:
+                names = self.scan()
+            except OSError as e:
+                print(f"  ✗ Cannot list question directory {self.directory}: {e}")
+                return False
+            files = {}
+            changed = set(self.files) - set(names)
+            # Compiled banks first, so a JSON file can be skipped when its .qbank is current
+            for name in sorted(names, key=lambda name: not name.endswith('.qbank')):
+                cached = self.files.get(name)
+                stat_key = None
+                try:
+                    st = os.stat(os.path.join(self.directory, name))
+                    stat_key = (st.st_mtime_ns, st.st_size)
+                    compiled = files.get(name[:-len('.json')] + '.qbank') if name.endswith('.json') else None
+                    if compiled is not None and compiled.stat_key[0] >= stat_key[0]:
+                        if cached is not None:
+                            changed.add(name)
+                        continue
+                    if cached is not None and cached.stat_key == stat_key or self.failed.get(name) == stat_key:
+                        if cached is not None:
+                            files[name] = cached
+                        continue
+                    entry = self.load_file(name, stat_key, cached)
+                except (OSError, ValueError, TypeError) as e:
+                    # Keep serving the last good copy (e.g. a file mid-save) and
+                    # don't retry until the file changes again
+                    print(f"  ✗ Error loading {name}: {e}")
+                    self.failed[name] = stat_key
+                    if cached is not None:
+                        files[name] = cached
+                    continue
+                self.failed.pop(name, None)
+                if entry is not cached:
+                    changed.add(name)
+                files[name] = entry
+            self.files = files
+            self.failed = {name: key for name, key in self.failed.items() if name in names}
+            if not changed and self.snapshot.version:
+                return False
+
+            topics = {}
+            sources = {}
+            for name, entry in sorted(files.items()):
+                if not entry.questions:
+                    continue
+                current = sources.get(entry.topic)
+                if current is not None:
+                    # Two files for one topic: the compiled one wins unless it is stale
+                    compiled, plain = (entry, current) if name.endswith('.qbank') else (current, entry)
+                    if plain.stat_key[0] > compiled.stat_key[0]:
+                        print(f"  ✗ Compiled bank for {entry.topic} is older than its JSON; using the JSON")
+                        entry = plain
+                    else:
+                        entry = compiled
+                sources[entry.topic] = entry
+                topics[entry.topic] = entry.questions
+            for topic, questions in DEFAULT_TOPICS.items():
+                topics.setdefault(topic, questions)
+            old = self.snapshot
+            self.snapshot = BankSnapshot(old.version + 1, topics)
+            self.reloads += 1
+            if self.reload_histogram is not None:
+                self.reload_histogram.observe(time.perf_counter() - start)
+            if self.on_change is not None:
+                self.on_change(old, self.snapshot)
+        return True
+
+    def watch(self):
+        while not self.stop_event.wait(self.poll_interval):
+            try:
+                self.refresh()
+            except Exception:
+                print("Question bank refresh failed:")
+                traceback.print_exc()
+
+    def start_watcher(self):
+        if self.poll_interval > 0 and self.watcher is None:
+            self.watcher = threading.Thread(target=self.watch, name="question-bank", daemon=True)
+            self.watcher.start()
+
+    def stop(self):
+        self.stop_event.set()
+
+    def sample(self, topic, count, difficulty=None, tags=(), rng=random):
+        """A view of up to count random questions of topic matching difficulty and all of tags.
+
+        Unfiltered picks are O(count); filtering scans the topic once but
+        keeps only count indices. A compiled topic is filtered from its level
+        table and tag index, so no question is decoded. JSON questions
+        without a difficulty count as "medium".
+        """
+        source = self.snapshot.topics[topic]
+        difficulty = (difficulty or "").strip().lower()
+        tags = normalize_tags(tags)
+        if difficulty or tags:
+            if isinstance(source, CompiledTopic):
+                matches = source.matching(difficulty, tags)
+            else:
+                wanted = set(tags)
+                matches = (i for i, q in enumerate(source)
+                           if (not difficulty or q.get("difficulty", "medium") == difficulty)
+                           and wanted.issubset(q.get("tags", ())))
+            order = reservoir_indices(matches, count, rng)
+        else:
+            order = sample_indices(len(source), count, rng)
+        return QuestionView(source, order)
+
+    def stats(self):
+        return {"version": self.snapshot.version, "files": len(self.files), "reloads": self.reloads, "parses": self.parses}
@@ -0,0 +1,277 @@
+"""SQLite question store: an optional backend in place of questions_*.json.
+
+Every question belongs to one topic and has a type, a difficulty and any
+number of tags, plus the aliases and tolerance its grader accepts. For random sampling each question is also listed in a
+few "pools" -- (topic, difficulty or '', tag or '') -- under a dense rank
+0..size-1, with the pool sizes kept in their own table. Sampling N
+questions from a pool is then N primary-key lookups on (pool, rank),
+whatever the size of the topic.
+
+Import existing JSON files with:
+    python question_store.py import quiz.db questions_*.json [--tags python,basics]
+"""
+import argparse
+import json
+import os
+import random
+import sqlite3
+import sys
+import threading
+import time
+import traceback
+from collections.abc import Sequence
+
+from compiled_bank import answer_key
+from question_bank import BankSnapshot, DEFAULT_POLL_INTERVAL, normalize_tags, topic_for_file, validate_questions
+
+SCHEMA = """
+CREATE TABLE IF NOT EXISTS questions (
+    id INTEGER PRIMARY KEY,
+    topic TEXT NOT NULL,
+    type TEXT NOT NULL,
+    question TEXT NOT NULL,
+    answer TEXT NOT NULL,
+    answer_key TEXT NOT NULL,
+    options TEXT,
+    difficulty TEXT NOT NULL DEFAULT 'medium',
+    tags TEXT NOT NULL DEFAULT '',
+    aliases TEXT,
+    tolerance REAL NOT NULL DEFAULT 0
+);
+CREATE TABLE IF NOT EXISTS pools (
+    topic TEXT NOT NULL,
+    difficulty TEXT NOT NULL,
+    tag TEXT NOT NULL,
+    size INTEGER NOT NULL,
+    PRIMARY KEY (topic, difficulty, tag)
+) WITHOUT ROWID;
+CREATE TABLE IF NOT EXISTS pool_members (
+    topic TEXT NOT NULL,
+    difficulty TEXT NOT NULL,
+    tag TEXT NOT NULL,
+    rank INTEGER NOT NULL,
+    question_id INTEGER NOT NULL,
+    PRIMARY KEY (topic, difficulty, tag, rank)
+) WITHOUT ROWID;
+"""
+
+DIFFICULTIES = ("easy", "medium", "hard")
+QUESTION_COLUMNS = "id, type, question, answer, answer_key, options, difficulty, tags, aliases, tolerance"
+# Columns added since the first release, with their definitions, for databases created before them
+ADDED_COLUMNS = {"aliases": "aliases TEXT", "tolerance": "tolerance REAL NOT NULL DEFAULT 0"}
+
+def row_to_question(row):
+    question = {"type": row[1], "question": row[2], "answer": row[3], "answer_key": row[4],
+                "difficulty": row[6], "tags": row[7].split(",") if row[7] else []}
+    if row[5] is not None:
+        question["options"] = json.loads(row[5])
+    if row[8] is not None:
+        question["aliases"] = json.loads(row[8])
+    if row[9]:
+        question["tolerance"] = row[9]
+    return question
+
+class StoredTopic(Sequence):
+    """Length and by-rank access to one topic; nothing is loaded up front."""
+    def __init__(self, store, topic, size):
+        self.store = store
+        self.topic = topic
+        self.size = size
+
+    def __len__(self):
+        return self.size
+
+    def __getitem__(self, index):
+        if index < 0:
+            index += self.size
+        if not 0 <= index < self.size:
+            raise IndexError("question index out of range")
+        return self.store.fetch_ranks(self.topic, "", "", [index])[0]
+
+class QuestionStore:
+    """Drop-in alternative to question_bank.QuestionBank backed by SQLite.
+
+    snapshot.topics maps topic -> StoredTopic. refresh() re-reads the pool
+    sizes and publishes a new snapshot when the database changed
+    (PRAGMA data_version), so an import into a running server's database
+    is picked up by the watcher. sample() returns N random questions
+    matching a difficulty and tags.
+    """
+    def __init__(self, path, poll_interval=DEFAULT_POLL_INTERVAL, on_change=None):
+        self.path = path
+        self.poll_interval = poll_interval
+        self.on_change = on_change
+        self.local = threading.local()
+        self.refresh_lock = threading.Lock()
+        self.snapshot = BankSnapshot(0, {})
+        self.data_version = None
+        self.stop_event = threading.Event()
+        self.watcher = None
+        self.reloads = 0
+        self.reload_histogram = None  # metrics.Histogram of refresh() runs that published
+        self.samples = 0
+        with self.connection() as db:
+            db.executescript(SCHEMA)
+            existing = {row[1] for row in db.execute("PRAGMA table_info(questions)")}
+            for column, definition in ADDED_COLUMNS.items():
+                if column not in existing:
+                    db.execute(f"ALTER TABLE questions ADD COLUMN {definition}")
+
+    def connection(self):
+        # sqlite3 connections must not be shared across threads; keep one per thread
+        db = getattr(self.local, "db", None)
+        if db is None:
+            db = sqlite3.connect(self.path)
+            self.local.db = db
+        return db
+
+    def refresh(self):
+        """Publish a new snapshot if the database changed. Returns True if it did."""
+        with self.refresh_lock:
+            start = time.perf_counter()
+            db = self.connection()
+            data_version = db.execute("PRAGMA data_version").fetchone()[0]
+            if self.snapshot.version and data_version == self.data_version:
+                return False
+            self.data_version = data_version
+            rows = db.execute("SELECT topic, size FROM pools WHERE difficulty = '' AND tag = '' "
+                              "ORDER BY topic").fetchall()
+            topics = {topic: StoredTopic(self, topic, size) for topic, size in rows if size}
+            old = self.snapshot
+            if old.version and [(t, len(q)) for t, q in old.topics.items()] == [(t, len(q)) for t, q in topics.items()]:
+                return False
+            self.snapshot = BankSnapshot(old.version + 1, topics)
+            self.reloads += 1
+            if self.reload_histogram is not None:
+                self.reload_histogram.observe(time.perf_counter() - start)
+            print(f"  ✓ Question store {self.path}: {sum(len(q) for q in topics.values())} questions "
+                  f"in {len(topics)} topics")
+            if self.on_change is not None:
+                self.on_change(old, self.snapshot)
+        return True
+
+    def pool_size(self, topic, difficulty, tag):
+        row = self.connection().execute("SELECT size FROM pools WHERE topic = ? AND difficulty = ? AND tag = ?",
+                                        (topic, difficulty, tag)).fetchone()
+        return row[0] if row else 0
+
+    def fetch_ranks(self, topic, difficulty, tag, ranks):
+        """Questions at the given ranks of one pool, in the order of ranks."""
+        db = self.connection()
+        placeholders = ",".join("?" * len(ranks))
+        rows = db.execute(
+            f"SELECT m.rank, {', '.join('q.' + c for c in QUESTION_COLUMNS.split(', '))} "
+            f"FROM pool_members m JOIN questions q ON q.id = m.question_id "
+            f"WHERE m.topic = ? AND m.difficulty = ? AND m.tag = ? AND m.rank IN ({placeholders})",
+            (topic, difficulty, tag, *ranks)).fetchall()
+        by_rank = {row[0]: row_to_question(row[1:]) for row in rows}
+        return [by_rank[rank] for rank in ranks if rank in by_rank]
+
+    def sample(self, topic, count, difficulty=None, tags=(), rng=random):
+        """Up to count random questions of topic with that difficulty and all of tags.
+
+        The pool of the first tag (or the whole topic) is sampled by rank;
+        any further tags are checked on the sampled rows, drawing more
+        ranks until count questions match or the pool is exhausted.
+        """
+        self.samples += 1
+        tags = normalize_tags(tags)
+        difficulty = (difficulty or "").strip().lower()
+        tag = tags[0] if tags else ""
+        size = self.pool_size(topic, difficulty, tag)
+        wanted = set(tags[1:])
+        if not wanted:
+            return self.fetch_ranks(topic, difficulty, tag, rng.sample(range(size), min(count, size)))
+        chosen = []
+        seen = set()
+        while len(chosen) < count and len(seen) < size:
+            batch = min(size - len(seen), 4 * (count - len(chosen)))
+            ranks = []
+            while len(ranks) < batch:
+                rank = rng.randrange(size)
+                if rank not in seen:
+                    seen.add(rank)
+                    ranks.append(rank)
+            for question in self.fetch_ranks(topic, difficulty, tag, ranks):
+                if wanted.issubset(question["tags"]):
+                    chosen.append(question)
+        return chosen[:count]
+
+    def import_questions(self, topic, questions, tags=(), difficulty="medium"):
+        """Append questions to topic; per-question "difficulty"/"tags" override the defaults.
+        Tags are normalized as sample() matches them (see normalize_tags)."""
+        db = self.connection()
+        tags = normalize_tags(tags)
+        with db:
+            sizes = dict(((d, t), s) for d, t, s in db.execute(
+                "SELECT difficulty, tag, size FROM pools WHERE topic = ?", (topic,)))
+            members = []
+            for q in questions:
+                q_difficulty = str(q.get("difficulty", difficulty)).strip().lower()
+                if q_difficulty not in DIFFICULTIES:
+                    raise ValueError(f"unknown difficulty {q_difficulty!r}; expected one of {DIFFICULTIES}")
+                q_tags = sorted(set(normalize_tags(q.get("tags", []))) | set(tags))
+                options = json.dumps(q["options"]) if q["type"] == "mcq" else None
+                aliases = json.dumps(q["aliases"]) if q.get("aliases") else None
+                cursor = db.execute(
+                    "INSERT INTO questions (topic, type, question, answer, answer_key, options, difficulty, tags, "
+                    "aliases, tolerance) "
+                    "VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?, ?)",
+                    (topic, q["type"], q["question"], q["answer"], answer_key(q), options, q_difficulty,
+                     ",".join(q_tags), aliases, float(q.get("tolerance") or 0.0)))
+                for pool in [("", "")] + [(q_difficulty, "")] + [(d, t) for t in q_tags for d in ("", q_difficulty)]:
+                    rank = sizes.get(pool, 0)
+                    sizes[pool] = rank + 1
+                    members.append((topic, pool[0], pool[1], rank, cursor.lastrowid))
+            db.executemany("INSERT INTO pool_members (topic, difficulty, tag, rank, question_id) "
+                           "VALUES (?, ?, ?, ?, ?)", members)
+            db.executemany("INSERT OR REPLACE INTO pools (topic, difficulty, tag, size) VALUES (?, ?, ?, ?)",
+                           [(topic, d, t, s) for (d, t), s in sizes.items()])
+        # data_version only moves for other connections' commits
+        self.data_version = None
+        return len(questions)
+
+    def watch(self):
+        while not self.stop_event.wait(self.poll_interval):
+            try:
+                self.refresh()
+            except Exception:
+                print("Question store refresh failed:")
+                traceback.print_exc()
+
+    def start_watcher(self):
+        if self.poll_interval > 0 and self.watcher is None:
+            self.watcher = threading.Thread(target=self.watch, name="question-store", daemon=True)
+            self.watcher.start()
+
+    def stop(self):
+        self.stop_event.set()
+
+    def stats(self):
+        return {"version": self.snapshot.version, "topics": len(self.snapshot.topics),
+                "reloads": self.reloads, "samples": self.samples}
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Manage the SQLite question store")
+    sub = parser.add_subparsers(dest="command", required=True)
+    p = sub.add_parser("import", help="Import questions_<topic>.json files")
+    p.add_argument("database")
+    p.add_argument("files", nargs="+")
+    p.add_argument("--topic", help="Topic name (default: derived from each file name)")
+    p.add_argument("--tags", default="", help="Comma-separated tags added to every imported question")
+    p.add_argument("--difficulty", choices=DIFFICULTIES, default="medium",
+                   help="Difficulty for questions that don't specify one")
+    args = parser.parse_args(argv)
+
+    store = QuestionStore(args.database)
+    tags = normalize_tags(args.tags.split(","))
+    for path in args.files:
+        with open(path, "r", encoding="utf-8") as f:
+            questions = validate_questions(json.load(f), path)
+        topic = args.topic or topic_for_file(os.path.basename(path))
+        count = store.import_questions(topic, questions, tags, args.difficulty)
+        print(f"  ✓ {path}: imported {count} questions into {topic}")
+    return 0
+
+if __name__ == "__main__":
+    sys.exit(main())
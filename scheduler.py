@@ -0,0 +1,143 @@
+import heapq
+import itertools
+import threading
+import time
+import traceback
+from concurrent.futures import ThreadPoolExecutor
+
+class TimerHandle:
+    __slots__ = ("deadline", "seq", "callback", "args", "cancelled", "fired", "scheduler")
+
+    def __init__(self, deadline, seq, callback, args, scheduler):
+        self.deadline = deadline
+        self.seq = seq
+        self.callback = callback
+        self.args = args
+        self.cancelled = False
+        self.fired = False
+        self.scheduler = scheduler
+
+    def __lt__(self, other):
+        return (self.deadline, self.seq) < (other.deadline, other.seq)
+
+    def cancel(self):
+        """O(1): the heap entry is dropped lazily when it reaches the top.
+        Returns False if the callback was already dispatched."""
+        return self.scheduler.cancel(self)
+
+class TimerScheduler:
+    """Single thread owning every room deadline, backed by a binary heap.
+
+    Due callbacks are dispatched to a bounded worker pool instead of one
+    threading.Timer thread each. Cancel is O(1) (lazy deletion); the heap
+    is compacted when cancelled entries outnumber live ones.
+    """
+    def __init__(self, workers=4, clock=time.monotonic):
+        self.clock = clock
+        self.heap = []
+        self.counter = itertools.count()
+        self.cond = threading.Condition()
+        self.pool = ThreadPoolExecutor(max_workers=workers, thread_name_prefix="timer-worker")
+        self.pending = 0
+        self.cancelled_in_heap = 0
+        self.fired = 0
+        self.lag_total = 0.0
+        self.lag_max = 0.0
+        self.last_lag = 0.0
+        self.lag_histogram = None  # metrics.Histogram, if the server exports metrics
+        self.running = True
+        self.thread = threading.Thread(target=self.run, name="timer-scheduler", daemon=True)
+        self.thread.start()
+
+    def call_later(self, delay, callback, *args):
+        with self.cond:
+            handle = TimerHandle(self.clock() + delay, next(self.counter), callback, args, self)
+            heapq.heappush(self.heap, handle)
+            self.pending += 1
+            if self.heap[0] is handle:
+                self.cond.notify()
+            return handle
+
+    def cancel(self, handle):
+        with self.cond:
+            if handle.cancelled or handle.fired:
+                return False
+            handle.cancelled = True
+            self.pending -= 1
+            self.cancelled_in_heap += 1
+            if self.cancelled_in_heap > 64 and self.cancelled_in_heap > len(self.heap) // 2:
+                self.heap = [h for h in self.heap if not h.cancelled]
+                heapq.heapify(self.heap)
+                self.cancelled_in_heap = 0
+            return True
+
+    def reschedule(self, handle, delay):
+        """Cancel handle (if still pending) and schedule its callback again."""
+        self.cancel(handle)
+        return self.call_later(delay, handle.callback, *handle.args)
+
+    def run(self):
+        while True:
+            with self.cond:
+                while self.running:
+                    while self.heap and self.heap[0].cancelled:
+                        heapq.heappop(self.heap)
+                        self.cancelled_in_heap -= 1
+                    if not self.heap:
+                        self.cond.wait()
+                        continue
+                    delay = self.heap[0].deadline - self.clock()
+                    if delay <= 0:
+                        break
+                    self.cond.wait(delay)
+                if not self.running:
+                    return
+                handle = heapq.heappop(self.heap)
+                handle.fired = True
+                self.pending -= 1
+            try:
+                self.pool.submit(self.dispatch, handle)
+            except RuntimeError:
+                return
+
+    def dispatch(self, handle):
+        lag = max(0.0, self.clock() - handle.deadline)
+        with self.cond:
+            self.fired += 1
+            self.lag_total += lag
+            self.last_lag = lag
+            if lag > self.lag_max:
+                self.lag_max = lag
+        if self.lag_histogram is not None:
+            self.lag_histogram.observe(lag)
+        try:
+            handle.callback(*handle.args)
+        except Exception:
+            print("Timer callback failed:")
+            traceback.print_exc()
+
+    def stats(self):
+        with self.cond:
+            return {
+                "pending": self.pending,
+                "fired": self.fired,
+                "lag_avg_ms": self.lag_total / self.fired * 1000 if self.fired else 0.0,
+                "lag_max_ms": self.lag_max * 1000,
+                "lag_last_ms": self.last_lag * 1000,
+            }
+
+    def shutdown(self):
+        with self.cond:
+            self.running = False
+            self.cond.notify()
+        self.pool.shutdown(wait=False)
+
+_default_scheduler = None
+_default_lock = threading.Lock()
+
+def get_default_scheduler():
+    global _default_scheduler
+    with _default_lock:
+        if _default_scheduler is None:
+            _default_scheduler = TimerScheduler()
+        return _default_scheduler
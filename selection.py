@@ -0,0 +1,208 @@
+"""Adaptive question selection from the statistics of past games.
+
+`python answer_log.py stats` writes question_stats.json with each question's
+difficulty (share of answers that were wrong) and discrimination (how well
+answering it correctly predicts doing well on the rest of the game). The
+first game drawn from a topic builds its TopicIndex, which is kept until the
+topic's questions or the stats change: questions are ranked by difficulty and
+cut into BANDS equal buckets, and each bucket keeps cumulative
+discrimination weights. A compiled bank supplies its stored question ids and
+labels, so building an index doesn't decode or hash its questions. A game of k questions then ramps
+from the easiest band to the hardest, drawing each question with one bisect
+into its band's weights, so a pick is O(k log n) however large the topic is.
+
+Questions with few recorded answers fall back towards a prior from their
+"difficulty" label, so new questions still get placed and get played. The
+questions any of a game's players saw in their last few games are skipped
+where the band has anything else to offer.
+"""
+import json
+import os
+import random
+import threading
+from array import array
+from bisect import bisect_right
+from collections import OrderedDict, deque
+from itertools import accumulate
+
+from answer_log import question_id, DEFAULT_STATS_PATH
+from compiled_bank import CompiledTopic
+from question_bank import QuestionView
+
+BANDS = 5
+LABEL_DIFFICULTY = {"easy": 0.3, "medium": 0.5, "hard": 0.7}
+# A question's measured difficulty counts fully once it has about this many answers
+PRIOR_ANSWERS = 20
+UNKNOWN_DISCRIMINATION = 0.2
+MIN_WEIGHT = 0.05
+ATTEMPTS = 8
+HISTORY = 200
+MAX_PLAYERS = 100000
+
+def question_keys(topic, source):
+    """(ids, difficulty labels) of source's questions, read from the id and
+    level tables when source is a bank compiled under the same topic name."""
+    if isinstance(source, CompiledTopic) and source.topic == topic:
+        return source.question_ids(), source.difficulties()
+    return (array("Q", (question_id(topic, q["question"]) for q in source)),
+            [q.get("difficulty") for q in source])
+
+class TopicIndex:
+    """One topic's questions cut into difficulty bands, each with cumulative
+    draw weights. Built once per (source, stats) pair and then read-only."""
+    def __init__(self, topic, source, stats, bands=BANDS):
+        self.source = source
+        self.stats = stats
+        self.ids, labels = question_keys(topic, source)
+        ranked = []
+        for i, (qid, label) in enumerate(zip(self.ids, labels)):
+            prior = LABEL_DIFFICULTY.get(label, LABEL_DIFFICULTY["medium"])
+            entry = stats.get(qid)
+            if entry is None:
+                difficulty, weight = prior, UNKNOWN_DISCRIMINATION
+            else:
+                answers = entry["answers"]
+                difficulty = (entry["difficulty"] * answers + prior * PRIOR_ANSWERS) / (answers + PRIOR_ANSWERS)
+                weight = entry.get("discrimination", UNKNOWN_DISCRIMINATION)
+            # Ties (e.g. a topic with no history) break by id, which is stable but not file order
+            ranked.append((difficulty, qid, i, max(MIN_WEIGHT, weight)))
+        ranked.sort()
+        n = len(ranked)
+        self.bands = []
+        self.weights = []
+        self.difficulty = []
+        for band in range(min(bands, n)):
+            rows = ranked[band * n // bands:(band + 1) * n // bands]
+            if rows:
+                self.bands.append(array("I", (row[2] for row in rows)))
+                self.weights.append(array("d", accumulate(row[3] for row in rows)))
+                self.difficulty.append(sum(row[0] for row in rows) / len(rows))
+
+    def __len__(self):
+        return len(self.ids)
+
+    def draw(self, band, rng):
+        weights = self.weights[band]
+        return self.bands[band][bisect_right(weights, rng.random() * weights[-1]) if len(weights) > 1 else 0]
+
+    def ramp(self, k):
+        """Band for each of k slots, easiest first."""
+        last = len(self.bands) - 1
+        if k == 1:
+            return [last // 2]
+        return [round(slot * last / (k - 1)) for slot in range(k)]
+
+class QuestionSelector:
+    """Builds balanced games from TopicIndex caches and remembers what each
+    player has recently seen. Safe to call from any thread."""
+    def __init__(self, path=DEFAULT_STATS_PATH, history=HISTORY):
+        self.path = path
+        self.history = history
+        self.lock = threading.Lock()
+        self.build_lock = threading.Lock()
+        self.question_stats = {}
+        self.indexes = {}
+        self.recent = OrderedDict()
+        self.picks = 0
+        self.repeats_avoided = 0
+        self.builds = 0
+        self.load_stats()
+
+    def load_stats(self):
+        """(Re)read the stats file; cached indexes are rebuilt on next use."""
+        stats = {}
+        if os.path.exists(self.path):
+            try:
+                with open(self.path, "r", encoding="utf-8") as f:
+                    stats = {int(qid, 16): entry for qid, entry in json.load(f)["questions"].items()}
+                print(f"  ✓ Question stats {self.path}: {len(stats)} questions")
+            except (OSError, ValueError, KeyError, TypeError) as e:
+                print(f"  ✗ Cannot read question stats {self.path}: {e}")
+                return False
+        with self.lock:
+            self.question_stats = stats
+            self.indexes = {}
+        return True
+
+    def index(self, topic, source):
+        """The cached TopicIndex for source, building it if source is new.
+        Only one thread builds; rooms opened meanwhile wait for its result."""
+        index = self.indexes.get(topic)
+        if index is None or index.source is not source or index.stats is not self.question_stats:
+            with self.build_lock:
+                stats = self.question_stats
+                index = self.indexes.get(topic)
+                if index is None or index.source is not source or index.stats is not stats:
+                    index = TopicIndex(topic, source, stats)
+                    with self.lock:
+                        self.indexes[topic] = index
+                        self.builds += 1
+        return index
+
+    def seen(self, nicknames):
+        """Ids of the questions any of nicknames played recently."""
+        with self.lock:
+            entries = [self.recent.get(nickname) for nickname in nicknames]
+            return frozenset().union(*(entry[1] for entry in entries if entry is not None))
+
+    def remember(self, nicknames, topic, questions):
+        """Record that nicknames played questions, forgetting all but each player's last history."""
+        ids = [question_id(topic, q["question"]) for q in questions]
+        with self.lock:
+            for nickname in nicknames:
+                entry = self.recent.pop(nickname, None)
+                if entry is None:
+                    entry = (deque(), set())
+                order, members = entry
+                for qid in ids:
+                    if qid not in members:
+                        order.append(qid)
+                        members.add(qid)
+                while len(order) > self.history:
+                    members.discard(order.popleft())
+                self.recent[nickname] = entry
+            while len(self.recent) > MAX_PLAYERS:
+                self.recent.popitem(last=False)
+
+    def select(self, topic, source, count, nicknames=(), rng=random):
+        """A view of up to count questions of topic, ramping easy to hard,
+        avoiding what any of nicknames saw recently where the band allows."""
+        index = self.index(topic, source)
+        count = min(count, len(index))
+        if not count:
+            return QuestionView(source, array("I"))
+        seen = self.seen(nicknames)
+        picked = set()
+        order = array("I")
+        for band in index.ramp(count):
+            choice = self.pick(index, band, picked, seen, rng)
+            if choice is None:
+                choice = self.pick(index, band, picked, frozenset(), rng)
+            if choice is None:
+                # Only when nearly the whole topic is already in this game
+                choice = next(i for i in range(len(index)) if i not in picked)
+            picked.add(choice)
+            order.append(choice)
+        self.picks += 1
+        return QuestionView(source, order)
+
+    def pick(self, index, band, picked, seen, rng):
+        """A weighted draw from band or, failing that, the nearest bands."""
+        bands = len(index.bands)
+        for distance in range(bands):
+            for nearby in ((band - distance, band + distance) if distance else (band,)):
+                if not 0 <= nearby < bands:
+                    continue
+                for _ in range(ATTEMPTS):
+                    choice = index.draw(nearby, rng)
+                    if choice in picked:
+                        continue
+                    if index.ids[choice] in seen:
+                        self.repeats_avoided += 1
+                        continue
+                    return choice
+        return None
+
+    def stats(self):
+        return {"questions": len(self.question_stats), "topics": len(self.indexes), "builds": self.builds,
+                "picks": self.picks, "repeats_avoided": self.repeats_avoided, "players": len(self.recent)}
@@ -6,34 +6,217 @@ import random
 import os
 import signal
 import sys
-from typing import Dict, List, Any, Optional
+from collections import deque
+from concurrent.futures import ThreadPoolExecutor
+from typing import Dict, Sequence, Any, Optional
+from protocol import FrameReader, ProtocolError, encode_message
+from scheduler import TimerScheduler, get_default_scheduler
+from actor import Actor
+from grading import AnswerKey
+from lobby import LobbySnapshot
+from leaderboard import Leaderboard
+from global_leaderboard import GlobalLeaderboard, DEFAULT_LEADERBOARD_DB
+from answer_log import AnswerLog, DEFAULT_ANSWER_LOG_DIR, DEFAULT_STATS_PATH
+from journal import Journal, DEFAULT_JOURNAL_DIR, DEFAULT_SNAPSHOT_EVERY, FSYNC_POLICIES, portable_question
+from admin_feed import AdminFeed, DEFAULT_ADMIN_RATE, DEFAULT_ADMIN_RESYNC
+from question_bank import QuestionBank, DEFAULT_POLL_INTERVAL, normalize_tags
+from selection import QuestionSelector
+from metrics import Family, Histogram, Registry, OTHER, serve as serve_metrics
+from profiler import SamplingProfiler, DEFAULT_PROFILE_DIR, DEFAULT_DURATION, format_summary
 
-class QuizRoom:
-    def __init__(self, code: str, topic: str, questions: List[Dict]):
+MAX_QUESTIONS_PER_ROOM = 100
+DEFAULT_QUESTIONS_PER_GAME = 10
+# Recovered rooms nobody rejoins within this many seconds are closed
+RECOVERY_TIMEOUT = 120.0
+DEFAULT_OUTBOUND_HIGH_WATER = 1024 * 1024
+MAX_IOVECS = 512
+
+class BroadcastStats:
+    """Per message type fan-out timings for broadcast(), also kept as a
+    histogram family for the metrics endpoint."""
+    def __init__(self):
+        self.lock = threading.Lock()
+        self.by_type = {}
+        self.histograms = Family("quiz_broadcast_seconds", "Time to serialize and queue one broadcast to a room",
+                                 "histogram", "type", Histogram)
+        
+    def record(self, msg_type, recipients, elapsed):
+        self.histograms.labels(msg_type if type(msg_type) is str else OTHER).observe(elapsed)
+        with self.lock:
+            entry = self.by_type.get(msg_type)
+            if entry is None:
+                entry = self.by_type[msg_type] = {"count": 0, "recipients": 0, "total": 0.0, "max": 0.0, "last": 0.0}
+            entry["count"] += 1
+            entry["recipients"] += recipients
+            entry["total"] += elapsed
+            entry["last"] = elapsed
+            if elapsed > entry["max"]:
+                entry["max"] = elapsed
+                
+    def snapshot(self):
+        with self.lock:
+            return {msg_type: dict(entry) for msg_type, entry in self.by_type.items()}
+
+broadcast_stats = BroadcastStats()
+
+def broadcast(clients, message, exclude=None):
+    """Serialize message once and hand the same bytes to every recipient."""
+    start = time.perf_counter()
+    data = encode_message(message)
+    return broadcast_encoded(clients, data, message.get("type"), exclude, start)
+    
+def broadcast_encoded(clients, data, msg_type, exclude=None, start=None):
+    """Send already-encoded bytes to every recipient (e.g. a cached snapshot)."""
+    if start is None:
+        start = time.perf_counter()
+    recipients = 0
+    for client in clients:
+        if client is not exclude:
+            client.send_bytes(data)
+            recipients += 1
+    elapsed = time.perf_counter() - start
+    broadcast_stats.record(msg_type, recipients, elapsed)
+    return elapsed
+
+class QuizRoom(Actor):
+    """A quiz room. All state changes run on the room's actor inbox (see
+    actor.Actor): callers and timers post() work instead of calling in.
+    Timers and answer timing both come from the scheduler and its clock, so
+    a virtual scheduler (see simulation.py) runs a whole game without waiting."""
+    QUESTION_TIMEOUT = 35.0
+    REVEAL_DELAY = 3.0
+    NEXT_DELAY = 3.0
+    RESUME_DELAY = 5.0
+    
+    def __init__(self, code: str, topic: str, questions: Sequence[Dict], scheduler=None, executor=None):
+        super().__init__(executor)
         self.code = code
         self.topic = topic
         self.questions = questions
-        self.clients = []
+        self.clients = {}  # insertion-ordered set: join order, O(1) removal
         self.status = "Waiting"
         self.current_question_index = 0
-        self.scores = {}
+        self.leaderboard = Leaderboard()
+        self.scores = self.leaderboard.scores  # read-only alias; update through the leaderboard
         self.question_start_time = None
         self.answers_received = {}
+        self.scheduler = scheduler or get_default_scheduler()
+        self.clock = self.scheduler.clock
+        self.question_timer = None
+        self.question_closed = True
+        self.current_question = None
+        self.answer_key = None
+        self.on_change = None
+        self.on_finish = None
+        # Called with the players' nicknames when the quiz starts; may return
+        # the questions to play instead of those the room was created with
+        self.choose_questions = None
+        self.journal = None
+        self.answer_log = None
+        self.recovered_scores = {}
+        self.recovered_answers = {}
+        self.paused = False
+        
+    def log(self, op, **fields):
+        """Append a state transition to the server's journal (see journal.py)."""
+        if self.journal is not None:
+            self.journal.append(op, self.code, **fields)
+            
+    def restore(self, state):
+        """Rebuild from a journal.recover() entry. Nobody is connected yet;
+        players rejoin under their old nickname and get their score back. A
+        quiz that was running is paused until the first of them returns, then
+        re-asks the current question RESUME_DELAY seconds later; whoever had
+        already answered it keeps that answer and can't score it again."""
+        self.status = state["status"]
+        self.current_question_index = state["index"]
+        self.recovered_scores = dict(state["scores"])
+        self.recovered_answers = dict(state.get("answered", {}))
+        self.paused = self.status == "In Progress"
+        
+    def can_rejoin(self, nickname):
+        return self.status == "In Progress" and nickname in self.recovered_scores
+        
+    def resume(self):
+        if self.status == "In Progress" and self.question_closed:
+            self.send_next_question()
+            for nickname, points in self.recovered_answers.items():
+                self.answers_received[nickname] = {"answer": None, "correct": points > 0, "points": points}
+            self.recovered_answers = {}
+            if self.status == "In Progress" and all(client.nickname in self.answers_received
+                                                    for client in self.clients):
+                if self.close_question(self.current_question_index):
+                    self.scheduler.call_later(self.REVEAL_DELAY, self.post, self.send_leaderboard_and_next)
+            
+    def changed(self):
+        """Notify the server that lobby-visible state (status, player count) changed."""
+        if self.on_change is not None:
+            self.on_change(self)
         
     def add_client(self, client):
-        self.clients.append(client)
-        self.scores[client.nickname] = 0
+        self.clients[client] = None
+        score = self.recovered_scores.pop(client.nickname, 0)
+        self.leaderboard.add(client.nickname, score)
+        self.log("join", player=client.nickname, score=score)
+        if self.paused:
+            self.paused = False
+            self.scheduler.call_later(self.RESUME_DELAY, self.post, self.resume)
+        self.changed()
         
     def remove_client(self, client):
         if client in self.clients:
-            self.clients.remove(client)
-        if client.nickname in self.scores:
-            del self.scores[client.nickname]
+            del self.clients[client]
+            self.log("leave", player=client.nickname)
+        self.leaderboard.remove(client.nickname)
+        self.changed()
             
+    def broadcast(self, message, exclude=None):
+        return broadcast(list(self.clients), message, exclude)
+        
+    def send_standings(self, msg_type, top_field="scores", **fields):
+        """Send every player the shared top-K plus their own rank and neighbours
+        (see leaderboard.Leaderboard) instead of the full standings. The
+        shared part is serialized once and each player's fields are spliced
+        onto it."""
+        start = time.perf_counter()
+        data = {top_field: self.leaderboard.top(), "player_count": len(self.leaderboard), **fields}
+        head = json.dumps({"type": msg_type, "room_code": self.code, "user": "SERVER", "data": data})[:-2]
+        views = self.leaderboard.personal_views()
+        clients = list(self.clients)
+        for client in clients:
+            view = views.get(client.nickname)
+            if view is None:
+                client.send_bytes((head + "}}\n").encode("utf-8"))
+            else:
+                client.send_bytes((head + ", " + json.dumps(view)[1:] + "}\n").encode("utf-8"))
+        broadcast_stats.record(msg_type, len(clients), time.perf_counter() - start)
+        
     def start_quiz(self):
+        if self.status != "Waiting" or not self.clients:
+            return False
+        questions = None
+        if self.choose_questions is not None:
+            questions = self.choose_questions([client.nickname for client in self.clients])
         self.status = "In Progress"
         self.current_question_index = 0
+        if questions:
+            self.questions = questions
+            self.log("start", questions=[portable_question(q) for q in questions])
+        else:
+            self.log("start")
+        self.changed()
         self.send_next_question()
+        return True
+        
+    def close(self):
+        self.status = "Closed"
+        self.on_change = None
+        self.on_finish = None
+        self.choose_questions = None
+        self.question_closed = True
+        if self.question_timer is not None:
+            self.question_timer.cancel()
+        self.clients.clear()
         
     def send_next_question(self):
         if self.current_question_index >= len(self.questions):
@@ -41,8 +224,12 @@ class QuizRoom:
             return
             
         question = self.questions[self.current_question_index]
-        self.question_start_time = time.time()
+        # Resolve and build the grader once per question, not per answer
+        self.current_question = question
+        self.answer_key = AnswerKey.for_question(question)
+        self.question_start_time = self.clock()
         self.answers_received = {}
+        self.question_closed = False
         
         message = {
             "type": "QUESTION",
@@ -58,20 +245,27 @@ class QuizRoom:
             }
         }
         
-        for client in self.clients:
-            client.send_message(message)
+        self.broadcast(message)
             
-        self.question_timer = threading.Timer(35.0, self.force_next_question)
-        self.question_timer.start()
+        self.question_timer = self.scheduler.call_later(
+            self.QUESTION_TIMEOUT, self.post, self.force_next_question, self.current_question_index)
+        
+    def close_question(self, question_index):
+        """Claim the transition out of a question; only the first caller wins."""
+        if self.question_closed or question_index != self.current_question_index:
+            return False
+        self.question_closed = True
+        if self.question_timer is not None:
+            self.question_timer.cancel()
+        return True
             
-    def force_next_question(self):
-        if hasattr(self, 'question_timer'):
-            try:
-                self.question_timer.cancel()
-            except:
-                pass
+    def force_next_question(self, question_index=None):
+        if question_index is None:
+            question_index = self.current_question_index
+        if not self.close_question(question_index):
+            return
                 
-        for client in self.clients:
+        for client in list(self.clients):
             if client.nickname not in self.answers_received:
                 self.answers_received[client.nickname] = {
                     "answer": "No Answer",
@@ -86,27 +280,25 @@ class QuizRoom:
                     "data": {
                         "correct": False,
                         "points": 0,
-                        "correct_answer": self.questions[self.current_question_index]["answer"]
+                        "correct_answer": self.current_question["answer"]
                     }
                 }
                 client.send_message(score_message)
+                if self.answer_log is not None:
+                    self.answer_log.record(self.code, self.topic, self.current_question, client.nickname, None,
+                                           False, self.clock() - self.question_start_time, 0, timed_out=True)
         
         self.send_leaderboard_and_next()
             
     def process_answer(self, client, answer):
-        if client.nickname in self.answers_received:
+        if self.status != "In Progress" or self.question_closed:
+            return
+        if client not in self.clients or client.nickname in self.answers_received:
             return
             
-        question = self.questions[self.current_question_index]
-        correct_answer = question["answer"]
-        
-        is_correct = False
-        if question["type"] == "mcq":
-            is_correct = answer.lower() == correct_answer.lower()
-        else:
-            is_correct = answer.lower().strip() == correct_answer.lower().strip()
+        is_correct = self.answer_key.grade(answer)
             
-        time_taken = time.time() - self.question_start_time
+        time_taken = self.clock() - self.question_start_time
         max_time = 30
         speed_bonus = max(0, (max_time - time_taken) / max_time * 500)
         
@@ -114,7 +306,11 @@ class QuizRoom:
         if is_correct:
             points = 1000 + int(speed_bonus)
             
-        self.scores[client.nickname] += points
+        self.leaderboard.add_points(client.nickname, points)
+        self.log("answer", player=client.nickname, points=points)
+        if self.answer_log is not None:
+            self.answer_log.record(self.code, self.topic, self.current_question, client.nickname, answer,
+                                   is_correct, time_taken, points)
         self.answers_received[client.nickname] = {
             "answer": answer,
             "correct": is_correct,
@@ -128,101 +324,261 @@ class QuizRoom:
             "data": {
                 "correct": is_correct,
                 "points": points,
-                "correct_answer": correct_answer
+                "correct_answer": self.current_question["answer"]
             }
         }
         client.send_message(score_message)
         
         if len(self.answers_received) >= len(self.clients):
-            if hasattr(self, 'question_timer'):
-                try:
-                    self.question_timer.cancel()
-                except:
-                    pass
-            threading.Timer(3.0, self.send_leaderboard_and_next).start()
+            if self.close_question(self.current_question_index):
+                self.scheduler.call_later(self.REVEAL_DELAY, self.post, self.send_leaderboard_and_next)
             
     def send_leaderboard_and_next(self):
-        sorted_scores = sorted(self.scores.items(), key=lambda x: x[1], reverse=True)
-        leaderboard_message = {
-            "type": "LEADERBOARD",
-            "room_code": self.code,
-            "user": "SERVER",
-            "data": {
-                "scores": sorted_scores,
-                "is_final": False
-            }
-        }
-        
-        for client in self.clients:
-            client.send_message(leaderboard_message)
+        if self.status != "In Progress":
+            return
+        self.send_standings("LEADERBOARD", is_final=False)
             
-        threading.Timer(3.0, self.next_question).start()
+        self.scheduler.call_later(self.NEXT_DELAY, self.post, self.next_question)
         
     def next_question(self):
+        if self.status != "In Progress":
+            return
         self.current_question_index += 1
+        self.log("question", index=self.current_question_index)
         self.send_next_question()
         
     def end_quiz(self):
         self.status = "Finished"
-        sorted_scores = sorted(self.scores.items(), key=lambda x: x[1], reverse=True)
-        
-        final_message = {
-            "type": "QUIZ_END",
-            "room_code": self.code,
-            "user": "SERVER",
-            "data": {
-                "final_scores": sorted_scores
-            }
-        }
-        
-        for client in self.clients:
-            client.send_message(final_message)
+        self.log("end")
+        self.changed()
+        self.send_standings("QUIZ_END", top_field="final_scores")
+        if self.on_finish is not None:
+            self.on_finish(self.code, self.topic, self.leaderboard.standings())
+
+def write_batch(sock, batch):
+    """Write a list of buffers, using scatter-gather sendmsg where available."""
+    if len(batch) == 1 or not hasattr(sock, 'sendmsg'):
+        sock.sendall(batch[0] if len(batch) == 1 else b"".join(batch))
+        return
+    for i in range(0, len(batch), MAX_IOVECS):
+        buffers = batch[i:i + MAX_IOVECS]
+        sent = sock.sendmsg(buffers)
+        total = sum(map(len, buffers))
+        if sent < total:
+            sock.sendall(b"".join(buffers)[sent:])
 
 class Client:
-    def __init__(self, socket, address):
+    def __init__(self, socket, address, high_water=DEFAULT_OUTBOUND_HIGH_WATER):
         self.socket = socket
         self.address = address
         self.nickname = None
         self.current_room = None
         self.is_admin = False
+        self.reader = FrameReader()
+        self.high_water = high_water
+        self.outbound = deque()
+        self.outbound_bytes = 0
+        self.outbound_cond = threading.Condition()
+        self.writer = None
+        self.closed = False
+        self.evicted = False
+        self.sent_messages = 0
+        self.sent_bytes = 0
         
     def send_message(self, message):
+        self.send_bytes(encode_message(message))
+        
+    def send_bytes(self, data):
+        """Queue data for the writer thread; never blocks on the socket."""
+        with self.outbound_cond:
+            if self.closed:
+                return
+            self.outbound.append(data)
+            self.outbound_bytes += len(data)
+            self.sent_messages += 1
+            self.sent_bytes += len(data)
+            over_limit = self.outbound_bytes > self.high_water
+            if not over_limit:
+                if self.writer is None:
+                    self.writer = threading.Thread(target=self.write_loop, daemon=True)
+                    self.writer.start()
+                self.outbound_cond.notify()
+        if over_limit:
+            self.evict()
+            
+    def queue_depth(self):
+        return len(self.outbound), self.outbound_bytes
+        
+    def write_loop(self):
+        while True:
+            with self.outbound_cond:
+                while not self.outbound and not self.closed:
+                    self.outbound_cond.wait()
+                if not self.outbound:
+                    break
+                batch = list(self.outbound)
+                self.outbound.clear()
+                self.outbound_bytes = 0
+            try:
+                write_batch(self.socket, batch)
+            except OSError:
+                self.abort()
+                break
+        self.shutdown_socket()
+        
+    def evict(self):
+        print(f"Evicting slow client {self.nickname or self.address}: "
+              f"outbound queue over {self.high_water} bytes")
+        self.evicted = True
+        self.abort()
+        
+    def close(self):
+        """Stop accepting messages; the writer flushes what is queued, then closes."""
+        with self.outbound_cond:
+            if self.closed:
+                return
+            self.closed = True
+            flushing = self.writer is not None and bool(self.outbound)
+            self.outbound_cond.notify()
+        if not flushing:
+            self.shutdown_socket()
+            
+    def abort(self):
+        """Drop queued messages and close immediately."""
+        with self.outbound_cond:
+            self.closed = True
+            self.outbound.clear()
+            self.outbound_bytes = 0
+            self.outbound_cond.notify()
+        self.shutdown_socket()
+        
+    def flush(self, timeout):
+        deadline = time.time() + timeout
+        while self.outbound and self.writer is not None and time.time() < deadline:
+            time.sleep(0.01)
+            
+    def shutdown_socket(self):
         try:
-            json_msg = json.dumps(message) + '\n'
-            self.socket.send(json_msg.encode('utf-8'))
+            self.socket.shutdown(socket.SHUT_RDWR)
+        except:
+            pass
+        try:
+            self.socket.close()
         except:
             pass
             
-    def receive_message(self):
+    def receive_messages(self):
+        """Block until at least one complete frame arrives. Returns None on EOF or protocol error."""
         try:
-            buffer = ""
             while True:
-                data = self.socket.recv(1024).decode('utf-8')
-                if not data:
-                    break
-                buffer += data
-                while '\n' in buffer:
-                    line, buffer = buffer.split('\n', 1)
-                    if line.strip():
-                        return json.loads(line.strip())
-        except:
+                frames = self.reader.recv(self.socket)
+                if frames is None:
+                    return None
+                if frames:
+                    return [json.loads(frame) for frame in frames]
+        except (OSError, ProtocolError, json.JSONDecodeError):
             return None
 
 class QuizServer:
-    def __init__(self, host='127.0.0.1', port=8888):
+    engine = "threaded"
+    
+    def __init__(self, host='127.0.0.1', port=8888, backlog=128,
+                 outbound_high_water=DEFAULT_OUTBOUND_HIGH_WATER, timer_workers=4, room_workers=4,
+                 admin_rate=DEFAULT_ADMIN_RATE, admin_resync=DEFAULT_ADMIN_RESYNC,
+                 bank_poll=DEFAULT_POLL_INTERVAL, question_db=None,
+                 questions_per_game=DEFAULT_QUESTIONS_PER_GAME, leaderboard_db=DEFAULT_LEADERBOARD_DB,
+                 journal_dir=DEFAULT_JOURNAL_DIR, journal_fsync="interval", snapshot_every=DEFAULT_SNAPSHOT_EVERY,
+                 answer_log_dir=DEFAULT_ANSWER_LOG_DIR, question_stats=DEFAULT_STATS_PATH, metrics_port=0,
+                 profile_dir=DEFAULT_PROFILE_DIR):
         self.host = host
         self.port = port
-        self.clients = []
+        self.backlog = backlog
+        self.outbound_high_water = outbound_high_water
+        self.questions_per_game = min(questions_per_game, MAX_QUESTIONS_PER_ROOM)
+        self.clients = set()
+        self.clients_by_nickname = {}
+        self.lobby_members = set()
+        self.nickname_lock = threading.Lock()
+        self.lobby = LobbySnapshot(self, broadcast_encoded)
+        self.scheduler = TimerScheduler(workers=timer_workers)
+        self.room_executor = ThreadPoolExecutor(max_workers=room_workers, thread_name_prefix="room-worker")
+        self.admin_feed = AdminFeed(self, admin_rate, admin_resync)
         self.rooms = {}
-        self.quiz_data = {}
+        self.global_leaderboard = GlobalLeaderboard(leaderboard_db)
+        self.answer_log = AnswerLog(answer_log_dir) if answer_log_dir else None
+        # The SQLite store samples from its own pools; adaptive selection needs whole topics in memory.
+        # Without a stats file rooms are drawn uniformly at random until 'reload' finds one.
+        self.question_stats_path = question_stats if not question_db else ""
+        self.selector = None
+        if self.question_stats_path and os.path.exists(self.question_stats_path):
+            self.selector = QuestionSelector(self.question_stats_path)
+        if question_db:
+            from question_store import QuestionStore
+            self.bank = QuestionStore(question_db, bank_poll, on_change=self.on_bank_change)
+        else:
+            self.bank = QuestionBank('.', bank_poll, on_change=self.on_bank_change)
         self.running = False
         self.server_socket = None
         self.admin_client = None
+        self.metrics_port = metrics_port
+        self.metrics_server = None
+        self.setup_metrics()
+        self.profiler = SamplingProfiler(profile_dir)
         self.load_quiz_data()
+        self.journal = Journal(journal_dir, journal_fsync, snapshot_every) if journal_dir else None
+        if self.journal is not None:
+            for state in self.journal.recover().values():
+                self.restore_room(state)
         
         signal.signal(signal.SIGINT, self.signal_handler)
         signal.signal(signal.SIGTERM, self.signal_handler)
         
+    def setup_metrics(self):
+        """Hot-path histograms and counters, plus gauges read only when /metrics is scraped."""
+        self.metrics = Registry()
+        self.retired_sent = [0, 0]  # messages, bytes sent to clients that have since disconnected
+        self.handler_seconds = self.metrics.register(Family(
+            "quiz_handler_seconds", "process_message time per client message type", "histogram", "type", Histogram))
+        self.metrics.register(broadcast_stats.histograms)
+        self.scheduler.lag_histogram = self.metrics.histogram(
+            "quiz_timer_lag_seconds", "Delay between a room timer's deadline and its callback starting")
+        self.bank.reload_histogram = self.metrics.histogram(
+            "quiz_bank_reload_seconds", "Time to rescan the question bank and publish a changed snapshot")
+        self.metrics.gauge("quiz_sent_messages_total", "Messages queued to clients",
+                           lambda: self.sent_totals()[0], kind="counter")
+        self.metrics.gauge("quiz_sent_bytes_total", "Bytes queued to clients",
+                           lambda: self.sent_totals()[1], kind="counter")
+        self.metrics.gauge("quiz_clients", "Connected clients", lambda: len(self.clients))
+        self.metrics.gauge("quiz_rooms", "Rooms by status", self.rooms_by_status, label="status")
+        self.metrics.gauge("quiz_pending_timers", "Room timers waiting to fire", lambda: self.scheduler.stats()["pending"])
+        self.metrics.gauge("quiz_bank_version", "Question bank snapshot version", lambda: self.bank.snapshot.version)
+        
+    def sent_totals(self):
+        messages, sent_bytes = self.retired_sent
+        for client in list(self.clients):
+            messages += client.sent_messages
+            sent_bytes += client.sent_bytes
+        return messages, sent_bytes
+        
+    def rooms_by_status(self):
+        counts = {"Waiting": 0, "In Progress": 0, "Finished": 0}
+        for room in list(self.rooms.values()):
+            counts[room.status] = counts.get(room.status, 0) + 1
+        return counts
+        
+    def start_profile(self, seconds=DEFAULT_DURATION):
+        if not self.profiler.start(seconds, on_done=self.profile_finished):
+            return False
+        print(f"Profiling all server threads for {self.profiler.duration:.0f}s ('profile stop' ends it early)")
+        return True
+        
+    def profile_finished(self, result):
+        for line in format_summary(result):
+            print(line)
+        admin = self.admin_client
+        if admin is not None:
+            admin.send_message({"type": "ADMIN_PROFILE_RESULT", "user": "SERVER", "data": result})
+        
     def check_quiz_files(self):
         print("\n" + "="*60)
         print("QUIZ FILES DIAGNOSTIC")
@@ -256,62 +612,69 @@ class QuizServer:
                     print(f"✗ {file} - ERROR: {e}")
         print("="*60)
         
+    @property
+    def quiz_data(self):
+        """Topic -> questions from the current question bank snapshot (read-only)."""
+        return self.bank.snapshot.topics
+        
     def load_quiz_data(self):
-        print("=" * 50)
-        print("LOADING QUIZ QUESTIONS")
-        print("=" * 50)
-        current_dir = os.getcwd()
-        print(f"Current directory: {current_dir}")
-        all_files = os.listdir('.')
-        print(f"All files in directory: {all_files}")
-        quiz_files = [f for f in all_files if f.startswith('questions_') and f.endswith('.json')]
-        print(f"Found quiz files: {quiz_files}")
-        self.quiz_data.clear()
-        for file in quiz_files:
-            topic = file.replace('questions_', '').replace('.json', '').title()
-            print(f"\nProcessing file: {file} -> Topic: {topic}")
-            try:
-                with open(file, 'r', encoding='utf-8') as f:
-                    questions = json.load(f)
-                    valid_questions = []
-                    for i, q in enumerate(questions):
-                        if 'type' in q and 'question' in q and 'answer' in q:
-                            if q['type'] == 'mcq' and 'options' in q:
-                                valid_questions.append(q)
-                            elif q['type'] == 'short':
-                                valid_questions.append(q)
-                            else:
-                                print(f"  ✗ Question {i+1} has invalid format")
-                        else:
-                            print(f"  ✗ Question {i+1} missing required fields")
-                    if valid_questions:
-                        self.quiz_data[topic] = valid_questions
-                        print(f"  ✓ Loaded {len(valid_questions)} questions for {topic}")
-                    else:
-                        print(f"  ✗ No valid questions found in {file}")
-            except FileNotFoundError:
-                print(f"  ✗ File not found: {file}")
-            except json.JSONDecodeError as e:
-                print(f"  ✗ Invalid JSON in {file}: {e}")
-            except Exception as e:
-                print(f"  ✗ Error loading {file}: {e}")
-        if 'Security' not in self.quiz_data:
-            self.quiz_data['Security'] = [
-                {"type": "mcq", "question": "What does SSL stand for?", "options": ["Secure Socket Layer", "System Security Layer", "Safe Socket Link", "Secure System Layer"], "answer": "Secure Socket Layer"},
-                {"type": "short", "question": "What port does SSH use by default?", "answer": "22"},
-                {"type": "mcq", "question": "Which encryption is symmetric?", "options": ["RSA", "AES", "DSA", "ECC"], "answer": "AES"}
-            ]
-            print("  ✓ Added default Security questions")
-        print("=" * 50)
-        print(f"FINAL RESULT: {len(self.quiz_data)} topics loaded")
-        print(f"Available topics: {list(self.quiz_data.keys())}")
-        print("=" * 50)
+        """Rescan questions_*.json now; only files that changed on disk are re-parsed."""
+        if not self.bank.refresh():
+            print("Question files unchanged")
         if not self.quiz_data:
             print("❌ WARNING: No quiz questions loaded!")
             print("   Make sure you have questions_*.json files in the same directory as the server.")
             print("   Current directory:", os.getcwd())
         return len(self.quiz_data)
+        
+    def on_bank_change(self, old, new):
+        print(f"Question bank v{new.version}: {len(new.topics)} topics {list(new.topics.keys())}")
+        if list(old.topics.keys()) != list(new.topics.keys()):
+            self.lobby.invalidate()
     
+    def restore_room(self, state):
+        room = QuizRoom(state["code"], state["topic"], state["questions"], self.scheduler, self.room_executor)
+        room.on_change = self.lobby.invalidate
+        room.on_finish = self.room_finished
+        room.journal = self.journal
+        room.answer_log = self.answer_log
+        room.restore(state)
+        self.rooms[room.code] = room
+        self.lobby.invalidate(room)
+        self.scheduler.call_later(RECOVERY_TIMEOUT, room.post, self.expire_recovered_room, room)
+        print(f"Room {room.code} restored: {room.topic}, {room.status}, question "
+              f"{room.current_question_index + 1}/{len(room.questions)}, {len(room.recovered_scores)} players to rejoin")
+        
+    def choose_room_questions(self, topic, count, nicknames):
+        """Re-pick an adaptive room's questions as its quiz starts, avoiding
+        what any of its players saw recently, not just its creator."""
+        source = self.quiz_data.get(topic)
+        selector = self.selector
+        if selector is None or source is None:
+            return None
+        return selector.select(topic, source, count, nicknames)
+        
+    def room_finished(self, code, topic, standings):
+        self.global_leaderboard.record(code, topic, standings)
+        room = self.rooms.get(code)
+        if self.selector is not None and room is not None:
+            self.selector.remember([name for name, _ in standings], topic, room.questions)
+        
+    def expire_recovered_room(self, room):
+        """Close a restored room that none of its players came back to."""
+        if room.clients or self.rooms.get(room.code) is not room:
+            return
+        if room.paused:
+            # Record the interrupted game with the scores it had
+            for nickname, score in room.recovered_scores.items():
+                room.leaderboard.add(nickname, score)
+            room.end_quiz()
+        del self.rooms[room.code]
+        room.log("delete")
+        room.close()
+        self.lobby.invalidate(room)
+        print(f"Room {room.code} closed: no players rejoined after restart")
+        
     def signal_handler(self, signum, frame):
         print(f"\nReceived signal {signum}. Shutting down server...")
         self.shutdown_server()
@@ -319,21 +682,33 @@ class QuizServer:
     def shutdown_server(self):
         print("=== SERVER SHUTDOWN INITIATED ===")
         self.running = False
+        if self.journal is not None:
+            # Before clients are dropped, so rooms are saved with their players
+            self.journal.close()
         shutdown_message = {
             "type": "SERVER_SHUTDOWN",
             "user": "SERVER",
             "data": {"message": "Server is shutting down"}
         }
         print(f"Notifying {len(self.clients)} clients...")
-        for client in self.clients[:]:
-            try:
-                client.send_message(shutdown_message)
-                client.socket.close()
-            except:
-                pass
+        clients = list(self.clients)
+        broadcast(clients, shutdown_message)
+        deadline = time.time() + 1.0
+        for client in clients:
+            client.flush(max(0, deadline - time.time()))
+            client.close()
         print("Clearing server data...")
         self.clients.clear()
+        self.clients_by_nickname.clear()
+        self.lobby_members.clear()
         self.rooms.clear()
+        self.scheduler.shutdown()
+        self.bank.stop()
+        self.global_leaderboard.stop()
+        if self.answer_log is not None:
+            self.answer_log.close()
+        if self.metrics_server is not None:
+            self.metrics_server.close()
         self.admin_client = None
         if self.server_socket:
             try:
@@ -351,39 +726,57 @@ class QuizServer:
             if code not in self.rooms:
                 return code
                 
+    def admin_client_row(self, client):
+        queued, queued_bytes = client.queue_depth()
+        return {
+            "nickname": client.nickname or "Not set",
+            "address": f"{client.address[0]}:{client.address[1]}",
+            "room": client.current_room or "Lobby",
+            "status": "In Room" if client.current_room else "In Lobby",
+            "queue": queued,
+            "queue_bytes": queued_bytes
+        }
+        
+    def admin_room_row(self, room):
+        return {
+            "code": room.code,
+            "topic": room.topic,
+            "players": len(room.clients),
+            "status": room.status,
+            "progress": f"{room.current_question_index + 1}/{len(room.questions)}" if room.status == "In Progress" else "N/A"
+        }
+        
     def send_admin_update(self):
-        if self.admin_client and self.admin_client in self.clients:
-            clients_data = [
-                {
-                    "nickname": client.nickname or "Not set",
-                    "address": f"{client.address[0]}:{client.address[1]}",
-                    "room": client.current_room or "Lobby",
-                    "status": "In Room" if client.current_room else "In Lobby"
-                }
-                for client in self.clients if not client.is_admin
-            ]
-            rooms_data = [
-                {
-                    "code": code,
-                    "topic": room.topic,
-                    "players": len(room.clients),
-                    "status": room.status,
-                    "progress": f"{room.current_question_index + 1}/{len(room.questions)}" if room.status == "In Progress" else "N/A"
-                }
-                for code, room in self.rooms.items()
-            ]
-            update_message = {
-                "type": "ADMIN_UPDATE",
-                "user": "SERVER",
-                "data": {
-                    "clients": clients_data,
-                    "rooms": rooms_data,
-                    "client_count": len(self.clients) - (1 if self.admin_client else 0),
-                    "room_count": len(self.rooms)
-                }
-            }
-            self.admin_client.send_message(update_message)
+        """Request an ADMIN_UPDATE; the admin feed coalesces requests and builds it off this path."""
+        self.admin_feed.request()
             
+    def print_banner(self):
+        print(f"Quiz Server started on {self.host}:{self.port} ({self.engine} engine)")
+        print(f"Available topics: {list(self.quiz_data.keys())}")
+        print("\n=== SERVER MONITOR ===")
+        print("Commands:")
+        print("  Ctrl+C or 'shutdown' - Gracefully stop the server")
+        print("  'rooms' - List active rooms")
+        print("  'clients' - List connected clients")
+        print()
+        
+    def start_background_threads(self):
+        threading.Thread(target=self.monitor_display, daemon=True).start()
+        threading.Thread(target=self.command_input, daemon=True).start()
+        threading.Thread(target=self.admin_update_thread, daemon=True).start()
+        self.bank.start_watcher()
+        self.global_leaderboard.start()
+        if self.journal is not None:
+            self.journal.start()
+        if self.answer_log is not None:
+            self.answer_log.start()
+        if self.metrics_port:
+            try:
+                self.metrics_server = serve_metrics(self.metrics, port=self.metrics_port)
+                print(f"Metrics on http://127.0.0.1:{self.metrics_port}/metrics")
+            except OSError as e:
+                print(f"✗ Cannot serve metrics on port {self.metrics_port}: {e}")
+        
     def start_server(self):
         self.running = True
         self.server_socket = socket.socket(socket.AF_INET, socket.SOCK_STREAM)
@@ -391,25 +784,15 @@ class QuizServer:
         
         try:
             self.server_socket.bind((self.host, self.port))
-            self.server_socket.listen(5)
-            print(f"Quiz Server started on {self.host}:{self.port}")
-            print(f"Available topics: {list(self.quiz_data.keys())}")
-            print("\n=== SERVER MONITOR ===")
-            print("Commands:")
-            print("  Ctrl+C or 'shutdown' - Gracefully stop the server")
-            print("  'rooms' - List active rooms")
-            print("  'clients' - List connected clients")
-            print()
-            
-            threading.Thread(target=self.monitor_display, daemon=True).start()
-            threading.Thread(target=self.command_input, daemon=True).start()
-            threading.Thread(target=self.admin_update_thread, daemon=True).start()
+            self.server_socket.listen(self.backlog)
+            self.print_banner()
+            self.start_background_threads()
             
             while self.running:
                 try:
                     client_socket, address = self.server_socket.accept()
-                    client = Client(client_socket, address)
-                    self.clients.append(client)
+                    client = Client(client_socket, address, self.outbound_high_water)
+                    self.clients.add(client)
                     threading.Thread(target=self.handle_client, args=(client,), daemon=True).start()
                 except socket.error:
                     break
@@ -442,7 +825,7 @@ class QuizServer:
                     print()
                 elif cmd == 'clients':
                     print(f"\n=== CONNECTED CLIENTS ({len(self.clients)}) ===")
-                    for i, client in enumerate(self.clients, 1):
+                    for i, client in enumerate(list(self.clients), 1):
                         room_info = f" (Room: {client.current_room})" if client.current_room else " (Lobby)"
                         print(f"{i}. {client.nickname or 'Anonymous'}{room_info}")
                     print()
@@ -451,14 +834,23 @@ class QuizServer:
                     print("  shutdown - Stop the server")
                     print("  rooms - List active rooms")  
                     print("  clients - List connected clients")
-                    print("  reload - Reload quiz question files")
+                    print("  reload - Reload quiz question files and question stats")
                     print("  topics - Show available topics")
                     print("  check - Run quiz files diagnostic")
+                    print("  broadcasts - Show broadcast fan-out timings")
+                    print("  timers - Show pending room timers and timer lag")
+                    print("  leaderboard - Show the all-time global leaderboard")
+                    print(f"  profile [seconds] - Sample all server threads (default {DEFAULT_DURATION:.0f}s)")
+                    print("  profile stop - End the running profile and write its results")
                     print("  help - Show this help")
                     print()
                 elif cmd == 'reload':
                     print("Reloading quiz question files...")
                     count = self.load_quiz_data()
+                    if self.selector is not None:
+                        self.selector.load_stats()
+                    elif self.question_stats_path and os.path.exists(self.question_stats_path):
+                        self.selector = QuestionSelector(self.question_stats_path)
                     print(f"Reload complete. {count} topics loaded.")
                 elif cmd == 'topics':
                     print(f"\nAvailable topics ({len(self.quiz_data)}):")
@@ -467,23 +859,72 @@ class QuizServer:
                     print()
                 elif cmd == 'check':
                     self.check_quiz_files()
+                elif cmd == 'broadcasts':
+                    self.print_broadcast_stats()
+                elif cmd == 'timers':
+                    stats = self.scheduler.stats()
+                    print(f"\nPending timers: {stats['pending']}  fired: {stats['fired']}")
+                    print(f"Timer lag: avg {stats['lag_avg_ms']:.2f} ms, max {stats['lag_max_ms']:.2f} ms, "
+                          f"last {stats['lag_last_ms']:.2f} ms\n")
+                elif cmd == 'profile stop':
+                    if not self.profiler.stop():
+                        print("No profile is running")
+                elif cmd == 'profile' or cmd.startswith('profile '):
+                    try:
+                        seconds = float(cmd[8:]) if cmd[8:].strip() else DEFAULT_DURATION
+                    except ValueError:
+                        print("Usage: profile [seconds] | profile stop")
+                        continue
+                    if not self.start_profile(seconds):
+                        status = self.profiler.status()
+                        print(f"A profile is already running ({status['elapsed']:.0f}s of {status['seconds']:.0f}s)")
+                elif cmd == 'leaderboard':
+                    stats = self.global_leaderboard.stats()
+                    print(f"\n=== GLOBAL LEADERBOARD ({stats['players']} players, {stats['games']} games "
+                          f"recorded this run, {stats['queued']} queued) ===")
+                    for i, (player, score) in enumerate(self.global_leaderboard.top(), 1):
+                        print(f"{i}. {player}: {score} points")
+                    print()
             except EOFError:
                 break
             except Exception:
                 pass
             
+    def print_broadcast_stats(self):
+        stats = broadcast_stats.snapshot()
+        print(f"\n=== BROADCAST FAN-OUT ({len(stats)} message types) ===")
+        print(f"{'Type':<16} {'Count':>8} {'Avg rcpt':>9} {'Avg ms':>8} {'Max ms':>8} {'Last ms':>8}")
+        for msg_type, entry in sorted(stats.items(), key=lambda x: str(x[0])):
+            count = entry["count"]
+            print(f"{str(msg_type):<16} {count:>8} {entry['recipients'] / count:>9.1f} "
+                  f"{entry['total'] / count * 1000:>8.3f} {entry['max'] * 1000:>8.3f} {entry['last'] * 1000:>8.3f}")
+        print()
+        
     def handle_client(self, client):
         try:
             while self.running:
-                message = client.receive_message()
-                if not message:
+                messages = client.receive_messages()
+                if not messages:
                     break
-                self.process_message(client, message)
+                for message in messages:
+                    self.dispatch_message(client, message)
         except Exception as e:
             print(f"Error handling client {client.address}: {e}")
         finally:
             self.disconnect_client(client)
             
+    def dispatch_message(self, client, message):
+        """process_message, timed into the per-type handler histogram."""
+        start = time.perf_counter()
+        self.process_message(client, message)
+        elapsed = time.perf_counter() - start
+        msg_type = message.get("type")
+        # Types come from clients: anything unhashable or unusual is labelled "other"
+        histogram = self.handler_seconds.children.get(msg_type) if type(msg_type) is str else None
+        if histogram is None:
+            histogram = self.handler_seconds.labels(msg_type if type(msg_type) is str else OTHER)
+        histogram.observe(elapsed)
+            
     def process_message(self, client, message):
         msg_type = message.get("type")
         user = message.get("user")
@@ -503,6 +944,7 @@ class QuizServer:
                 }
                 client.send_message(response)
                 print(f"Admin client connected: {client.address}")
+                self.admin_feed.reset()
                 self.send_admin_update()
             else:
                 response = {
@@ -516,7 +958,7 @@ class QuizServer:
         elif msg_type == "ADMIN_KICK":
             if client.is_admin:
                 nickname = data.get("nickname")
-                target_client = next((c for c in self.clients if c.nickname == nickname and not c.is_admin), None)
+                target_client = self.clients_by_nickname.get(nickname)
                 if target_client:
                     kick_message = {
                         "type": "KICKED",
@@ -544,24 +986,7 @@ class QuizServer:
                         "user": "ADMIN",
                         "data": {"message": f"Room {room_code} was deleted by server admin"}
                     }
-                    for c in room.clients[:]:
-                        c.send_message(delete_message)
-                        c.current_room = None
-                        room_list = [
-                            {"code": code, "topic": r.topic, "players": len(r.clients), "status": r.status}
-                            for code, r in self.rooms.items() if code != room_code
-                        ]
-                        lobby_response = {
-                            "type": "LOBBY_INFO",
-                            "user": "SERVER",
-                            "data": {
-                                "rooms": room_list,
-                                "topics": list(self.quiz_data.keys())
-                            }
-                        }
-                        c.send_message(lobby_response)
-                    del self.rooms[room_code]
-                    self.send_admin_update()
+                    room.post(self.delete_room, room, delete_message)
                 else:
                     client.send_message({
                         "type": "ADMIN_ERROR",
@@ -581,8 +1006,7 @@ class QuizServer:
                         "user": "ADMIN",
                         "data": {"message": message_text}
                     }
-                    for c in room.clients:
-                        c.send_message(broadcast_message)
+                    room.broadcast(broadcast_message)
                 else:
                     client.send_message({
                         "type": "ADMIN_ERROR",
@@ -594,7 +1018,7 @@ class QuizServer:
             if client.is_admin:
                 nickname = data.get("nickname")
                 message_text = data.get("message")
-                target_client = next((c for c in self.clients if c.nickname == nickname and not c.is_admin), None)
+                target_client = self.clients_by_nickname.get(nickname)
                 if target_client:
                     admin_message = {
                         "type": "ADMIN_MESSAGE",
@@ -614,51 +1038,90 @@ class QuizServer:
                 room_code = data.get("room_code")
                 room = self.rooms.get(room_code)
                 if room and room.status == "Waiting" and len(room.clients) > 0:
-                    room.start_quiz()
-                    self.send_admin_update()
+                    room.post(self.start_room_quiz, room)
                 else:
                     client.send_message({
                         "type": "ADMIN_ERROR",
                         "user": "SERVER",
                         "data": {"message": f"Cannot start quiz in room {room_code}: Invalid status or no players"}
                     })
+        elif msg_type == "ADMIN_PROFILE":
+            if client.is_admin:
+                if data.get("action") == "stop":
+                    error = None if self.profiler.stop() else "No profile is running"
+                else:
+                    try:
+                        seconds = float(data.get("seconds", DEFAULT_DURATION))
+                        error = None if self.start_profile(seconds) else "A profile is already running"
+                    except (TypeError, ValueError):
+                        error = f"Invalid profile duration: {data.get('seconds')}"
+                if error:
+                    client.send_message({
+                        "type": "ADMIN_ERROR",
+                        "user": "SERVER",
+                        "data": {"message": error}
+                    })
+                else:
+                    client.send_message({
+                        "type": "ADMIN_PROFILE_STATUS",
+                        "user": "SERVER",
+                        "data": self.profiler.status()
+                    })
              #CLIENT MESSAGES      
         elif msg_type == "JOIN_LOBBY" and not client.is_admin:
-            client.nickname = user
-            client.current_room = None
-            current_topics = len(self.quiz_data)
-            new_topics = self.load_quiz_data()
-            if new_topics != current_topics:
-                print(f"Quiz topics updated: {list(self.quiz_data.keys())}")
-            room_list = [
-                {"code": code, "topic": room.topic, "players": len(room.clients), "status": room.status}
-                for code, room in self.rooms.items()
-            ]
-            response = {
-                "type": "LOBBY_INFO",
-                "user": "SERVER",
-                "data": {
-                    "rooms": room_list,
-                    "topics": list(self.quiz_data.keys())
-                }
-            }
-            client.send_message(response)
+            if not self.enter_lobby(client, user):
+                return
+            self.send_lobby_info(client)
             self.send_admin_update()
             
+        elif msg_type == "LOBBY_SYNC" and not client.is_admin:
+            # Client saw a gap in LOBBY_DELTA seq numbers; resend the full snapshot
+            if client in self.lobby_members:
+                self.send_lobby_info(client)
+            
+        elif msg_type == "GLOBAL_LEADERBOARD" and not client.is_admin:
+            client.send_message({
+                "type": "GLOBAL_LEADERBOARD",
+                "user": "SERVER",
+                "data": self.global_leaderboard.view(client.nickname, data.get("topic"))
+            })
+            
         elif msg_type == "LOBBY_CHAT" and not client.is_admin:
-            for c in self.clients:
-                if c.current_room is None and c != client and not c.is_admin:
-                    c.send_message(message)
+            broadcast(list(self.lobby_members), message, exclude=client)
                     
         elif msg_type == "CREATE_ROOM" and not client.is_admin:
             topic = data.get("topic")
             if topic in self.quiz_data:
+                try:
+                    count, difficulty, tags = self.room_question_filter(topic, data)
+                    adaptive = self.selector is not None and not difficulty and not tags
+                    if adaptive:
+                        questions = self.selector.select(topic, self.quiz_data[topic], count, [client.nickname])
+                    else:
+                        questions = self.bank.sample(topic, count, difficulty, tags)
+                except (TypeError, ValueError) as e:
+                    client.send_message({"type": "CREATE_ERROR", "user": "SERVER", "data": {"message": str(e)}})
+                    return
+                if not questions:
+                    client.send_message({
+                        "type": "CREATE_ERROR",
+                        "user": "SERVER",
+                        "data": {"message": f"No questions in '{topic}' match the requested difficulty and tags"}
+                    })
+                    return
                 room_code = self.generate_room_code()
-                questions = self.quiz_data[topic].copy()
-                random.shuffle(questions)
-                room = QuizRoom(room_code, topic, questions)
+                room = QuizRoom(room_code, topic, questions, self.scheduler, self.room_executor)
+                room.on_change = self.lobby.invalidate
+                room.on_finish = self.room_finished
+                if adaptive:
+                    room.choose_questions = lambda nicknames, count=len(questions): \
+                        self.choose_room_questions(topic, count, nicknames)
+                room.journal = self.journal
+                room.answer_log = self.answer_log
+                room.log("room", topic=topic, questions=[portable_question(q) for q in questions])
                 self.rooms[room_code] = room
-                print(f"Room {room_code} created for topic {topic} by {client.nickname}")
+                self.lobby.invalidate(room)
+                print(f"Room {room_code} created for topic {topic} ({len(questions)} questions) by {client.nickname}")
                 response = {
                     "type": "ROOM_CREATED",
                     "user": "SERVER",
@@ -676,45 +1139,9 @@ class QuizServer:
                 
         elif msg_type == "JOIN_ROOM" and not client.is_admin:
             room_code = data.get("room_code")
-            if room_code in self.rooms:
-                room = self.rooms[room_code]
-                if room.status == "Waiting":
-                    if client.current_room:
-                        current_room = self.rooms.get(client.current_room)
-                        if current_room:
-                            current_room.remove_client(client)
-                    room.add_client(client)
-                    client.current_room = room_code
-                    room_info = {
-                        "type": "ROOM_JOINED",
-                        "room_code": room_code,
-                        "user": "SERVER",
-                        "data": {
-                            "topic": room.topic,
-                            "players": [c.nickname for c in room.clients],
-                            "status": room.status
-                        }
-                    }
-                    client.send_message(room_info)
-                    room_message = {
-                        "type": "USER_JOINED",
-                        "room_code": room_code,
-                        "user": "SERVER",
-                        "data": {
-                            "user": client.nickname,
-                            "players": [c.nickname for c in room.clients]
-                        }
-                    }
-                    for c in room.clients:
-                        c.send_message(room_message)
-                    self.send_admin_update()
-                else:
-                    error_msg = {
-                        "type": "JOIN_ERROR",
-                        "user": "SERVER",
-                        "data": {"message": f"Room {room_code} is {room.status.lower()} and cannot be joined"}
-                    }
-                    client.send_message(error_msg)
+            room = self.rooms.get(room_code)
+            if room:
+                room.post(self.join_room, room, client)
             else:
                 error_msg = {
                     "type": "JOIN_ERROR",
@@ -724,120 +1151,182 @@ class QuizServer:
                 client.send_message(error_msg)
                         
         elif msg_type == "START_QUIZ" and not client.is_admin:
-            if client.current_room:
-                room = self.rooms[client.current_room]
-                if room.status == "Waiting" and len(room.clients) > 0:
-                    room.start_quiz()
-                    self.send_admin_update()
+            room = self.rooms.get(client.current_room)
+            if room:
+                room.post(self.start_room_quiz, room)
                     
         elif msg_type == "ANSWER" and not client.is_admin:
-            if client.current_room:
-                room = self.rooms[client.current_room]
-                if room.status == "In Progress":
-                    answer = data.get("answer")
-                    room.process_answer(client, answer)
-                    self.send_admin_update()
+            room = self.rooms.get(client.current_room)
+            if room:
+                room.post(room.process_answer, client, data.get("answer"))
+                room.post(self.send_admin_update)
                     
         elif msg_type == "LEAVE_ROOM" and not client.is_admin:
             if client.current_room:
                 room = self.rooms.get(client.current_room)
-                if room:
-                    room.remove_client(client)
-                    if room.clients:
-                        leave_message = {
-                            "type": "USER_LEFT",
-                            "room_code": room.code,
-                            "user": "SERVER",
-                            "data": {
-                                "user": client.nickname,
-                                "players": [c.nickname for c in room.clients]
-                            }
-                        }
-                        for c in room.clients:
-                            c.send_message(leave_message)
-                    if len(room.clients) <= 1 and room.status != "In Progress":
-                        print(f"Room {room.code} deleted (insufficient players)")
-                        del self.rooms[room.code]
                 client.current_room = None
-                room_list = [
-                    {"code": code, "topic": room.topic, "players": len(room.clients), "status": room.status}
-                    for code, room in self.rooms.items()
-                ]
-                response = {
-                    "type": "LOBBY_INFO",
-                    "user": "SERVER",
-                    "data": {
-                        "rooms": room_list,
-                        "topics": list(self.quiz_data.keys())
-                    }
-                }
-                client.send_message(response)
-                self.send_admin_update()
+                self.lobby_members.add(client)
+                if room:
+                    room.post(self.leave_room, room, client, 1)
+                    room.post(self.send_lobby_info, client)
+                else:
+                    self.send_lobby_info(client)
                 
         elif msg_type == "DELETE_ROOM" and not client.is_admin:
-            if client.current_room:
-                room = self.rooms.get(client.current_room)
-                if room and room.status == "Waiting":
-                    delete_message = {
-                        "type": "ROOM_DELETED",
-                        "room_code": room.code,
-                        "user": "SERVER",
-                        "data": {"message": f"Room {room.code} was deleted by {client.nickname}"}
-                    }
-                    for c in room.clients[:]:
-                        c.send_message(delete_message)
-                        c.current_room = None
-                        room_list = [
-                            {"code": code, "topic": r.topic, "players": len(r.clients), "status": r.status}
-                            for code, r in self.rooms.items() if code != room.code
-                        ]
-                        lobby_response = {
-                            "type": "LOBBY_INFO",
-                            "user": "SERVER",
-                            "data": {
-                                "rooms": room_list,
-                                "topics": list(self.quiz_data.keys())
-                            }
-                        }
-                        c.send_message(lobby_response)
-                    del self.rooms[room.code]
-                    self.send_admin_update()
+            room = self.rooms.get(client.current_room)
+            if room and room.status == "Waiting":
+                delete_message = {
+                    "type": "ROOM_DELETED",
+                    "room_code": room.code,
+                    "user": "SERVER",
+                    "data": {"message": f"Room {room.code} was deleted by {client.nickname}"}
+                }
+                room.post(self.delete_room, room, delete_message)
                     
         elif msg_type == "ROOM_CHAT" and not client.is_admin:
-            if client.current_room:
-                room = self.rooms[client.current_room]
-                for c in room.clients:
-                    if c != client:
-                        c.send_message(message)
+            room = self.rooms.get(client.current_room)
+            if room:
+                room.broadcast(message, exclude=client)
+                
+    # The methods below run on a room's actor (posted via room.post), so
+    # they are serialized with answers and timer ticks for that room.
+    
+    def room_question_filter(self, topic, data):
+        """Validate CREATE_ROOM's optional count, difficulty and tags fields."""
+        count = data.get("count") or self.questions_per_game
+        if not isinstance(count, int) or not 1 <= count <= MAX_QUESTIONS_PER_ROOM:
+            raise ValueError(f"Question count must be between 1 and {MAX_QUESTIONS_PER_ROOM}")
+        difficulty = data.get("difficulty") or None
+        if difficulty not in (None, "easy", "medium", "hard"):
+            raise ValueError(f"Unknown difficulty '{difficulty}'")
+        tags = data.get("tags") or []
+        if isinstance(tags, str):
+            tags = tags.split(",")
+        return count, difficulty, normalize_tags(tags)
+        
+    def join_room(self, room, client):
+        if room.status != "Waiting" and not room.can_rejoin(client.nickname):
+            error_msg = {
+                "type": "JOIN_ERROR",
+                "user": "SERVER",
+                "data": {"message": f"Room {room.code} is {room.status.lower()} and cannot be joined"}
+            }
+            client.send_message(error_msg)
+            return
+        if client.current_room and client.current_room != room.code:
+            current_room = self.rooms.get(client.current_room)
+            if current_room:
+                current_room.post(current_room.remove_client, client)
+        room.add_client(client)
+        client.current_room = room.code
+        self.lobby_members.discard(client)
+        room_info = {
+            "type": "ROOM_JOINED",
+            "room_code": room.code,
+            "user": "SERVER",
+            "data": {
+                "topic": room.topic,
+                "players": [c.nickname for c in room.clients],
+                "status": room.status
+            }
+        }
+        client.send_message(room_info)
+        room_message = {
+            "type": "USER_JOINED",
+            "room_code": room.code,
+            "user": "SERVER",
+            "data": {
+                "user": client.nickname,
+                "players": [c.nickname for c in room.clients]
+            }
+        }
+        room.broadcast(room_message)
+        self.send_admin_update()
+        
+    def leave_room(self, room, client, delete_at_or_below):
+        room.remove_client(client)
+        if room.clients:
+            leave_message = {
+                "type": "USER_LEFT",
+                "room_code": room.code,
+                "user": "SERVER",
+                "data": {
+                    "user": client.nickname,
+                    "players": [c.nickname for c in room.clients]
+                }
+            }
+            room.broadcast(leave_message)
+        if len(room.clients) <= delete_at_or_below and room.status != "In Progress":
+            if self.rooms.pop(room.code, None) is not None:
+                room.log("delete")
+                self.lobby.invalidate(room)
+                print(f"Room {room.code} deleted (insufficient players)")
+        self.send_admin_update()
+        
+    def delete_room(self, room, delete_message):
+        if self.rooms.get(room.code) is not room:
+            return
+        members = list(room.clients)
+        broadcast(members, delete_message)
+        for c in members:
+            if c.current_room == room.code:
+                c.current_room = None
+                self.lobby_members.add(c)
+        del self.rooms[room.code]
+        room.log("delete")
+        room.close()
+        self.lobby.invalidate(room)
+        self.lobby.send_info(members)
+        self.send_admin_update()
+        
+    def start_room_quiz(self, room):
+        if room.start_quiz():
+            self.send_admin_update()
+            
+    def send_lobby_info(self, client):
+        self.lobby.send_info([client])
                         
+    def enter_lobby(self, client, nickname):
+        """Register client under nickname and place it in the lobby; nicknames are unique."""
+        with self.nickname_lock:
+            if not nickname or nickname in ("ADMIN", "SERVER"):
+                error = f"Nickname '{nickname}' is not allowed"
+            elif self.clients_by_nickname.get(nickname, client) is not client:
+                error = f"Nickname '{nickname}' is already in use"
+            else:
+                if client.nickname and self.clients_by_nickname.get(client.nickname) is client:
+                    del self.clients_by_nickname[client.nickname]
+                client.nickname = nickname
+                self.clients_by_nickname[nickname] = client
+                client.current_room = None
+                self.lobby_members.add(client)
+                return True
+        client.send_message({
+            "type": "LOBBY_ERROR",
+            "user": "SERVER",
+            "data": {"message": error}
+        })
+        return False
+        
     def disconnect_client(self, client):
+        self.lobby_members.discard(client)
+        with self.nickname_lock:
+            if client.nickname and self.clients_by_nickname.get(client.nickname) is client:
+                del self.clients_by_nickname[client.nickname]
         if client in self.clients:
-            self.clients.remove(client)
+            self.retired_sent[0] += client.sent_messages
+            self.retired_sent[1] += client.sent_bytes
+            self.clients.discard(client)
+            if client.evicted:
+                print(f"Client {client.nickname or client.address} disconnected as a slow consumer")
         if client.is_admin:
             self.admin_client = None
             print(f"Admin client disconnected: {client.address}")
         if client.current_room:
             room = self.rooms.get(client.current_room)
             if room:
-                room.remove_client(client)
-                if room.clients:
-                    disconnect_message = {
-                        "type": "USER_LEFT",
-                        "room_code": room.code,
-                        "user": "SERVER",
-                        "data": {
-                            "user": client.nickname,
-                            "players": [c.nickname for c in room.clients]
-                        }
-                    }
-                    for c in room.clients:
-                        c.send_message(disconnect_message)
-                if not room.clients and room.status != "In Progress":
-                    del self.rooms[room.code]
-        try:
-            client.socket.close()
-        except:
-            pass
+                room.post(self.leave_room, room, client, 0)
+        client.close()
         self.send_admin_update()
             
     def monitor_display(self):
@@ -846,6 +1335,8 @@ class QuizServer:
             print("=== QUIZ SERVER MONITOR ===")
             print(f"Connected Clients: {len(self.clients)}")
             print(f"Active Rooms: {len(self.rooms)}")
+            timer_stats = self.scheduler.stats()
+            print(f"Pending Timers: {timer_stats['pending']} (avg lag {timer_stats['lag_avg_ms']:.1f} ms)")
             print()
             if self.rooms:
                 print("ROOMS:")
@@ -859,6 +1350,65 @@ class QuizServer:
             print("Press Ctrl+C to shutdown server")
             time.sleep(2)
 
+def parse_args(argv=None):
+    import argparse
+    parser = argparse.ArgumentParser(description="Quiz game server")
+    parser.add_argument("--host", default="127.0.0.1")
+    parser.add_argument("--port", type=int, default=8888)
+    parser.add_argument("--engine", choices=["threaded", "asyncio"], default="threaded",
+                        help="threaded: one OS thread per connection; asyncio: single event loop")
+    parser.add_argument("--backlog", type=int, default=128)
+    parser.add_argument("--outbound-hwm", type=int, default=DEFAULT_OUTBOUND_HIGH_WATER,
+                        help="Disconnect clients with more than this many bytes queued for sending")
+    parser.add_argument("--timer-workers", type=int, default=4,
+                        help="Worker threads that run room timer callbacks")
+    parser.add_argument("--room-workers", type=int, default=4,
+                        help="Worker threads shared by all room actors")
+    parser.add_argument("--admin-rate", type=float, default=DEFAULT_ADMIN_RATE,
+                        help="Maximum ADMIN_UPDATE messages per second sent to the admin panel")
+    parser.add_argument("--admin-resync", type=float, default=DEFAULT_ADMIN_RESYNC,
+                        help="Seconds between full (non-delta) admin updates")
+    parser.add_argument("--bank-poll", type=float, default=DEFAULT_POLL_INTERVAL,
+                        help="Seconds between question file change checks (0 disables hot reload)")
+    parser.add_argument("--questions-per-game", type=int, default=DEFAULT_QUESTIONS_PER_GAME,
+                        help=f"Questions per room when CREATE_ROOM gives no count (max {MAX_QUESTIONS_PER_ROOM})")
+    parser.add_argument("--question-db", help="Serve questions from this SQLite store (see question_store.py) "
+                                              "instead of questions_*.json")
+    parser.add_argument("--leaderboard-db", default=DEFAULT_LEADERBOARD_DB,
+                        help="SQLite file for the global leaderboard (kept across restarts)")
+    parser.add_argument("--journal-dir", default=DEFAULT_JOURNAL_DIR,
+                        help="Directory for the room journal used to restore rooms after a restart "
+                             "('' disables journaling)")
+    parser.add_argument("--journal-fsync", choices=FSYNC_POLICIES, default="interval",
+                        help="When journal writes are fsynced: every batch, about once a second, or never")
+    parser.add_argument("--snapshot-every", type=int, default=DEFAULT_SNAPSHOT_EVERY,
+                        help="Journal records between snapshots (bounds replay time on restart)")
+    parser.add_argument("--answer-log", default=DEFAULT_ANSWER_LOG_DIR,
+                        help="Directory for the per-answer history read by 'python answer_log.py analyze' "
+                             "('' disables it)")
+    parser.add_argument("--question-stats", default=DEFAULT_STATS_PATH,
+                        help="Per-question stats from 'python answer_log.py stats' for adaptive selection "
+                             "(if the file is missing or '', questions are picked uniformly at random)")
+    parser.add_argument("--metrics-port", type=int, default=0,
+                        help="Serve Prometheus metrics on http://127.0.0.1:PORT/metrics (0 disables it)")
+    parser.add_argument("--profile-dir", default=DEFAULT_PROFILE_DIR,
+                        help="Directory for profiles taken with the 'profile' command or from the admin panel")
+    return parser.parse_args(argv)
+
+def create_server(args):
+    options = dict(backlog=args.backlog, outbound_high_water=args.outbound_hwm,
+                   timer_workers=args.timer_workers, room_workers=args.room_workers,
+                   admin_rate=args.admin_rate, admin_resync=args.admin_resync, bank_poll=args.bank_poll,
+                   question_db=args.question_db, questions_per_game=args.questions_per_game,
+                   leaderboard_db=args.leaderboard_db, journal_dir=args.journal_dir,
+                   journal_fsync=args.journal_fsync, snapshot_every=args.snapshot_every,
+                   answer_log_dir=args.answer_log, question_stats=args.question_stats,
+                   metrics_port=args.metrics_port, profile_dir=args.profile_dir)
+    if args.engine == "asyncio":
+        from aio_server import AsyncQuizServer
+        return AsyncQuizServer(args.host, args.port, **options)
+    return QuizServer(args.host, args.port, **options)
+
 if __name__ == "__main__":
-    server = QuizServer()
+    server = create_server(parse_args())
     server.start_server()
\ No newline at end of file
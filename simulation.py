@@ -0,0 +1,227 @@
+"""Virtual-time simulation: complete quizzes as fast as the CPU allows.
+
+QuizRoom takes its timers and its clock from its scheduler and runs its
+work on an executor (see actor.Actor). VirtualScheduler and InlineExecutor
+stand in for both: nothing happens on its own, and run() alternates between
+draining queued room work and jumping the clock to the next timer. A
+35-second question timeout or the 3-second reveal pause costs no wall time,
+while scoring, grading, leaderboards and broadcast serialization run exactly
+as they do in the server.
+
+Simulated players answer each QUESTION after a think time drawn from a
+log-normal around their own typical speed, and are right with a probability
+given by their skill, so speed bonuses and timeouts land as in real games.
+
+Usage: python simulation.py --games 2000 --players 20 --questions 20
+"""
+import argparse
+import heapq
+import itertools
+import random
+import sys
+import time
+from collections import deque
+
+from protocol import encode_message
+from scheduler import TimerHandle
+
+QUESTION_PREFIX = b'{"type": "QUESTION"'
+THINK_SIGMA = 0.5
+START_SPREAD = 60.0
+
+class VirtualScheduler:
+    """TimerScheduler's interface on a virtual clock that only moves when
+    step() fires the next timer."""
+    def __init__(self, start=0.0):
+        self.now = start
+        self.heap = []
+        self.counter = itertools.count()
+        self.pending = 0
+        self.fired = 0
+
+    def clock(self):
+        return self.now
+
+    def call_later(self, delay, callback, *args):
+        handle = TimerHandle(self.now + delay, next(self.counter), callback, args, self)
+        heapq.heappush(self.heap, handle)
+        self.pending += 1
+        return handle
+
+    def cancel(self, handle):
+        if handle.cancelled or handle.fired:
+            return False
+        handle.cancelled = True
+        self.pending -= 1
+        return True
+
+    def reschedule(self, handle, delay):
+        self.cancel(handle)
+        return self.call_later(delay, handle.callback, *handle.args)
+
+    def step(self):
+        """Advance to the next live timer and run it. Returns False when none are left."""
+        heap = self.heap
+        while heap and heap[0].cancelled:
+            heapq.heappop(heap)
+        if not heap:
+            return False
+        handle = heapq.heappop(heap)
+        handle.fired = True
+        self.pending -= 1
+        self.fired += 1
+        self.now = max(self.now, handle.deadline)
+        handle.callback(*handle.args)
+        return True
+
+    def stats(self):
+        return {"pending": self.pending, "fired": self.fired, "lag_avg_ms": 0.0, "lag_max_ms": 0.0,
+                "lag_last_ms": 0.0}
+
+    def shutdown(self):
+        self.heap.clear()
+        self.pending = 0
+
+class InlineExecutor:
+    """Executor whose submitted calls wait in a queue until run_pending()."""
+    def __init__(self):
+        self.queue = deque()
+
+    def submit(self, fn, *args):
+        self.queue.append((fn, args))
+
+    def run_pending(self):
+        queue = self.queue
+        while queue:
+            fn, args = queue.popleft()
+            fn(*args)
+
+    def shutdown(self, wait=True):
+        self.queue.clear()
+
+def run(scheduler, executor):
+    """Run until no work and no timers are left."""
+    while True:
+        executor.run_pending()
+        if not scheduler.step():
+            return
+
+class SimPlayer:
+    """Stands in for server.Client: counts what it is sent and, on each
+    QUESTION, has the simulation schedule its answer."""
+    __slots__ = ("nickname", "current_room", "is_admin", "skill", "speed", "simulation")
+
+    def __init__(self, nickname, skill, speed, simulation):
+        self.nickname = nickname
+        self.current_room = None
+        self.is_admin = False
+        self.skill = skill
+        self.speed = speed
+        self.simulation = simulation
+
+    def send_bytes(self, data):
+        simulation = self.simulation
+        simulation.messages += 1
+        simulation.bytes += len(data)
+        if data.startswith(QUESTION_PREFIX):
+            simulation.on_question(self)
+
+    def send_message(self, message):
+        self.send_bytes(encode_message(message))
+
+def synthetic_questions(count):
+    questions = []
+    for i in range(count):
+        if i % 2:
+            questions.append({"type": "mcq", "question": f"Simulated question {i}?",
+                              "options": [f"Option {j}" for j in range(4)], "answer": "Option 1"})
+        else:
+            questions.append({"type": "short", "question": f"Simulated question {i}?", "answer": f"Answer {i}"})
+    return questions
+
+class Simulation:
+    def __init__(self, games, players, questions, seed=None):
+        from server import QuizRoom
+        self.rng = random.Random(seed)
+        self.scheduler = VirtualScheduler()
+        self.executor = InlineExecutor()
+        self.rooms = {}
+        self.messages = 0
+        self.bytes = 0
+        self.answers = 0
+        self.correct = 0
+        self.timeouts = 0
+        self.finished = []
+        self.started_at = {}
+        self.game_time = 0.0
+        bank = synthetic_questions(max(questions * 5, 100))
+        for g in range(games):
+            code = f"{10000 + g}"
+            room = QuizRoom(code, "Simulated", self.rng.sample(bank, questions), self.scheduler, self.executor)
+            room.on_finish = self.on_finish
+            self.rooms[code] = room
+            for p in range(players):
+                # Skill: chance of a right answer; speed: this player's median think time in seconds
+                player = SimPlayer(f"g{g}p{p}", self.rng.betavariate(4, 2.5), self.rng.uniform(3, 12), self)
+                player.current_room = code
+                room.add_client(player)
+            delay = self.rng.uniform(0, START_SPREAD)
+            self.started_at[code] = delay
+            self.scheduler.call_later(delay, room.post, room.start_quiz)
+
+    def on_question(self, player):
+        room = self.rooms[player.current_room]
+        think = player.speed * self.rng.lognormvariate(0, THINK_SIGMA)
+        if think >= room.QUESTION_TIMEOUT:
+            self.timeouts += 1
+            return
+        correct = self.rng.random() < player.skill
+        answer = room.current_question["answer"] if correct else "no idea"
+        self.answers += 1
+        self.correct += correct
+        self.scheduler.call_later(think, room.post, room.process_answer, player, answer)
+
+    def on_finish(self, code, topic, standings):
+        self.finished.append(standings[0][1] if standings else 0)
+        self.game_time += self.scheduler.now - self.started_at[code]
+
+    def run(self):
+        start = time.perf_counter()
+        cpu = time.process_time()
+        run(self.scheduler, self.executor)
+        wall = time.perf_counter() - start
+        cpu = time.process_time() - cpu
+        points = sum(sum(room.leaderboard.scores.values()) for room in self.rooms.values())
+        return {"games": len(self.rooms), "finished": len(self.finished), "answers": self.answers,
+                "correct": self.correct, "timeouts": self.timeouts, "messages": self.messages,
+                "bytes": self.bytes, "points": points, "virtual_s": self.scheduler.now,
+                "game_s": self.game_time, "wall_s": wall, "cpu_s": cpu,
+                "mean_winning_score": sum(self.finished) / len(self.finished) if self.finished else 0}
+
+def print_report(result, players, questions):
+    wall = result["wall_s"]
+    print(f"\n=== SIMULATION: {result['games']} games x {players} players x {questions} questions ===")
+    print(f"Finished games: {result['finished']}/{result['games']}")
+    print(f"Virtual clock: {result['virtual_s']:,.0f}s, {result['game_s'] / 3600:,.1f}h of games in total; "
+          f"wall time {wall:.2f}s ({result['game_s'] / wall:,.0f} game-seconds per second)")
+    print(f"Answers: {result['answers']:,} graded ({result['answers'] / wall:,.0f}/s), "
+          f"{result['correct'] / max(1, result['answers']):.0%} correct, {result['timeouts']:,} timeouts")
+    print(f"Messages: {result['messages']:,} ({result['messages'] / wall:,.0f}/s, "
+          f"{result['bytes'] / wall / 1e6:.1f} MB/s serialized)")
+    print(f"Points per correct answer: {result['points'] / max(1, result['correct']):.0f} "
+          f"(1000 + speed bonus up to 500); mean winning score {result['mean_winning_score']:,.0f}")
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Run complete quizzes on a virtual clock")
+    parser.add_argument("--games", type=int, default=1000)
+    parser.add_argument("--players", type=int, default=20, help="Players per game")
+    parser.add_argument("--questions", type=int, default=20, help="Questions per game")
+    parser.add_argument("--seed", type=int, default=1)
+    args = parser.parse_args(argv)
+    simulation = Simulation(args.games, args.players, args.questions, args.seed)
+    result = simulation.run()
+    print_report(result, args.players, args.questions)
+    return 0 if result["finished"] == result["games"] else 1
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,124 @@
+import json
+import os
+import random
+
+import pytest
+
+from answer_log import question_id
+from compiled_bank import CompiledTopic, answer_key, compile_questions, compiled_path
+from grading import AnswerKey
+from question_bank import QuestionBank
+
+QUESTIONS = [
+    {"type": "mcq", "question": "Which encryption is symmetric?", "options": ["RSA", "AES", "DSA", "ECC"],
+     "answer": "AES", "difficulty": "easy", "tags": ["crypto", "basics"]},
+    {"type": "short", "question": "What does TLS stand for?", "answer": "Transport Layer Security",
+     "aliases": ["TLS", "Transport Layer Sec"], "difficulty": "hard", "tags": ["protocols"]},
+    {"type": "short", "question": "Boiling point of water in Fahrenheit?", "answer": "212", "tolerance": 0.5,
+     "difficulty": "medium"},
+    {"type": "short", "question": "Café in Ünicode?", "answer": "Café"},
+]
+
+def test_round_trip_keeps_every_field(tmp_path):
+    path = str(tmp_path / "questions_security.qbank")
+    assert compile_questions([dict(q) for q in QUESTIONS], path) == len(QUESTIONS)
+    topic = CompiledTopic(path)
+    assert topic.topic == "Security"
+    assert len(topic) == len(QUESTIONS)
+    for original, decoded in zip(QUESTIONS, topic):
+        assert decoded.pop("answer_key") == answer_key(original)
+        assert decoded == original
+    assert list(topic.question_ids()) == [question_id("Security", q["question"]) for q in QUESTIONS]
+    assert topic.difficulties() == [q.get("difficulty") for q in QUESTIONS]
+    assert topic[-1] == topic[3]
+    assert topic[1:3] == [topic[1], topic[2]]
+    with pytest.raises(IndexError):
+        topic[len(QUESTIONS)]
+
+def test_compiled_graders_accept_aliases_and_tolerance(tmp_path):
+    path = str(tmp_path / "questions_security.qbank")
+    compile_questions([dict(q) for q in QUESTIONS], path)
+    topic = CompiledTopic(path)
+    assert AnswerKey.for_question(topic[1]).grade("tls")
+    assert AnswerKey.for_question(topic[2]).grade("212.4")
+    assert not AnswerKey.for_question(topic[2]).grade("213")
+
+def compiled_beside_json(directory, json_age=10):
+    """questions_security.json plus its .qbank, the JSON json_age seconds older."""
+    json_path = directory / "questions_security.json"
+    json_path.write_text(json.dumps(QUESTIONS), encoding="utf-8")
+    qbank_path = compiled_path(str(json_path))
+    compile_questions([dict(q) for q in QUESTIONS], qbank_path)
+    mtime = os.stat(qbank_path).st_mtime
+    os.utime(json_path, (mtime - json_age, mtime - json_age))
+    return json_path, qbank_path
+
+def test_current_qbank_means_the_json_is_not_parsed(tmp_path):
+    json_path, _ = compiled_beside_json(tmp_path)
+    bank = QuestionBank(str(tmp_path), poll_interval=0)
+    bank.refresh()
+    assert isinstance(bank.snapshot.topics["Security"], CompiledTopic)
+    assert bank.parses == 1
+    assert list(bank.files) == ["questions_security.qbank"]
+    # Editing the JSON makes it newer than the compiled copy, which is then stale
+    mtime = os.stat(json_path).st_mtime + 20
+    os.utime(json_path, (mtime, mtime))
+    bank.refresh()
+    assert isinstance(bank.snapshot.topics["Security"], tuple)
+    assert sorted(bank.files) == ["questions_security.json", "questions_security.qbank"]
+
+def test_unreadable_qbank_falls_back_to_its_json(tmp_path):
+    _, qbank_path = compiled_beside_json(tmp_path)
+    with open(qbank_path, "r+b") as f:
+        f.seek(4)
+        f.write(b"\x01")
+    bank = QuestionBank(str(tmp_path), poll_interval=0)
+    bank.refresh()
+    assert len(bank.snapshot.topics["Security"]) == len(QUESTIONS)
+    assert list(bank.files) == ["questions_security.json"]
+
+def test_filtered_sample_from_compiled_bank(tmp_path):
+    compiled_beside_json(tmp_path)
+    bank = QuestionBank(str(tmp_path), poll_interval=0)
+    bank.refresh()
+    assert isinstance(bank.snapshot.topics["Security"], CompiledTopic)
+    hard = bank.sample("Security", 10, difficulty="hard", rng=random.Random(1))
+    assert [q["question"] for q in hard] == [QUESTIONS[1]["question"]]
+    tagged = bank.sample("Security", 10, tags=["Crypto"], rng=random.Random(1))
+    assert [q["question"] for q in tagged] == [QUESTIONS[0]["question"]]
+
+def test_compiled_filter_matches_json_without_decoding(tmp_path, monkeypatch):
+    rng = random.Random(3)
+    questions = [{"type": "short", "question": f"Question {i}?", "answer": str(i),
+                  "difficulty": rng.choice([None, "easy", "medium", "hard"]),
+                  "tags": rng.sample(["a", "b", "c", "d"], rng.randrange(3))} for i in range(300)]
+    for q in questions:
+        if q["difficulty"] is None:
+            del q["difficulty"]
+    path = str(tmp_path / "questions_mixed.qbank")
+    compile_questions([dict(q) for q in questions], path)
+    topic = CompiledTopic(path)
+
+    def no_decoding(self, index):
+        raise AssertionError("filtering decoded a question")
+    monkeypatch.setattr(CompiledTopic, "__getitem__", no_decoding)
+    for difficulty in (None, "easy", "medium", "hard", "expert"):
+        for tags in ((), ("a",), ("b", "c"), ("missing",)):
+            expected = [i for i, q in enumerate(questions)
+                        if (not difficulty or q.get("difficulty", "medium") == difficulty)
+                        and set(tags).issubset(q["tags"])]
+            assert list(topic.matching(difficulty, tags)) == expected
+
+    bank = QuestionBank(str(tmp_path), poll_interval=0)
+    bank.refresh()
+    view = bank.sample("Mixed", 500, difficulty="medium", tags=["a"], rng=random.Random(1))
+    assert sorted(view.order) == list(topic.matching("medium", ("a",)))
+
+def test_rejects_other_versions(tmp_path):
+    path = tmp_path / "questions_security.qbank"
+    compile_questions([dict(q) for q in QUESTIONS], str(path))
+    data = bytearray(path.read_bytes())
+    data[4] = 1
+    path.write_bytes(bytes(data))
+    with pytest.raises(ValueError):
+        CompiledTopic(str(path))
@@ -0,0 +1,68 @@
+import random
+import time
+
+from grading import AnswerKey, within_distance
+
+def levenshtein(a, b):
+    previous = list(range(len(b) + 1))
+    for i, ca in enumerate(a, 1):
+        current = [i]
+        for j, cb in enumerate(b, 1):
+            current.append(min(previous[j] + 1, current[j - 1] + 1, previous[j - 1] + (ca != cb)))
+        previous = current
+    return previous[-1]
+
+def test_within_distance_matches_levenshtein():
+    rng = random.Random(1)
+    for _ in range(5000):
+        a = "".join(rng.choice("abc") for _ in range(rng.randint(0, 8)))
+        b = "".join(rng.choice("abc") for _ in range(rng.randint(0, 8)))
+        k = rng.randint(0, 3)
+        assert within_distance(a, b, k) == (levenshtein(a, b) <= k), (a, b, k)
+
+def test_within_distance_edges():
+    assert within_distance("", "", 0)
+    assert within_distance("", "ab", 2)
+    assert not within_distance("", "abc", 2)
+    assert within_distance("kitten", "sitting", 3)
+    assert not within_distance("kitten", "sitting", 2)
+    assert within_distance("abcdef", "abdcef", 2)
+
+def test_long_inputs_stay_linear():
+    # A near-miss keeps the whole band alive to the last row, so nothing exits early
+    a = "x" * 100000
+    b = a[:50000] + "y" + a[50001:]
+    start = time.perf_counter()
+    assert within_distance(a, b, 2)
+    assert not within_distance(a, b[:-3] + "zzz", 2)
+    assert time.perf_counter() - start < 2.0
+    # Unrelated strings are rejected after a few rows
+    start = time.perf_counter()
+    assert not within_distance("a" * 1000000, "b" * 1000000, 2)
+    assert time.perf_counter() - start < 0.1
+
+def test_answer_key_typos_and_numbers():
+    key = AnswerKey("Transmission Control Protocol", aliases=["TCP"])
+    assert key.grade("transmision control protocol")
+    assert key.grade("tcp")
+    assert not key.grade("user datagram protocol")
+    number = AnswerKey("22", tolerance=0.5)
+    assert number.grade(" 22.4 ")
+    assert not number.grade("23")
+
+def test_answer_key_digits_must_match_exactly():
+    mask = AnswerKey("255.255.255.0")
+    assert mask.grade("255.255.255.0")
+    for near_miss in ("255.255.252.0", "255.255.255.8", "255.255.254.0", "255.255.255"):
+        assert not mask.grade(near_miss), near_miss
+    year = AnswerKey("Treaty of Versailles 1919")
+    assert year.grade("treaty of versales 1919")
+    assert not year.grade("Treaty of Versailles 1918")
+    version = AnswerKey("Python 3.10")
+    assert version.grade("pyton 3.10")
+    assert not version.grade("Python 3.1")
+    assert not version.grade("Python 3.11")
+    alias = AnswerKey("Internet Protocol version 6", aliases=["IPv6"])
+    assert alias.grade("ipv6")
+    assert not alias.grade("ipv4")
+    assert not alias.grade("Internet Protocol version 4")
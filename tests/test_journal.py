@@ -0,0 +1,108 @@
+import time
+
+import pytest
+
+import journal
+from journal import Journal
+
+@pytest.fixture
+def short_interval(monkeypatch):
+    monkeypatch.setattr(journal, "FSYNC_INTERVAL", 0.2)
+    return 0.2
+
+def wait_for(condition, timeout=5.0):
+    deadline = time.monotonic() + timeout
+    while not condition():
+        if time.monotonic() > deadline:
+            return False
+        time.sleep(0.01)
+    return True
+
+def test_idle_journal_fsyncs_its_last_batch(tmp_path, short_interval):
+    j = Journal(str(tmp_path), fsync="interval", flush_interval=0.01)
+    j.start()
+    try:
+        j.append("room", "ABCDE", topic="Python", questions=[])
+        assert wait_for(lambda: j.stats()["records"] == 1)
+        # The second batch lands inside the interval, so its write isn't fsynced yet
+        j.append("join", "ABCDE", player="alice")
+        assert wait_for(lambda: j.stats()["records"] == 2)
+        assert j.stats()["unsynced"] == 1
+        # No further appends: the writer must still fsync once the interval is up
+        time.sleep(short_interval * 2 + 0.1)
+        stats = j.stats()
+        assert stats["unsynced"] == 0
+        assert stats["fsyncs"] == 2
+        # ...and then sleep, not fsync again with nothing new written
+        time.sleep(short_interval * 2)
+        assert j.stats()["fsyncs"] == 2
+    finally:
+        j.close()
+
+def test_never_policy_leaves_fsync_to_the_os(tmp_path, short_interval):
+    j = Journal(str(tmp_path), fsync="never", flush_interval=0.01)
+    j.start()
+    try:
+        j.append("room", "ABCDE", topic="Python", questions=[])
+        assert wait_for(lambda: j.stats()["records"] == 1)
+        time.sleep(short_interval * 2)
+        assert j.stats()["fsyncs"] == 0
+    finally:
+        j.close()
+
+def test_recover_replays_after_close(tmp_path):
+    j = Journal(str(tmp_path), flush_interval=0.01)
+    j.start()
+    j.append("room", "ABCDE", topic="Python", questions=[{"question": "Q", "answer": "A", "type": "short"}])
+    j.append("join", "ABCDE", player="alice")
+    j.append("answer", "ABCDE", player="alice", points=1200)
+    j.close()
+    rooms = Journal(str(tmp_path)).recover()
+    assert rooms["ABCDE"]["scores"] == {"alice": 1200}
+
+def test_crash_mid_question_does_not_score_an_answer_twice(tmp_path):
+    from bench import RecordingClient, stress_questions
+    from server import QuizRoom
+    from simulation import InlineExecutor, VirtualScheduler
+
+    def new_room(j, questions):
+        room = QuizRoom("ABCDE", "Python", questions, VirtualScheduler(), InlineExecutor())
+        room.journal = j
+        return room
+
+    j = Journal(str(tmp_path), flush_interval=0.01)
+    j.start()
+    room = new_room(j, stress_questions(2))
+    j.append("room", "ABCDE", topic="Python", questions=room.questions)
+    for nickname in ("alice", "bob"):
+        room.add_client(RecordingClient(nickname))
+    room.start_quiz()
+    alice = next(client for client in room.clients if client.nickname == "alice")
+    room.process_answer(alice, "answer0")
+    scored = room.scores["alice"]
+    assert scored > 0
+    # Crash before bob answers: the journal is all that survives
+    j.close()
+
+    j = Journal(str(tmp_path), flush_interval=0.01)
+    state = j.recover()["ABCDE"]
+    assert state["answered"] == {"alice": scored}
+    j.start()
+    try:
+        room = new_room(j, state["questions"])
+        room.restore(state)
+        alice, bob = RecordingClient("alice"), RecordingClient("bob")
+        room.add_client(alice)
+        room.add_client(bob)
+        room.resume()
+        assert room.current_question_index == 0 and not room.question_closed
+        room.process_answer(alice, "answer0")
+        assert room.scores["alice"] == scored
+        assert not [m for m in alice.messages() if m["type"] == "SCORE_UPDATE"]
+        room.process_answer(bob, "answer0")
+        assert room.scores["bob"] > 0
+        # Both have now answered, so the question closes without waiting for its timer
+        assert room.question_closed
+    finally:
+        j.close()
+    assert Journal(str(tmp_path)).recover()["ABCDE"]["answered"] == {"alice": scored, "bob": room.scores["bob"]}
@@ -0,0 +1,45 @@
+import random
+import sqlite3
+
+from grading import AnswerKey
+from question_store import QuestionStore
+
+QUESTIONS = [
+    {"type": "short", "question": "What does TLS stand for?", "answer": "Transport Layer Security",
+     "aliases": ["TLS", "Transport Layer Sec"], "difficulty": "hard", "tags": ["protocols"]},
+    {"type": "short", "question": "Boiling point of water in Fahrenheit?", "answer": "212", "tolerance": 0.5},
+    {"type": "mcq", "question": "Which encryption is symmetric?", "options": ["RSA", "AES", "DSA", "ECC"],
+     "answer": "AES", "difficulty": "easy", "tags": ["crypto"]},
+]
+
+def stored(store, topic):
+    questions = store.sample(topic, 10, rng=random.Random(1))
+    return {q["question"]: q for q in questions}
+
+def test_round_trip_keeps_aliases_and_tolerance(tmp_path):
+    store = QuestionStore(str(tmp_path / "quiz.db"), poll_interval=0)
+    store.import_questions("Security", [dict(q) for q in QUESTIONS])
+    store.refresh()
+    questions = stored(store, "Security")
+    assert len(questions) == len(QUESTIONS)
+    tls, boiling, symmetric = (questions[q["question"]] for q in QUESTIONS)
+    assert tls["aliases"] == ["TLS", "Transport Layer Sec"]
+    assert "tolerance" not in tls
+    assert boiling["tolerance"] == 0.5
+    assert "aliases" not in boiling
+    assert "aliases" not in symmetric and symmetric["options"] == QUESTIONS[2]["options"]
+    assert AnswerKey.for_question(tls).grade("tls")
+    assert AnswerKey.for_question(boiling).grade("212.4")
+
+def test_older_database_gains_the_new_columns(tmp_path):
+    path = str(tmp_path / "quiz.db")
+    db = sqlite3.connect(path)
+    db.execute("CREATE TABLE questions (id INTEGER PRIMARY KEY, topic TEXT NOT NULL, type TEXT NOT NULL, "
+               "question TEXT NOT NULL, answer TEXT NOT NULL, answer_key TEXT NOT NULL, options TEXT, "
+               "difficulty TEXT NOT NULL DEFAULT 'medium', tags TEXT NOT NULL DEFAULT '')")
+    db.commit()
+    db.close()
+    store = QuestionStore(path, poll_interval=0)
+    store.import_questions("Security", [dict(QUESTIONS[1])])
+    store.refresh()
+    assert stored(store, "Security")[QUESTIONS[1]["question"]]["tolerance"] == 0.5
@@ -0,0 +1,56 @@
+import sys
+
+import pytest
+
+from bench import run_stress_room
+
+QUESTIONS = 4
+
+@pytest.fixture(autouse=True)
+def interleaved():
+    # Switch threads far more often than usual so races get a chance to show
+    old = sys.getswitchinterval()
+    sys.setswitchinterval(1e-5)
+    yield
+    sys.setswitchinterval(old)
+
+def staying(run):
+    return [(i, client) for i, client in enumerate(run["clients"]) if client in run["room"].clients]
+
+def check_room(run):
+    room = run["room"]
+    assert room.status == "Finished"
+    assert room.current_question_index == QUESTIONS
+    players = staying(run)
+    assert len(players) == len(run["clients"]) - len(run["leavers"])
+    for _, client in players:
+        messages = client.messages(skip_type="LEADERBOARD")
+        # Every question was asked exactly once, in order, and the quiz ended once
+        assert [m["data"]["question_num"] for m in messages if m["type"] == "QUESTION"] == \
+            list(range(1, QUESTIONS + 1)), client.nickname
+        assert sum(1 for m in messages if m["type"] == "QUIZ_END") == 1, client.nickname
+        # One score update per question, although every answer was posted twice
+        updates = [m["data"] for m in messages if m["type"] == "SCORE_UPDATE"]
+        assert [u["correct_answer"] for u in updates] == [f"answer{q}" for q in range(QUESTIONS)], client.nickname
+        assert sum(u["points"] for u in updates) == room.scores[client.nickname], client.nickname
+    return players
+
+def test_concurrent_answers_are_each_scored_once():
+    # Everyone answers, with a timeout no answer can lose to, so every answer must count
+    run = run_stress_room(players=300, questions=QUESTIONS, threads=8, timeout=10.0, answer_rate=1.0)
+    for i, client in check_room(run):
+        updates = [m["data"] for m in client.messages(skip_type="LEADERBOARD") if m["type"] == "SCORE_UPDATE"]
+        for q, update in enumerate(updates):
+            assert i in run["plan"][q]
+            assert update["correct"] == (i % 2 == 1), (client.nickname, q)
+            assert (update["points"] > 0) == update["correct"], (client.nickname, q)
+
+def test_timeouts_race_answers_and_stale_ticks():
+    # Some players never answer, so questions close on the timer while answers and
+    # stale force_next_question ticks are still arriving
+    run = run_stress_room(players=300, questions=QUESTIONS, threads=8, timeout=0.2, answer_rate=0.9, seed=2)
+    for i, client in check_room(run):
+        updates = [m["data"] for m in client.messages(skip_type="LEADERBOARD") if m["type"] == "SCORE_UPDATE"]
+        for q, update in enumerate(updates):
+            if update["correct"]:
+                assert run["plan"][q].get(i) == f"answer{q}", (client.nickname, q)
@@ -0,0 +1,52 @@
+import random
+
+from journal import Journal
+from selection import QuestionSelector
+
+SOURCE = tuple({"type": "short", "question": f"Question {i}?", "answer": f"answer{i}"} for i in range(200))
+
+def new_selector():
+    selector = QuestionSelector(path="")
+    selector.question_stats = {}
+    return selector
+
+def test_select_avoids_every_players_history():
+    selector = new_selector()
+    selector.remember(["alice"], "Bench", SOURCE[:50])
+    selector.remember(["bob"], "Bench", SOURCE[50:100])
+    rng = random.Random(1)
+    repeats = {"room": 0, "creator": 0}
+    for _ in range(50):
+        repeats["room"] += sum(1 for i in selector.select("Bench", SOURCE, 10, ["alice", "bob"], rng=rng).order
+                               if i < 100)
+        repeats["creator"] += sum(1 for i in selector.select("Bench", SOURCE, 10, ["alice"], rng=rng).order
+                                  if 50 <= i < 100)
+    assert repeats["room"] == 0
+    # With only the creator's history, bob's questions come round again
+    assert repeats["creator"] > 0
+
+def test_room_repicks_for_its_players_when_the_quiz_starts(tmp_path):
+    from bench import RecordingClient
+    from server import QuizRoom
+    from simulation import InlineExecutor, VirtualScheduler
+
+    selector = new_selector()
+    selector.remember(["bob"], "Bench", SOURCE[:100])
+    questions = selector.select("Bench", SOURCE, 5, ["alice"], rng=random.Random(1))
+    j = Journal(str(tmp_path), flush_interval=0.01)
+    j.start()
+    room = QuizRoom("ABCDE", "Bench", questions, VirtualScheduler(), InlineExecutor())
+    room.journal = j
+    room.choose_questions = lambda nicknames: selector.select("Bench", SOURCE, len(questions), nicknames)
+    j.append("room", "ABCDE", topic="Bench", questions=list(questions))
+    room.add_client(RecordingClient("alice"))
+    room.add_client(RecordingClient("bob"))
+    assert room.start_quiz()
+    asked = {q["question"] for q in room.questions}
+    assert len(asked) == 5
+    assert not asked & {q["question"] for q in SOURCE[:100]}
+    assert room.current_question["question"] in asked
+    j.close()
+    # Replay plays the questions picked at the start, not those of the room record
+    state = Journal(str(tmp_path)).recover()["ABCDE"]
+    assert {q["question"] for q in state["questions"]} == asked
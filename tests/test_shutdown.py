@@ -0,0 +1,41 @@
+import json
+import signal
+import socket
+import tempfile
+
+import pytest
+
+from loadgen import free_port, start_server
+from protocol import FrameReader, encode_message
+
+def read_until(sock, reader, wanted):
+    """Messages up to and including the first of type wanted; stops early at EOF."""
+    messages = []
+    while True:
+        frames = reader.recv(sock)
+        if frames is None:
+            return messages
+        for frame in frames:
+            messages.append(json.loads(frame))
+            if messages[-1]["type"] == wanted:
+                return messages
+
+@pytest.mark.parametrize("engine", ["threaded", "asyncio"])
+def test_sigterm_delivers_server_shutdown(engine):
+    with tempfile.TemporaryDirectory() as directory:
+        proc = start_server(engine, free_port(), directory)
+        try:
+            port = int(proc.args[proc.args.index("--port") + 1])
+            sock = socket.create_connection(("127.0.0.1", port), timeout=10)
+            reader = FrameReader()
+            sock.sendall(encode_message({"type": "JOIN_LOBBY", "user": "alice", "data": {}}))
+            assert read_until(sock, reader, "LOBBY_INFO")[-1]["type"] == "LOBBY_INFO"
+            proc.send_signal(signal.SIGTERM)
+            messages = read_until(sock, reader, "SERVER_SHUTDOWN")
+            assert messages and messages[-1]["type"] == "SERVER_SHUTDOWN"
+            assert proc.wait(10) == 0
+            sock.close()
+        finally:
+            if proc.poll() is None:
+                proc.kill()
+                proc.wait()